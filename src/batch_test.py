@@ -4,6 +4,8 @@
 import os
 import json
 import csv
+import chat_log
+import llm_metrics
 from chatbot import *
 from dotenv import load_dotenv
 from google import genai
@@ -16,8 +18,9 @@ REFERENCE = "data/datasets/Santa Clara.csv"
 QUERIES = "data/queries.json"
 RESULT = "result/batch_result/result.csv"
 LOGS = "logs/"
+MULTI_QUESTION = False # answer all pending policies of a city together, sending each page to the llm once
     
-def batch(client, muni_nav, reference, queries, result, logs, free_client=None):
+def batch(client, muni_nav, reference, queries, result, logs, free_client=None, multi_question=MULTI_QUESTION):
     data = open(queries, encoding="utf8")
     query_ref = json.load(data)
     data.close()
@@ -25,6 +28,7 @@ def batch(client, muni_nav, reference, queries, result, logs, free_client=None):
     field_names = []
 
     answers = []
+    pending = {} # city -> policy types still to answer (multi question mode)
 
     open(result, mode='a') # create result if not exists
     # update answers with answers in results
@@ -56,87 +60,130 @@ def batch(client, muni_nav, reference, queries, result, logs, free_client=None):
                         break
                 if found:
                     continue
+            if multi_question:
+                pending.setdefault(city, []).append(policy_type)
+                continue
             if not os.path.exists(f"{logs}{city}"):
                 os.makedirs(f"{logs}{city}")
             filename = f"""{city}/{policy_type.replace('/', ' ')}_log.md"""
-            structured_response = chatbot_query(client=client, scraper=muni_nav, state_name="california", muni_name=city.lower(), query=query_ref[policy_type]["query"], free_client=free_client, search_terms=query_ref[policy_type]["search_terms"])
-            answer = [city, policy_type, 'Y' if structured_response and (structured_response["binary_response"]) else 'N']
+            with chat_log.log_to(logs + filename), llm_metrics.scope(city=city, policy=policy_type): # log straight into the saved log file
+                structured_response = chatbot_query(client=client, scraper=muni_nav, state_name="california", muni_name=city.lower(), query=query_ref[policy_type]["query"], free_client=free_client, search_terms=query_ref[policy_type]["search_terms"])
+            if getattr(structured_response, "error", None): # not written, so the next run retries it
+                print(f"FAILED: {city}: {policy_type} ({structured_response.error})")
+                continue
+            answer = [city, policy_type, 'Y' if structured_response.binary_response else 'N']
             answers.append(answer)
             with open(result, mode='a') as csv_result_file: # incremental updates
                 csv_result_file.write(','.join(answer) + '\n')
-            os.replace("log.md", logs + filename) # save log
+            llm_metrics.write_report(os.path.dirname(result)) # token/latency accounting next to the result csv
             evaluate(answers, reference_answers)
+        for city, policy_types in pending.items():
+            answers += batch_city(client, muni_nav, city, policy_types, query_ref, result, logs, free_client=free_client)
+            llm_metrics.write_report(os.path.dirname(result))
+            evaluate(answers, reference_answers)
+        sort_results(result, answers, reference_answers)
         return answers, reference_answers
 
+def sort_results(result, answers, reference):
+    # rewrites result in reference order (retried and multi question answers are appended at the end)
+    order = {(line[0], line[1]): i for i, line in enumerate(reference) if len(line) == 3}
+    rows = sorted((answer for answer in answers if len(answer) == 3 and answer != reference[0]), key=lambda answer: order.get((answer[0], answer[1]), len(order)))
+    with open(result, mode='w') as csv_result_file:
+        csv_result_file.write(','.join(reference[0]) + '\n')
+        for answer in rows:
+            csv_result_file.write(','.join(answer) + '\n')
+
+def batch_city(client, muni_nav, city, policy_types, query_ref, result, logs, free_client=None):
+    # answers every pending policy of a city with one pass over the candidate pages
+    if not os.path.exists(f"{logs}{city}"):
+        os.makedirs(f"{logs}{city}")
+    with chat_log.log_to(f"{logs}{city}/multi_question_log.md"), llm_metrics.scope(city=city, policy="(all pending)"):
+        responses = chatbot_multi_query(client=client, scraper=muni_nav, state_name="california", muni_name=city.lower(), queries={policy_type: query_ref[policy_type] for policy_type in policy_types}, free_client=free_client)
+    answers = []
+    for policy_type in policy_types:
+        if responses[policy_type].error: # not written, so the next run retries it
+            print(f"FAILED: {city}: {policy_type} ({responses[policy_type].error})")
+            continue
+        answer = [city, policy_type, 'Y' if responses[policy_type].binary_response else 'N']
+        answers.append(answer)
+        with open(result, mode='a') as csv_result_file: # incremental updates
+            csv_result_file.write(','.join(answer) + '\n')
+    return answers
+
 def evaluate(results, reference):
-    field_names = []
+    # results and reference are paired on (city, policy type), not on row order:
+    # failed queries are left out and multi question answers come grouped by city
     total = 0
     correct = 0
-    index = 0
     fp = 0
     fn = 0
     tp = 0
     tn = 0
     by_policy_type = {}
     by_city = {}
+    field_names = reference[0] if reference else []
+    reference_answers = {}
+    for line in reference[1:]:
+        if len(line) == 3:
+            reference_answers[(line[0], line[1])] = line[2]
+    answered = {}
     for result in results:
-        if result:
-            ref_city, ref_policy_type, ref_response = reference[index]
-            city, policy_type, response = result
-            if ref_city != city or ref_policy_type != policy_type:
-                assert f"MISMATCH: REFERENCE: {reference[index]} -> ANSWER: {result}"
-            if not field_names:
-                field_names = result
+        if len(result) == 3 and result != field_names:
+            answered[(result[0], result[1])] = result[2] # a later answer for the same pair wins
+    for (city, policy_type), response in answered.items():
+        if (city, policy_type) not in reference_answers:
+            print(f"NOT IN REFERENCE: {city}: {policy_type}")
+            continue
+        ref_response = reference_answers[(city, policy_type)]
+        if not policy_type in by_policy_type:
+            by_policy_type[policy_type] = {
+                "total": 0,
+                "correct": 0,
+                "errors": {
+                    "tp": 0,
+                    "tn": 0,
+                    "fp": 0,
+                    "fn": 0
+                }
+            }
+        if not city in by_city:
+            by_city[city] = {
+                "total": 0,
+                "correct": 0,
+                "errors": {
+                    "tp": 0,
+                    "tn": 0,
+                    "fp": 0,
+                    "fn": 0
+                }
+            }
+        policy_dict = by_policy_type[policy_type]
+        policy_dict["total"] += 1
+        city_dict = by_city[city]
+        city_dict["total"] += 1
+        if ref_response == response:
+            policy_dict["correct"] += 1
+            city_dict["correct"] += 1
+            correct += 1
+            if ref_response == "Y":
+                policy_dict["errors"]["tp"] += 1
+                city_dict["errors"]["tp"] += 1
+                tp += 1
+            else:
+                policy_dict["errors"]["tn"] += 1
+                city_dict["errors"]["tn"] += 1
+                tn += 1
+        else:
+            if ref_response == "Y":
+                policy_dict["errors"]["fn"] += 1
+                city_dict["errors"]["fn"] += 1
+                fn += 1
             else:
-                if not policy_type in by_policy_type:
-                    by_policy_type[policy_type] = {
-                        "total": 0,
-                        "correct": 0,
-                        "errors": {
-                            "tp": 0,
-                            "tn": 0,
-                            "fp": 0,
-                            "fn": 0
-                        }
-                    }
-                if not city in by_city:
-                    by_city[city] = {
-                        "total": 0,
-                        "correct": 0,
-                        "errors": {
-                            "tp": 0,
-                            "tn": 0,
-                            "fp": 0,
-                            "fn": 0
-                        }
-                    }
-                policy_dict = by_policy_type[policy_type]
-                policy_dict["total"] += 1
-                city_dict = by_city[city]
-                city_dict["total"] += 1
-                if ref_response == response:
-                    policy_dict["correct"] += 1
-                    city_dict["correct"] += 1
-                    correct += 1
-                    if ref_response == "Y":
-                        policy_dict["errors"]["tp"] += 1
-                        city_dict["errors"]["tp"] += 1
-                        tp += 1
-                    else:
-                        policy_dict["errors"]["tn"] += 1
-                        city_dict["errors"]["tn"] += 1
-                        tn += 1
-                else:
-                    if ref_response == "Y":
-                        policy_dict["errors"]["fn"] += 1
-                        city_dict["errors"]["fn"] += 1
-                        fn += 1
-                    else:
-                        policy_dict["errors"]["fp"] += 1
-                        city_dict["errors"]["fp"] += 1
-                        fp += 1
-                total += 1
-            index += 1
+                policy_dict["errors"]["fp"] += 1
+                city_dict["errors"]["fp"] += 1
+                fp += 1
+        total += 1
+    unanswered = [key for key in reference_answers if key not in answered]
 
     final_response = {
         "total": total,
@@ -147,13 +194,14 @@ def evaluate(results, reference):
             "fp": fp,
             "fn": fn
         },
+        "unanswered": len(unanswered), # failed or not run yet, not counted in the accuracy
     }
 
     by_policy_type = dict(sorted(by_policy_type.items(), key=lambda x: x[1]["correct"] / x[1]["total"], reverse=True))
     by_city = dict(sorted(by_city.items(), key=lambda x: x[1]["correct"] / x[1]["total"], reverse=True))
 
     print("\n---EVALUATION---")
-    print(f" - {"total:":55} (accuracy: {correct / total:.2f}): {final_response}\n")
+    print(f" - {"total:":55} (accuracy: {correct / total if total else 0:.2f}): {final_response}\n")
     print("---BY POLICY---")
     for policy_name, result in by_policy_type.items():
         print(f" - {policy_name:55} (accuracy: {result["correct"] / result["total"]:.2f}): {result}")
@@ -0,0 +1,154 @@
+"""
+CHAT LOG
+
+Buffered markdown logger for the chatbot. Writes are collected in memory per
+log file and appended to disk when a buffer grows past LOG_BUFFER_BYTES, on
+explicit flush() boundaries (end of an llm call, end of a query), every
+LOG_FLUSH_INTERVAL seconds from a background thread, and at exit. Streaming a
+long answer no longer opens log.md once per chunk.
+
+The target file is held in a context variable, so concurrent queries (threads
+or asyncio tasks) can each log to their own file with log_to().
+"""
+
+import config.general as general_args
+
+import atexit
+import contextlib
+import contextvars
+import os
+import threading
+
+
+_path: contextvars.ContextVar[str|None] = contextvars.ContextVar("chat_log_path", default=None)
+
+
+def current_path() -> str:
+    """
+    Log file for the current context (LOG_PATH unless log_to() is active)
+    """
+    return _path.get() or general_args.LOG_PATH
+
+
+class BufferedLog:
+    """
+    Per-file write buffers flushed by size, boundary, timer or exit
+    """
+    def __init__(self):
+        self._buffers: dict[str, list[str]] = {}
+        self._sizes: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._timer: threading.Thread|None = None
+        self._stop = threading.Event()
+
+    def write(self, path: str, text: str) -> None:
+        with self._lock:
+            self._buffers.setdefault(path, []).append(text)
+            self._sizes[path] = self._sizes.get(path, 0) + len(text)
+            full = self._sizes[path] >= general_args.LOG_BUFFER_BYTES
+            if self._timer is None and general_args.LOG_FLUSH_INTERVAL:
+                self._timer = threading.Thread(target=self._run_timer, daemon=True)
+                self._timer.start()
+        if full:
+            self.flush(path)
+
+    def flush(self, path: str|None=None) -> None:
+        """
+        Append buffered text to disk
+
+        :param path: log file to flush (all files if None)
+        """
+        with self._lock:
+            paths = [path] if path is not None else list(self._buffers)
+            for p in paths:
+                chunks = self._buffers.pop(p, None)
+                self._sizes.pop(p, None)
+                if not chunks:
+                    continue
+                folder = os.path.dirname(p)
+                if folder:
+                    os.makedirs(folder, exist_ok=True)
+                with open(p, "a", encoding="utf-8") as f:
+                    f.write("".join(chunks))
+
+    def reset(self, path: str, text: str="") -> None:
+        """
+        Drop anything buffered for a file and overwrite it
+
+        :param path: log file
+        :param text: initial file contents
+        """
+        with self._lock:
+            self._buffers.pop(path, None)
+            self._sizes.pop(path, None)
+            folder = os.path.dirname(path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+
+    def _run_timer(self) -> None:
+        while not self._stop.wait(general_args.LOG_FLUSH_INTERVAL):
+            self.flush()
+
+    def close(self) -> None:
+        self._stop.set()
+        self.flush()
+
+
+_log = BufferedLog()
+atexit.register(_log.close)
+
+
+def write(text: str) -> None:
+    """
+    Buffer text for the current log file (no-op when LOGGING is off)
+
+    :param text: markdown text
+    """
+    if general_args.LOGGING:
+        _log.write(current_path(), text)
+
+
+def flush() -> None:
+    """
+    Flush the current log file
+    """
+    _log.flush(current_path())
+
+
+def reset(text: str="") -> None:
+    """
+    Overwrite the current log file
+    """
+    _log.reset(current_path(), text)
+
+
+@contextlib.contextmanager
+def log_to(path: str, clear: bool=True):
+    """
+    Send this context's log to its own file (asyncio tasks and asyncio.to_thread workers started inside inherit it)
+
+    :param path: log file
+    :param clear: start the file empty
+    """
+    token = _path.set(path)
+    try:
+        if clear:
+            _log.reset(path)
+        yield path
+    finally:
+        _log.flush(path)
+        _path.reset(token)
+
+
+def prompt_block(prompt: str) -> str:
+    """
+    Markdown for a logged prompt; only its size when LOG_PROMPT_BODIES is off
+
+    :param prompt: prompt text
+    :return: markdown text
+    """
+    if general_args.LOG_PROMPT_BODIES:
+        return f"### Prompt: \n\n<details>\n\n<summary>Prompt</summary>\n\n{prompt}\n\n</details>\n\n-------------------\n\n"
+    return f"### Prompt: \n\n*prompt body omitted ({len(prompt)} characters)*\n\n-------------------\n\n"
@@ -12,17 +12,27 @@ import scrapers.municode_scraper as municode
 import config.instruction as inst
 import config.general as general_args
 import config.prompts as prompts
+import embedding_cache
+import chat_log
+import llm_cache
+import context_chunker
+import llm_metrics
+import llm_retry
+import quote_matcher
+import section_index
 
 
 import os
+import re
 import time
 import json
+import asyncio
 import numpy as np
 
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
-from google.genai.errors import ServerError
+from google.genai.errors import ClientError, ServerError
 from sklearn.metrics.pairwise import cosine_similarity
 
 
@@ -93,8 +103,9 @@ class QueryResponse:
     MUST MIRROR RESPONSE_SCHEMA FROM instruction.py
     """
 
-    def __init__(self, sources: list[SourceResponse], response_confidence: float|None=None, binary_response: bool|None=None, numeric_response: float|None=None, categorical_response: str|None=None, conditional_response: list[ConditionalResponse]|None=None, none_found: bool=False):
+    def __init__(self, sources: list[SourceResponse], response_confidence: float|None=None, binary_response: bool|None=None, numeric_response: float|None=None, categorical_response: str|None=None, conditional_response: list[ConditionalResponse]|None=None, none_found: bool=False, error: str|None=None):
         self.none_found: bool = none_found
+        self.error: str|None = error # set when the query could not be completed (llm call failed)
         self.sources: list[SourceResponse] = sources
         self.response_confidence: float = response_confidence
         if binary_response != None:
@@ -125,26 +136,26 @@ def start_logging() -> None:
     """
     Clears log and begins logging in log file
     """
-    with open(general_args.LOG_PATH, "w", encoding="utf-8") as f: # for testing purposes
-        f.write(f"# LOG\n\n")
+    chat_log.reset(f"# LOG\n\n")
 
 def log(text: str) -> None:
     """
     Log text (markdown format) into log file for debugging/testing purposes
 
+    Buffered, see chat_log
+
     :param text: input text
     :return:
     """
-    with open(general_args.LOG_PATH, "a", encoding="utf-8") as f:
-        f.write(text)
+    chat_log.write(text)
 
 def clear_log() -> None:
     """
-    Clears log.md file
+    Clears log.md file (or the file set with chat_log.log_to)
 
     :return:
     """
-    open(general_args.LOG_PATH, "w", encoding="utf-8").close()
+    chat_log.reset()
 
 def get_latest_response(contents: list[types.Content]) -> ResponseItem:
     """
@@ -163,7 +174,7 @@ def get_latest_response(contents: list[types.Content]) -> ResponseItem:
     return ResponseItem(response, thoughts)
 
 
-def llm_query(client: genai.Client, contents: str|list[types.Content], config: types.GenerateContentConfig, model: str, attempt: int=1) -> list[types.Content]:
+def llm_query(client: genai.Client, contents: str|list[types.Content], config: types.GenerateContentConfig, model: str, purpose: str="", attempt: int=1) -> list[types.Content]:
     """
     Prompts LLM
 
@@ -171,14 +182,20 @@ def llm_query(client: genai.Client, contents: str|list[types.Content], config: t
     :param contents: prompt/content history
     :param config: gemini config
     :param model: llm model
+    :param purpose: what the call is for (recorded in llm_metrics)
     :param attempt: current attempt number
     :return: content history as a content list
+    :raises llm_retry.LLMCallFailed: when the call fails after all retries, or was never recorded in replay mode
     """
+    timer = llm_metrics.CallTimer()
+    active = llm_retry.pick_client(client)
+    if active is not client:
+        log(f"#### Client out of quota, failing over to the other client\n\n")
     try:
         result: list[types.Content] = []
         if general_args.LOG_PROMPTS:
             if isinstance(contents, str):
-                log(f"### Prompt: \n\n<details>\n\n<summary>Prompt</summary>\n\n{contents}\n\n</details>\n\n-------------------\n\n")
+                log(chat_log.prompt_block(contents))
                 result.append(
                     types.Content(
                         role="user",
@@ -188,60 +205,164 @@ def llm_query(client: genai.Client, contents: str|list[types.Content], config: t
                     )
                 )
             else:
-                log(f"### Prompt: \n\n<details>\n\n<summary>Prompt</summary>\n\n{contents[-1].parts[0].text}\n\n</details>\n\n-------------------\n\n")
+                log(chat_log.prompt_block(contents[-1].parts[0].text))
                 result += contents
 
         thinking: str = ""
         response: str = ""
+        usage = None
+
+        try:
+            replayed = llm_cache.lookup(model, config, contents)
+        except llm_cache.ReplayMiss as e: # reported like any failed call, never retried
+            raise llm_retry.LLMCallFailed(purpose, model, attempt, e) from e
+        if replayed:
+            thinking, response = replayed
+            log(f"*replayed from llm cache*\n\n")
+            if thinking:
+                log(f"### Thinking:\n\n<details>\n\n<summary>Thinking...</summary>\n\n{thinking}")
+            log(f"</details>\n\n### Response:\n\n{response}")
+        else:
+            # incremental response 
+            for chunk in active.models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=config
+            ):
+                usage = chunk.usage_metadata or usage
+                if chunk.candidates:
+                    if chunk.candidates[0].content.parts:
+                        for part in chunk.candidates[0].content.parts:
+                            if not part or not part.text:
+                                continue
+                            timer.first_token()
+                            if part.thought:
+                                if not thinking:
+                                    log(f"### Thinking:\n\n<details>\n\n<summary>Thinking...</summary>\n\n")
+                                thinking += part.text
+                                log(part.text)
+                            else:
+                                if not response:
+                                    log(f"</details>\n\n### Response:\n\n")
+                                response += part.text
+                                log(part.text)
+            llm_cache.store(model, config, contents, thinking, response)
+        log("\n\n-------------------\n\n")
+        chat_log.flush()
+        llm_metrics.record("generate", model, purpose=purpose, wall_s=timer.elapsed(), ttft_s=timer.ttft, retries=attempt - 1, replayed=bool(replayed), **llm_metrics.usage_counts(usage))
+
+        result.append(model_content(thinking, response))
+
+        return result
+    except (ServerError, ClientError) as e:
+        llm_metrics.record("generate", model, purpose=purpose, wall_s=timer.elapsed(), ttft_s=timer.ttft, retries=attempt - 1, failed=True)
+        delay = llm_retry.next_delay(active, e, attempt)
+        if delay is not None:
+            log(f"\n\n#### ERROR OCCURED ON ATTEMPT ({attempt}) ERROR: ({e}). RETRYING IN {delay:.1f} SECONDS\n\n")
+            time.sleep(delay)
+            log(f"#### RETRYING...\n\n")
+            return llm_query(client=client, contents=contents, config=config, model=model, purpose=purpose, attempt=attempt + 1)
+        else:
+            log(f"\n\n#### ERROR OCCURED ({e}). GIVING UP AFTER ATTEMPT ({attempt}).\n\n")
+            chat_log.flush()
+            raise llm_retry.LLMCallFailed(purpose, model, attempt, e) from e
+
+
+def model_content(thinking: str, response: str) -> types.Content:
+    """
+    Builds the model turn of a content history
+
+    :param thinking: streamed thoughts
+    :param response: streamed response
+    :return: model content
+    """
+    parts = []
+
+    if thinking:
+        thinking_part = types.Part.from_text(text=thinking)
+        thinking_part.thought = True
+        parts.append(thinking_part)
+    parts.append(types.Part.from_text(text=response))
+
+    return types.Content(
+        role="model",
+        parts=parts
+    )
+
+
+async def llm_query_async(client: genai.Client, contents: str, config: types.GenerateContentConfig, model: str, label: str="", purpose: str="", attempt: int=1) -> list[types.Content]:
+    """
+    Prompts LLM through the async client
 
-        # incremental response 
-        for chunk in client.models.generate_content_stream(
-            model=model,
-            contents=contents,
-            config=config
-        ):
-            if chunk.candidates:
-                if chunk.candidates[0].content.parts:
+    Several of these run at once in pipelined mode, so the prompt, thoughts and
+    response are logged together once the stream ends instead of chunk by chunk.
+
+    :param client: genai client
+    :param contents: prompt
+    :param config: gemini config
+    :param model: llm model
+    :param label: name shown in the log for this call
+    :param purpose: what the call is for (recorded in llm_metrics)
+    :param attempt: current attempt number
+    :return: content history as a content list
+    :raises llm_retry.LLMCallFailed: when the call fails after all retries, or was never recorded in replay mode
+    """
+    timer = llm_metrics.CallTimer()
+    active = llm_retry.pick_client(client)
+    try:
+        thinking: str = ""
+        response: str = ""
+        usage = None
+
+        try:
+            replayed = llm_cache.lookup(model, config, contents)
+        except llm_cache.ReplayMiss as e: # reported like any failed call, never retried
+            raise llm_retry.LLMCallFailed(purpose, model, attempt, e) from e
+        if replayed:
+            thinking, response = replayed
+        else:
+            async for chunk in await active.aio.models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=config
+            ):
+                usage = chunk.usage_metadata or usage
+                if chunk.candidates and chunk.candidates[0].content.parts:
                     for part in chunk.candidates[0].content.parts:
                         if not part or not part.text:
                             continue
+                        timer.first_token()
                         if part.thought:
-                            if not thinking:
-                                log(f"### Thinking:\n\n<details>\n\n<summary>Thinking...</summary>\n\n")
                             thinking += part.text
-                            log(part.text)
                         else:
-                            if not response:
-                                log(f"</details>\n\n### Response:\n\n")
                             response += part.text
-                            log(part.text)
-        log("\n\n-------------------\n\n")
-
-        parts = []
+            llm_cache.store(model, config, contents, thinking, response)
 
+        text = f"### {label}\n\n" if label else ""
+        if replayed:
+            text += "*replayed from llm cache*\n\n"
+        if general_args.LOG_PROMPTS:
+            text += chat_log.prompt_block(contents)
         if thinking:
-            thinking_part = types.Part.from_text(text=thinking)
-            thinking_part.thought = True
-            parts.append(thinking_part)
-        parts.append(types.Part.from_text(text=response))
-
-        result.append(
-            types.Content(
-                role="model",
-                parts=parts
-            )
-        )
-
-        return result
-    except ServerError as e:
-        if attempt < general_args.LLM_ATTEMPT_LIMIT:
-            log(f"\n\n#### ERROR OCCURED ON ATTEMPT ({attempt}) ERROR: ({e}). RETRYING IN {general_args.LLM_ATTEMPT_DELAY} SECONDS\n\n")
-            time.sleep(general_args.LLM_ATTEMPT_DELAY)
-            log(f"#### RETRYING...\n\n")
-            return llm_query(client=client, contents=contents, config=config, model=model, attempt=attempt + 1)
-        else:
-            log(f"\n\n#### ERROR OCCURED ({e}). ATTEMPT LIMIT REACHED ({attempt}).\n\n")
-            exit()
+            text += f"### Thinking:\n\n<details>\n\n<summary>Thinking...</summary>\n\n{thinking}</details>\n\n"
+        text += f"### Response:\n\n{response}\n\n-------------------\n\n"
+        log(text)
+        chat_log.flush()
+        llm_metrics.record("generate", model, purpose=purpose, wall_s=timer.elapsed(), ttft_s=timer.ttft, retries=attempt - 1, replayed=bool(replayed), **llm_metrics.usage_counts(usage))
+
+        return [
+            types.Content(role="user", parts=[types.Part.from_text(text=contents)]),
+            model_content(thinking, response)
+        ]
+    except (ServerError, ClientError) as e:
+        llm_metrics.record("generate", model, purpose=purpose, wall_s=timer.elapsed(), ttft_s=timer.ttft, retries=attempt - 1, failed=True)
+        delay = llm_retry.next_delay(active, e, attempt)
+        if delay is not None:
+            log(f"\n\n#### ERROR OCCURED ON ATTEMPT ({attempt}) ERROR: ({e}). RETRYING IN {delay:.1f} SECONDS\n\n")
+            await asyncio.sleep(delay)
+            return await llm_query_async(client=client, contents=contents, config=config, model=model, label=label, purpose=purpose, attempt=attempt + 1)
+        log(f"\n\n#### ERROR OCCURED ({e}). GIVING UP AFTER ATTEMPT ({attempt}).\n\n")
+        raise llm_retry.LLMCallFailed(purpose, model, attempt, e) from e
 
 
 def join_list(element: list[str]|dict[str: str], seperator: str=", ") -> str:
@@ -259,6 +380,14 @@ def join_list(element: list[str]|dict[str: str], seperator: str=", ") -> str:
     result = result[:-(len(seperator))]
     return result
 
+def log_embedding_stats() -> None:
+    """
+    Log embedding cache hit rate (cumulative for this process)
+    """
+    cache = embedding_cache.get_cache()
+    if cache:
+        log(f"*{cache.stats()}*\n\n")
+
 def run_sorter(client: genai.Client, names: list[str], query: str) -> list[RelevanceItem]:
     """
     LLM based sorting (super arbitrary)
@@ -271,12 +400,8 @@ def run_sorter(client: genai.Client, names: list[str], query: str) -> list[Relev
 
     result: list[RelevanceItem] = []
     names = list(names)
-    vectors = [
-        np.array(e.values) for e in client.models.embed_content(
-            model="gemini-embedding-001",
-            contents=[query]+names,
-            config=types.EmbedContentConfig(task_type="SEMANTIC_SIMILARITY")).embeddings
-    ]
+    vectors = embedding_cache.embed(client, [query]+names, task_type="SEMANTIC_SIMILARITY")
+    log_embedding_stats()
     embeddings_matrix = np.array(vectors)
     similarity_matrix = cosine_similarity(embeddings_matrix)
 
@@ -303,18 +428,24 @@ def answer(client: genai.Client, query: str, muni_name: str, muni_url: str, cont
     :return: returns 
     """
     log("## ANSWERING\n\n")
-    prompt: str = prompts.RESPONSE_QUERY_TEMPLATE.format(
+    return llm_query(
+        client=client,
+        contents=answer_prompt(query, muni_name, muni_url, context),
+        config=inst.THINKER_CONFIG,
+        model=inst.THINKING_MODEL,
+        purpose="answer"
+    )
+
+def answer_prompt(query: str, muni_name: str, muni_url: str, context: str) -> str:
+    """
+    Fills the answerer prompt template
+    """
+    return prompts.RESPONSE_QUERY_TEMPLATE.format(
         muni_name=muni_name,
         muni_url=muni_url,
         text=context,
         query=query
     )
-    return llm_query(
-        client=client,
-        contents=prompt,
-        config=inst.THINKER_CONFIG,
-        model=inst.THINKING_MODEL
-    )
 
 def structure(client: genai.Client, response: str) -> dict:
     log("## Structuring answer\n\n")
@@ -322,7 +453,8 @@ def structure(client: genai.Client, response: str) -> dict:
         client=client,
         contents=response,
         config=inst.STRUCTURER_CONFIG,
-        model=inst.THINKING_MODEL
+        model=inst.THINKING_MODEL,
+        purpose="structure"
     )).response)
 
 def search_term_generator(client: genai.Client, query: str) -> list[str]:
@@ -338,7 +470,8 @@ def search_term_generator(client: genai.Client, query: str) -> list[str]:
             client=client, 
             contents=prompts.SEARCHER_QUERY_TEMPLATE.format(query=query, n=general_args.SEARCH_TERM_LIMIT), 
             config=inst.SEARCHER_CONFIG, 
-            model=inst.FAST_MODEL
+            model=inst.FAST_MODEL,
+            purpose="search_terms"
         )).response
     )
     terms.sort(key=lambda x: x['relevance_rating'], reverse=True)
@@ -354,14 +487,9 @@ def closest(client: genai.Client, query: str, items: list[str]):
     :query items: string items
     """
     items = list(items)
-    vectors = [
-        np.array(e.values) for e in client.models.embed_content(
-            model="gemini-embedding-001",
-            contents=[query]+items,
-            config=types.EmbedContentConfig(task_type="SEMANTIC_SIMILARITY")).embeddings
-    ]
+    vectors = embedding_cache.embed(client, [query]+items, task_type="SEMANTIC_SIMILARITY")
+    log_embedding_stats()
 
-    
     embeddings_matrix = np.array(vectors)
     similarity_matrix = cosine_similarity(embeddings_matrix)
 
@@ -374,7 +502,21 @@ def closest(client: genai.Client, query: str, items: list[str]):
             closest_item = items[i-1]
     return closest_item
 
-def search_answerer(client: genai.Client, scraper: scraper.Scraper, muni_name: str, query: str, free_client: genai.Client|None=None, search_terms: list[str]|None=None, visited: set[str]|None=None):
+def trim_context(client: genai.Client, query: str, context: str) -> str:
+    """
+    Keeps only the parts of a long page most relevant to the query (see context_chunker)
+
+    :param client: llm client (for embedding ranking)
+    :param query: query the context must answer
+    :param context: scraped page text
+    :return: context sent to answer, quote check and verification
+    """
+    selection = context_chunker.select_context(client, query, context)
+    if selection.trimmed:
+        log(f"*context trimmed to {selection.chunks_kept}/{selection.chunks_total} chunks ({len(selection.text)}/{selection.chars_total} characters)*\n\n")
+    return selection.text
+
+def search_answerer(client: genai.Client, scraper: scraper.Scraper, muni_name: str, query: str, free_client: genai.Client|None=None, search_terms: list[str]|None=None, visited: set[str]|None=None, index: section_index.SectionIndex|None=None):
     """
     Utilize scraper search to answer query
 
@@ -385,6 +527,7 @@ def search_answerer(client: genai.Client, scraper: scraper.Scraper, muni_name: s
     :param free_client: optional free client to minimize api credit usage
     :param search_terms: optional search terms to find context
     :param visited: set containing the names of visited pages
+    :param index: optional local section index, used instead of the municode search box
     :return: answer to query
     """
     if not free_client:
@@ -392,48 +535,227 @@ def search_answerer(client: genai.Client, scraper: scraper.Scraper, muni_name: s
         free_client = client
     search_terms = (search_terms or search_term_generator(client, query))[:general_args.SEARCH_TERM_LIMIT]
     visited = visited or set()
+    if general_args.PIPELINE_ANSWERS:
+        return asyncio.run(pipelined_search_answerer(client, scraper, muni_name, query, free_client, search_terms, visited, index))
     for term in search_terms:
         log(f"""## Searching "{term}"...\n\n""")
-        scraper.search(term)
-        search_results = scraper.scrape_search()
-        if search_results:
-            if len(search_results) == 1: # no need to run sorter if there is only 1 search result
-                section_names = [RelevanceItem(list(search_results.keys())[0], relevance_rating=10)] # jank
+        for section_name, muni_url in search_sections(client, scraper, query, term, index):
+            page = index.page(muni_url) if index else None
+            if page:
+                log(f"""## Reading [{section_name}]({muni_url}) from section index\n\n""")
+                title = page.title
             else:
-                section_names = run_sorter(client=client, names=search_results.keys(), query=query)
-            for section in section_names:
-                muni_url = search_results[section.name].href
-                log(f"""## Navigating to [{section.name}]({muni_url})\n\n""")
+                log(f"""## Navigating to [{section_name}]({muni_url})\n\n""")
                 scraper.go(muni_url)
                 title = scraper.scrape_title()
-                if not title in visited:
-                    visited.add(title)
-                    context = scraper.scrape_text()
-                    response = get_latest_response(answer(client=free_client, query=query, muni_name=muni_name, muni_url=muni_url, context=context))
-                    if not "(NONE)" in response.response:
-                        structured = structure(free_client, response.response)
+            if not title in visited:
+                visited.add(title)
+                context = trim_context(client, query, page.text if page else scraper.scrape_text())
+                response = get_latest_response(answer(client=free_client, query=query, muni_name=muni_name, muni_url=muni_url, context=context))
+                if not "(NONE)" in response.response:
+                    structured = structure(free_client, response.response)
+                    
+                    if "sources" in structured and structured["sources"]:
+                        quotes_verified, failed_quotes = verify_quotes_exist(context, structured["sources"])
+        
+                        if not quotes_verified:
+                            log(f"Answer rejected - {len(failed_quotes)} quote(s) could not be verified\n\n")
+                            log("Continuing search for better evidence\n\n")
+                            continue
+
+                        llm_verified = llm_verify_answer(client=free_client, query=query, muni_name=muni_name, context=context, original_response=response.response)
                         
-                        if "sources" in structured and structured["sources"]:
-                            quotes_verified, failed_quotes = verify_quotes_exist(context, structured["sources"])
-            
-                            if not quotes_verified:
-                                log(f"Answer rejected - {len(failed_quotes)} quote(s) could not be verified\n\n")
-                                log("Continuing search for better evidence\n\n")
-                                continue
+                        if llm_verified:
+                            log("Answer passed both verification steps\n\n")
+                            return QueryResponse.from_dict(structured)
+                        else:
+                            log("Answer rejected, LLM could not verify its own answer\n\n")
+                            log("Continuing search for better evidence\n\n")
+            else:
+                log(f"""## Already visited, going back...\n\n""")
+    # no answer found. need to move to named tuple or something b/c none_found is not in the schema
+    return QueryResponse(none_found=True, binary_response=False, sources=[], response_confidence=1)
+    
 
-                            llm_verified = llm_verify_answer(client=free_client, query=query, muni_name=muni_name, context=context, original_response=response.response)
-                            
-                            if llm_verified:
-                                log("Answer passed both verification steps\n\n")
-                                return QueryResponse.from_dict(structured)
-                            else:
-                                log("Answer rejected, LLM could not verify its own answer\n\n")
-                                log("Continuing search for better evidence\n\n")
+def search_sections(client: genai.Client, scraper: scraper.Scraper, query: str, term: str, index: section_index.SectionIndex|None=None) -> list[tuple[str, str]]:
+    """
+    Runs one search term and sorts the results by relevance to the query
+
+    :param client: llm client
+    :param scraper: webscraper crawler
+    :param query: string query
+    :param term: search term
+    :param index: optional local section index, used instead of the municode search box
+    :return: list of (section name, url) from most to least relevant
+    """
+    if index:
+        search_results = index.search(term, client=client)
+    else:
+        scraper.search(term)
+        search_results = scraper.scrape_search()
+    if not search_results:
+        return []
+    if len(search_results) == 1:
+        section_names = [RelevanceItem(list(search_results.keys())[0], relevance_rating=10)]
+    else:
+        section_names = run_sorter(client=client, names=search_results.keys(), query=query)
+    return [(section.name, search_results[section.name].href) for section in section_names]
+
+def fetch_section(scraper: scraper.Scraper, muni_url: str) -> tuple[str, str]:
+    """
+    Navigates to a section and scrapes it
+
+    :param scraper: webscraper crawler
+    :param muni_url: section url
+    :return: (page title, page text)
+    """
+    scraper.go(muni_url)
+    return scraper.scrape_title(), scraper.scrape_text()
+
+async def answer_section(client: genai.Client, query: str, muni_name: str, section_name: str, muni_url: str, context: str) -> dict|None:
+    """
+    Answer, structure and verify one section through the async client
+
+    :param client: llm client
+    :param query: string query
+    :param muni_name: municipality name
+    :param section_name: section name (for the log)
+    :param muni_url: section url
+    :param context: section text
+    :return: structured answer if it passed both verification steps, None otherwise
+    """
+    response = get_latest_response(await llm_query_async(
+        client=client,
+        contents=answer_prompt(query, muni_name, muni_url, context),
+        config=inst.THINKER_CONFIG,
+        model=inst.THINKING_MODEL,
+        purpose="answer",
+        label=f"ANSWERING [{section_name}]({muni_url})"
+    ))
+    if "(NONE)" in response.response:
+        return None
+    structured = json.loads(get_latest_response(await llm_query_async(
+        client=client,
+        contents=response.response,
+        config=inst.STRUCTURER_CONFIG,
+        model=inst.THINKING_MODEL,
+        purpose="structure",
+        label=f"Structuring answer for [{section_name}]({muni_url})"
+    )).response)
+    if not (isinstance(structured, dict) and structured.get("sources")):
+        return None
+    quotes_verified, failed_quotes = verify_quotes_exist(context, structured["sources"])
+    if not quotes_verified:
+        log(f"Answer for [{section_name}]({muni_url}) rejected - {len(failed_quotes)} quote(s) could not be verified\n\n")
+        return None
+    verification = get_latest_response(await llm_query_async(
+        client=client,
+        contents=prompts.VERIFICATION_QUERY_TEMPLATE.format(muni_name=muni_name, query=query, original_response=response.response, context=context),
+        config=inst.THINKER_CONFIG,
+        model=inst.THINKING_MODEL,
+        purpose="verify",
+        label=f"LLM SELF-VERIFICATION [{section_name}]({muni_url})"
+    ))
+    if not verification_passed(verification.response):
+        log(f"Answer for [{section_name}]({muni_url}) rejected, LLM could not verify its own answer\n\n")
+        return None
+    return structured
+
+async def pipelined_search_answerer(client: genai.Client, scraper: scraper.Scraper, muni_name: str, query: str, free_client: genai.Client, search_terms: list[str], visited: set[str], index: section_index.SectionIndex|None=None):
+    """
+    Pipelined search_answerer
+
+    For each search term, the next section is scraped (in a worker thread, the
+    browser is only used by one thread at a time) while the answers for up to
+    PIPELINE_TOP_K earlier sections stream concurrently through the async
+    client. Answers are accepted in search rank order, as in search_answerer:
+    the best ranked section that passes both verification steps wins once every
+    better ranked one is done, and the remaining calls are cancelled.
+
+    :param client: llm client
+    :param scraper: webscraper crawler
+    :param muni_name: municipality name
+    :param query: string query
+    :param free_client: client used for answering
+    :param search_terms: search terms to find context
+    :param visited: set containing the names of visited pages
+    :param index: optional local section index, used instead of the municode search box
+    :return: answer to query
+    """
+    for term in search_terms:
+        log(f"""## Searching "{term}"...\n\n""")
+        sections = search_sections(client, scraper, query, term, index)
+        slots = asyncio.Semaphore(general_args.PIPELINE_TOP_K)
+        tasks: list[asyncio.Task] = [] # in search rank order
+        sections_launched: list[tuple[str, str]] = []
+        failures: list[llm_retry.LLMCallFailed] = []
+        found = asyncio.Event() # some section verified, later ranked sections cannot win
+
+        async def run(section_name: str, muni_url: str, context: str) -> dict|None:
+            try:
+                structured = await answer_section(free_client, query, muni_name, section_name, muni_url, context)
+            except llm_retry.LLMCallFailed as e:
+                log(f"Answer for [{section_name}]({muni_url}) failed ({e})\n\n")
+                failures.append(e)
+                structured = None
+            except json.JSONDecodeError as e: # structurer returned malformed json, reject like a failed check
+                log(f"Answer for [{section_name}]({muni_url}) rejected, structured answer could not be parsed ({e})\n\n")
+                structured = None
+            finally:
+                slots.release()
+            if structured:
+                found.set()
+            return structured
+
+        winner = None
+        try:
+            for section_name, muni_url in sections:
+                if found.is_set():
+                    break
+                page = index.page(muni_url) if index else None
+                if page:
+                    log(f"""## Reading [{section_name}]({muni_url}) from section index\n\n""")
+                    title, context = page.title, page.text
                 else:
+                    log(f"""## Navigating to [{section_name}]({muni_url})\n\n""")
+                    title, context = await asyncio.to_thread(fetch_section, scraper, muni_url) # prefetch while earlier answers stream
+                if title in visited:
                     log(f"""## Already visited, going back...\n\n""")
-    # no answer found. need to move to named tuple or something b/c none_found is not in the schema
+                    continue
+                await slots.acquire()
+                if found.is_set():
+                    slots.release()
+                    break
+                visited.add(title)
+                try:
+                    context = await asyncio.to_thread(trim_context, client, query, context)
+                except llm_retry.LLMCallFailed as e:
+                    log(f"Answer for [{section_name}]({muni_url}) failed ({e})\n\n")
+                    failures.append(e)
+                    slots.release()
+                    continue
+                tasks.append(asyncio.create_task(run(section_name, muni_url, context)))
+                sections_launched.append((section_name, muni_url))
+
+            for n, task in enumerate(tasks):
+                winner = await task
+                if winner:
+                    section_name, muni_url = sections_launched[n]
+                    log(f"Answer from [{section_name}]({muni_url}) passed both verification steps\n\n")
+                    break
+        finally: # also on an unexpected error, so no answer keeps streaming in the background
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                log(f"Cancelled {len(pending)} lower ranked answer(s)\n\n")
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if winner:
+            return QueryResponse.from_dict(winner)
+        if failures: # the term was not fully searched, so "none found" would be wrong
+            raise failures[0]
     return QueryResponse(none_found=True, binary_response=False, sources=[], response_confidence=1)
-    
+
 
 def traversal_answerer(client: genai.Client, scraper: scraper.Scraper, query: str):
     """
@@ -457,8 +779,15 @@ def chatbot_query(client: genai.Client, scraper: scraper.Scraper, state_name: st
     munis = {}
     with open(general_args.MUNICODE_MUNIS, 'r') as file:
         munis = json.load(file)
-    scraper.go(munis[state_name]["municipalities"][muni_name])
-    search_answer = search_answerer(client, scraper, muni_name, query, free_client, search_terms)
+    muni_url = munis[state_name]["municipalities"][muni_name]
+    index = section_index.open_index(muni_url)
+    scraper.go(muni_url)
+    llm_retry.set_failover(free_client, client)
+    try:
+        search_answer = search_answerer(client, scraper, muni_name, query, free_client, search_terms, index=index)
+    except llm_retry.LLMCallFailed as e:
+        log(f"## QUERY FAILED: {e}\n\n")
+        return QueryResponse(none_found=True, binary_response=False, sources=[], response_confidence=1, error=str(e))
     if search_answer and not search_answer.none_found:
         return search_answer
     traversal_answer = traversal_answerer(client, scraper, muni_name, query, free_client)
@@ -467,10 +796,157 @@ def chatbot_query(client: genai.Client, scraper: scraper.Scraper, state_name: st
     return QueryResponse(none_found=True, binary_response=False, sources=[], response_confidence=1)
     
 
+def multi_answer(client: genai.Client, queries: dict[str: str], muni_name: str, muni_url: str, context: str) -> dict[str: str]:
+    """
+    Answer several questions about one page in a single llm call
+
+    :param client: genai client
+    :param queries: dictionary in the format {[policy name]: [query]}
+    :param muni_name: name of municipality
+    :param muni_url: page url
+    :param context: page text in markdown format
+    :return: dictionary in the format {[policy name]: [answer text]} for every question answered
+    """
+    log(f"## ANSWERING {len(queries)} QUESTION(S)\n\n")
+    names = list(queries.keys())
+    questions = "\n\n".join(
+        prompts.MULTI_QUESTION_TEMPLATE.format(n=i + 1, query=queries[name]) for i, name in enumerate(names)
+    )
+    prompt: str = prompts.MULTI_RESPONSE_QUERY_TEMPLATE.format(
+        muni_name=muni_name,
+        muni_url=muni_url,
+        text=context,
+        questions=questions
+    )
+    response = get_latest_response(llm_query(
+        client=client,
+        contents=prompt,
+        config=inst.THINKER_CONFIG,
+        model=inst.THINKING_MODEL,
+        purpose="multi_answer"
+    ))
+    return split_multi_answer(response.response, names)
+
+def split_multi_answer(response: str, names: list[str]) -> dict[str: str]:
+    """
+    Splits a multi-question response into one answer per question
+
+    :param response: response text with "(QUESTION n)" tags
+    :param names: policy names in question order
+    :return: dictionary in the format {[policy name]: [answer text]}
+    """
+    result: dict[str: str] = {}
+    parts = re.split(r"\(QUESTION (\d+)\):?", response)
+    for number, text in zip(parts[1::2], parts[2::2]):
+        index = int(number) - 1
+        if 0 <= index < len(names) and text.strip():
+            if names[index] in result: # question answered in more than one place
+                result[names[index]] += "\n\n" + text.strip()
+            else:
+                result[names[index]] = text.strip()
+    return result
+
+def chatbot_multi_query(client: genai.Client, scraper: scraper.Scraper, state_name: str, muni_name: str, queries: dict[str: dict], free_client: genai.Client|None=None) -> dict[str: QueryResponse]:
+    """
+    Answers all policy questions of a municipality, sending each page to the llm once
+
+    Candidate sections are gathered for every policy first. Each page is then
+    scraped once and answered for all the policies still unanswered that
+    listed it; every answer is structured and verified on its own.
+
+    :param client: llm client
+    :param scraper: webscraper crawler
+    :param state_name: state name
+    :param muni_name: municipality name
+    :param queries: dictionary in the format {[policy name]: {"query": [query], "search_terms": [search terms]}}
+    :param free_client: optional free client to minimize api credit usage
+    :return: dictionary in the format {[policy name]: [QueryResponse]}
+    """
+    if not free_client:
+        print("FREE CLIENT NOT FOUND. USING PAID CLIENT")
+        free_client = client
+    munis = {}
+    with open(general_args.MUNICODE_MUNIS, 'r') as file:
+        munis = json.load(file)
+    muni_url = munis[state_name]["municipalities"][muni_name]
+    index = section_index.open_index(muni_url)
+    scraper.go(muni_url)
+    llm_retry.set_failover(free_client, client)
+    results: dict[str: QueryResponse] = {}
+    error = None
+    try:
+        _multi_query_pages(client, scraper, muni_name, queries, free_client, index, results)
+    except llm_retry.LLMCallFailed as e:
+        log(f"## QUERY FAILED: {e}\n\n")
+        error = str(e) # verified answers so far are kept, the rest are marked as failed
+    for policy in queries:
+        if policy not in results:
+            results[policy] = QueryResponse(none_found=True, binary_response=False, sources=[], response_confidence=1, error=error)
+    return results
+
+def _multi_query_pages(client: genai.Client, scraper: scraper.Scraper, muni_name: str, queries: dict[str: dict], free_client: genai.Client, index: section_index.SectionIndex|None, results: dict[str: QueryResponse]) -> None:
+    # gathers candidate pages for every policy, then answers each page once for its pending policies, filling results
+    pages: dict[str: list[str]] = {} # page url -> policies that listed it, in first-seen order
+    page_names: dict[str: str] = {}
+    for policy, ref in queries.items():
+        query = ref["query"]
+        search_terms = (ref.get("search_terms") or search_term_generator(client, query))[:general_args.SEARCH_TERM_LIMIT]
+        found = 0
+        for term in search_terms:
+            if found >= general_args.MULTI_SECTIONS_PER_POLICY:
+                break
+            log(f"""## Searching "{term}" for {policy}...\n\n""")
+            for section_name, section_url in search_sections(client, scraper, query, term, index):
+                if found >= general_args.MULTI_SECTIONS_PER_POLICY:
+                    break
+                policies = pages.setdefault(section_url, [])
+                if policy not in policies:
+                    policies.append(policy)
+                    page_names.setdefault(section_url, section_name)
+                    found += 1
+
+    visited: set[str] = set()
+    for section_url, policies in pages.items():
+        pending = {policy: queries[policy]["query"] for policy in policies if policy not in results}
+        if not pending:
+            continue
+        page = index.page(section_url) if index else None
+        if page:
+            log(f"""## Reading [{page_names[section_url]}]({section_url}) from section index\n\n""")
+            title, context = page.title, page.text
+        else:
+            log(f"""## Navigating to [{page_names[section_url]}]({section_url})\n\n""")
+            title, context = fetch_section(scraper, section_url)
+        if title in visited:
+            log(f"""## Already visited, going back...\n\n""")
+            continue
+        visited.add(title)
+        context = trim_context(client, "\n\n".join(pending.values()), context)
+        for policy, response in multi_answer(free_client, pending, muni_name, section_url, context).items():
+            if "(NONE)" in response:
+                continue
+            log(f"### {policy}\n\n")
+            structured = structure(free_client, response)
+            if not ("sources" in structured and structured["sources"]):
+                continue
+            quotes_verified, failed_quotes = verify_quotes_exist(context, structured["sources"])
+            if not quotes_verified:
+                log(f"Answer for {policy} rejected - {len(failed_quotes)} quote(s) could not be verified\n\n")
+                continue
+            if llm_verify_answer(client=free_client, query=pending[policy], muni_name=muni_name, context=context, original_response=response):
+                log(f"Answer for {policy} passed both verification steps\n\n")
+                results[policy] = QueryResponse.from_dict(structured)
+            else:
+                log(f"Answer for {policy} rejected, LLM could not verify its own answer\n\n")
+
 # Funcction that checks that the llm did not invent the quote
 def verify_quotes_exist(context: str, sources: list[dict]) -> tuple[bool, list[str]]:
     """
     Verify that all quoted text actually appears in the context
+
+    Case, whitespace and punctuation are ignored. With QUOTE_MAX_EDIT_RATIO > 0
+    quotes may also differ by a few words (never negations or numbers); such
+    fuzzy matches only pass this check, every caller still runs llm_verify_answer.
     
     :param context: The original scraped text
     :param sources: List of source objects with relevant_quotation_from_source
@@ -479,6 +955,7 @@ def verify_quotes_exist(context: str, sources: list[dict]) -> tuple[bool, list[s
     log("### Verifying quotes:\n\n")
     
     failed_quotes = []
+    index = quote_matcher.index_for(context)
     
     for i, source in enumerate(sources):
         quote = source.get("relevant_quotation_from_source", "")
@@ -487,15 +964,15 @@ def verify_quotes_exist(context: str, sources: list[dict]) -> tuple[bool, list[s
             log(f"Source {i+1} has no quote\n\n")
             continue
         
-        # Normalize text
-        normalized_quote = " ".join(quote.split())
-        normalized_context = " ".join(context.split())
-        
-        # Check if quote exists in context
-        if not normalized_quote.lower() in normalized_context.lower():
+        # Check if quote exists in context (ignoring case, whitespace, punctuation and small differences)
+        match = index.find(quote)
+        if match is None:
             log(f"Quote {i+1} not found in source text\n\n")
             log(f"Missing quote: {quote[:200]}{'...' if len(quote) > 200 else ''}\n\n")
             failed_quotes.append(quote)
+        elif not match.exact:
+            found = context[match.start:match.end]
+            log(f"Quote {i+1} matched with {match.distance} word edit(s), left to LLM self-verification: {found[:200]}{'...' if len(found) > 200 else ''}\n\n")
     
     if failed_quotes:
         log(f"Verification failed: {len(failed_quotes)} quote(s) could not be verified\n\n")
@@ -513,13 +990,22 @@ def llm_verify_answer(client: genai.Client, query: str, muni_name: str, context:
     
     verification_prompt = prompts.VERIFICATION_QUERY_TEMPLATE.format(muni_name=muni_name, query=query, original_response=original_response, context=context)
     
-    verification = get_latest_response(llm_query(client, verification_prompt, inst.THINKER_CONFIG, inst.THINKING_MODEL))
+    verification = get_latest_response(llm_query(client, verification_prompt, inst.THINKER_CONFIG, inst.THINKING_MODEL, purpose="verify"))
     
-    if "(VERIFIED)" in verification.response:
+    return verification_passed(verification.response)
+
+def verification_passed(response: str) -> bool:
+    """
+    Reads the self-verification response
+
+    :param response: verification response text
+    :return: True if the LLM confirmed its answer
+    """
+    if "(VERIFIED)" in response:
         log("LLM confirmed its answer\n\n")
         return True
     
-    log("LLM rejected its own answer\n\n" if "(REJECTED)" in verification.response
+    log("LLM rejected its own answer\n\n" if "(REJECTED)" in response
         else "LLM gave unclear verification response\n\n")
     return False
     
@@ -12,4 +12,52 @@ SEARCH_TERM_LIMIT = 3 # only use the first n search terms
 
 LLM_ATTEMPT_LIMIT = 5 # llm timeout after n failed attemps
 
-LLM_ATTEMPT_DELAY = 10 # delay in seconds between llm call attempts
\ No newline at end of file
+LLM_ATTEMPT_DELAY = 10 # base delay in seconds between llm call attempts (see LLM_BACKOFF_MAX)
+
+EMBEDDING_MODEL = "gemini-embedding-001"
+
+EMBEDDING_CACHE = True # cache embeddings on disk so repeated queries/section names are not re-embedded
+
+EMBEDDING_CACHE_PATH = "cache/embeddings.sqlite"
+
+SECTION_INDEX = True # serve search terms from a local per-municipality section index instead of the municode search box
+
+SECTION_INDEX_PATH = "cache/section_index.sqlite"
+
+SECTION_INDEX_MAX_RETRIES = 3 # crawls of a failed page before it is left out of the index
+
+SECTION_INDEX_MAX_DEPTH = 3 # deepest table of contents level crawled (title: 0, chapter: 1, article/section: 2+)
+
+SECTION_INDEX_MAX_AGE_DAYS = 30 # the next build recrawls indexes older than this; None = never
+
+SECTION_INDEX_RESULTS = 10 # max sections returned per search term
+
+PIPELINE_ANSWERS = False # answer the top sections of a search term concurrently (async client) while the next section is scraped; the best ranked verified answer wins, as in the sequential search
+
+PIPELINE_TOP_K = 3 # max concurrent section answers in pipelined mode
+
+MULTI_SECTIONS_PER_POLICY = 5 # multi-question mode: candidate sections gathered per policy before pages are answered
+
+LOG_PROMPT_BODIES = True # with LOG_PROMPTS on, False logs only the prompt size instead of the full prompt (keeps production logs small)
+
+LOG_BUFFER_BYTES = 64 * 1024 # log text buffered in memory before it is written
+
+LOG_FLUSH_INTERVAL = 2 # seconds between background log flushes; None/0 = flush only on boundaries
+
+LLM_CACHE_MODE = "passthrough" # "record": store every gemini response, "replay": serve stored responses only (offline), "passthrough": no cache
+
+LLM_CACHE_PATH = "cache/llm_responses.sqlite"
+
+CONTEXT_TOKEN_BUDGET = 30000 # pages estimated above this many tokens are cut down to their most relevant chunks; None = send full pages
+
+CONTEXT_RANKING = "bm25" # how chunks are ranked against the query: "bm25" or "embedding" (cached embeddings)
+
+LLM_BACKOFF_MAX = 120 # cap in seconds for the exponential retry backoff (starts at LLM_ATTEMPT_DELAY, doubles each attempt, with jitter)
+
+LLM_QUOTA_COOLDOWN = 60 # seconds a client is considered out of quota after a 429
+
+LLM_FAILOVER = True # fail over between the free and paid clients when one is rate limited
+
+QUOTE_MAX_EDIT_RATIO = 0 # fraction of a quote's words that may be changed, added or dropped (never negations or numbers); 0 = exact words, ignoring case, whitespace and punctuation only
+
+QUOTE_SHINGLE_SIZE = 3 # words per shingle in the quote index
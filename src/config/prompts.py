@@ -15,6 +15,20 @@ Below is the document in markdown format from the following link {muni_url}:
 
 Question: {query}\n Response: """
 
+MULTI_RESPONSE_QUERY_TEMPLATE = """Answer each of the following questions on the city/municipality of {muni_name} from the documents provided below for the muni/city of {muni_name}:
+
+Below is the document in markdown format from the following link {muni_url}:
+
+{text}
+
+
+
+Answer every question separately. Start each answer on a new line with the tag of its question (for example "(QUESTION 1)"), followed by the answer in the usual format, or "(NONE)" if the document does not answer that question.
+
+{questions}\n Responses: """
+
+MULTI_QUESTION_TEMPLATE = """(QUESTION {n}): {query}"""
+
 GROUNDER_QUERY_TEMPLATE = """Is this answer accurate for the query "{query}" in regard to the city or municipality of {muni_name}?
 
 Response:
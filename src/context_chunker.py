@@ -0,0 +1,130 @@
+"""
+CONTEXT CHUNKER
+
+Trims long scraped code pages before they are sent to gemini. The markdown from
+scrape_text() is split into chunks at its headings (and at paragraphs inside
+very long sections), the chunks are ranked against the query with BM25 or the
+cached embeddings, and only the best chunks that fit in CONTEXT_TOKEN_BUDGET are
+kept, in page order. The same selection is used for answering, quote checking
+and self-verification, so quotes are always checked against what the llm saw.
+"""
+
+import config.general as general_args
+import embedding_cache
+import section_index
+
+import re
+import numpy as np
+from dataclasses import dataclass
+
+from google import genai
+
+
+CHARS_PER_TOKEN = 4 # rough token estimate for budgeting
+CHUNK_MAX_CHARS = 4000 # sections longer than this are split at paragraphs
+CHUNK_GAP = "\n\n[...]\n\n" # marks text left out between kept chunks
+
+_HEADING_RE = re.compile(r"^#{1,6} ", re.MULTILINE)
+
+
+@dataclass
+class ContextSelection:
+    text: str
+    chunks_kept: int
+    chunks_total: int
+    chars_total: int
+
+    @property
+    def trimmed(self) -> bool:
+        return self.chunks_kept < self.chunks_total or len(self.text) < self.chars_total
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def split_chunks(markdown: str, max_chars: int=CHUNK_MAX_CHARS) -> list[str]:
+    """
+    Splits scraped markdown at headings, then long sections at paragraphs
+
+    Paragraph pieces of a long section repeat its heading so each chunk keeps
+    its section name.
+
+    :param markdown: scraped page text
+    :param max_chars: max characters before a section is split further
+    :return: list of chunks in page order
+    """
+    starts = [m.start() for m in _HEADING_RE.finditer(markdown)]
+    if not starts or starts[0] != 0:
+        starts = [0] + starts
+    sections = [markdown[a:b] for a, b in zip(starts, starts[1:] + [len(markdown)])]
+
+    chunks: list[str] = []
+    for section in sections:
+        if not section.strip():
+            continue
+        if len(section) <= max_chars:
+            chunks.append(section)
+            continue
+        first_line, _, body = section.partition("\n")
+        heading = first_line + "\n\n" if _HEADING_RE.match(first_line) else ""
+        if not heading:
+            body = section
+        current = ""
+        for paragraph in body.split("\n\n"):
+            if current and len(current) + len(paragraph) > max_chars:
+                chunks.append(heading + current)
+                current = ""
+            current += paragraph + "\n\n"
+        if current.strip():
+            chunks.append(heading + current)
+    return chunks
+
+
+def _rank(client: genai.Client|None, query: str, chunks: list[str]) -> list[int]:
+    if general_args.CONTEXT_RANKING == "embedding" and client:
+        query_vector = embedding_cache.embed(client, [query], task_type="RETRIEVAL_QUERY")[0]
+        vectors = np.array(embedding_cache.embed(client, chunks, task_type="RETRIEVAL_DOCUMENT"))
+        norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+        norms[norms == 0] = 1.0
+        scores = list(vectors @ query_vector / norms)
+    else:
+        bm25 = section_index.BM25([section_index.tokenize(chunk) for chunk in chunks])
+        scores = bm25.scores(section_index.tokenize(query))
+    return sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True)
+
+
+def select_context(client: genai.Client|None, query: str, markdown: str, budget: int|None=None) -> ContextSelection:
+    """
+    Keeps the chunks most relevant to the query that fit in the token budget
+
+    Pages within the budget are returned unchanged.
+
+    :param client: genai client (only used for embedding ranking)
+    :param query: query (or queries) the context must answer
+    :param markdown: scraped page text
+    :param budget: token budget (defaults to CONTEXT_TOKEN_BUDGET, None/0 = no limit)
+    :return: ContextSelection
+    """
+    budget = budget if budget is not None else general_args.CONTEXT_TOKEN_BUDGET
+    if not budget or estimate_tokens(markdown) <= budget:
+        return ContextSelection(markdown, 1, 1, len(markdown))
+    chunks = split_chunks(markdown)
+    ranking = _rank(client, query, chunks)
+    kept: list[int] = []
+    used = 0
+    for i in ranking:
+        cost = estimate_tokens(chunks[i])
+        if used + cost > budget:
+            continue
+        kept.append(i)
+        used += cost
+    if not kept: # a single chunk bigger than the whole budget
+        return ContextSelection(chunks[ranking[0]][:budget * CHARS_PER_TOKEN], 1, len(chunks), len(markdown))
+    kept.sort()
+    text = ""
+    for n, i in enumerate(kept):
+        if (n and kept[n - 1] != i - 1) or (not n and i):
+            text += CHUNK_GAP
+        text += chunks[i]
+    return ContextSelection(text, len(kept), len(chunks), len(markdown))
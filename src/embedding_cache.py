@@ -0,0 +1,203 @@
+"""
+EMBEDDING CACHE
+
+Persistent on-disk cache for gemini embeddings used by the chatbot relevance
+sorting. Vectors are keyed by (model, task_type, sha1(text)), so the same query
+text and the same Municode section names are only embedded once across
+municipalities, search terms and runs. Only cache misses are sent to the
+embedding API, batched into as few calls as possible.
+"""
+
+import config.general as general_args
+import llm_metrics
+import llm_retry
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+from google import genai
+from google.genai import types
+from google.genai.errors import ClientError, ServerError
+
+
+EMBED_BATCH_LIMIT = 100 # max texts per embed_content request
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model       TEXT NOT NULL,
+    task_type   TEXT NOT NULL,
+    text_hash   TEXT NOT NULL,
+    dim         INTEGER NOT NULL,
+    vector      BLOB NOT NULL,
+    PRIMARY KEY (model, task_type, text_hash)
+);
+"""
+
+
+def text_hash(text: str) -> str:
+    """
+    Stable hash of an embedded text
+
+    :param text: input text
+    :return: sha1 hex digest
+    """
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    sqlite backed vector store with hit/miss counters
+    """
+    def __init__(self, path: str):
+        self.path: str = path
+        self.hits: int = 0
+        self.misses: int = 0
+        self._lock = threading.Lock()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    def get_many(self, model: str, task_type: str, hashes: list[str]) -> dict[str, np.ndarray]:
+        """
+        Look up cached vectors
+
+        :param model: embedding model
+        :param task_type: embedding task type
+        :param hashes: text hashes to look up
+        :return: dictionary of text hash -> vector for every hash found
+        """
+        found: dict[str, np.ndarray] = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            for start in range(0, len(unique), 500): # stay under sqlite's variable limit
+                chunk = unique[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND task_type = ? "
+                    f"AND text_hash IN ({','.join('?' * len(chunk))})",
+                    [model, task_type, *chunk],
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32).astype(np.float64)
+        return found
+
+    def put_many(self, model: str, task_type: str, items: dict[str, np.ndarray]) -> None:
+        """
+        Store vectors
+
+        :param model: embedding model
+        :param task_type: embedding task type
+        :param items: dictionary of text hash -> vector
+        """
+        rows = [
+            (model, task_type, h, len(v), np.asarray(v, dtype=np.float32).tobytes())
+            for h, v in items.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, task_type, text_hash, dim, vector) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def record(self, hits: int, misses: int) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def stats(self) -> str:
+        """
+        Hit-rate summary for the log
+
+        :return: markdown-friendly stats line
+        """
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"embedding cache: {self.hits}/{total} hits ({rate:.0%}), {self.misses} embedded"
+
+
+_cache: EmbeddingCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> EmbeddingCache | None:
+    """
+    Process-wide cache, opened on first use (None when caching is off)
+    """
+    global _cache
+    if not general_args.EMBEDDING_CACHE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache(general_args.EMBEDDING_CACHE_PATH)
+    return _cache
+
+
+def _embed_batch(client: genai.Client, batch: list[str], task_type: str, model: str) -> list[np.ndarray]:
+    # same retry policy as llm_query: backoff on 5xx/429, failover to the partner client
+    purpose = f"embed_{task_type.lower()}"
+    attempt = 1
+    while True:
+        active = llm_retry.pick_client(client)
+        timer = llm_metrics.CallTimer()
+        try:
+            result = active.models.embed_content(
+                model=model,
+                contents=batch,
+                config=types.EmbedContentConfig(task_type=task_type),
+            )
+        except (ServerError, ClientError) as e:
+            llm_metrics.record("embed", model, purpose=purpose, wall_s=timer.elapsed(), retries=attempt - 1, failed=True)
+            delay = llm_retry.next_delay(active, e, attempt)
+            if delay is None:
+                raise llm_retry.LLMCallFailed(purpose, model, attempt, e) from e
+            time.sleep(delay)
+            attempt += 1
+            continue
+        llm_metrics.record("embed", model, purpose=purpose, n_texts=len(batch), wall_s=timer.elapsed(), retries=attempt - 1)
+        # rounded through float32 like stored vectors, so a miss and a later hit score the same
+        return [np.asarray(e.values, dtype=np.float32).astype(np.float64) for e in result.embeddings]
+
+
+def _embed_uncached(client: genai.Client, texts: list[str], task_type: str, model: str) -> list[np.ndarray]:
+    vectors: list[np.ndarray] = []
+    for start in range(0, len(texts), EMBED_BATCH_LIMIT):
+        vectors += _embed_batch(client, texts[start:start + EMBED_BATCH_LIMIT], task_type, model)
+    return vectors
+
+
+def embed(client: genai.Client, texts: list[str], task_type: str="SEMANTIC_SIMILARITY", model: str|None=None) -> list[np.ndarray]:
+    """
+    Embed texts, serving repeats from the cache
+
+    :param client: genai client
+    :param texts: texts to embed
+    :param task_type: gemini embedding task type
+    :param model: embedding model (defaults to EMBEDDING_MODEL)
+    :return: one vector per input text, in input order
+    :raises llm_retry.LLMCallFailed: when an embedding call fails after all retries
+    """
+    model = model or general_args.EMBEDDING_MODEL
+    texts = list(texts)
+    cache = get_cache()
+    if cache is None:
+        return _embed_uncached(client, texts, task_type, model)
+
+    hashes = [text_hash(t) for t in texts]
+    found = cache.get_many(model, task_type, hashes)
+    missing: dict[str, str] = {}
+    for h, t in zip(hashes, texts):
+        if h not in found and h not in missing:
+            missing[h] = t
+    if missing:
+        fresh = _embed_uncached(client, list(missing.values()), task_type, model)
+        new_items = dict(zip(missing.keys(), fresh))
+        cache.put_many(model, task_type, new_items)
+        found.update(new_items)
+    cache.record(hits=len(texts) - len(missing), misses=len(missing))
+    return [found[h] for h in hashes]
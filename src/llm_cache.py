@@ -0,0 +1,148 @@
+"""
+LLM CACHE
+
+Record/replay cache for gemini generate calls. Responses (thoughts + text) are
+stored in sqlite keyed by sha1 of (model, config, contents), so a batch run can
+be recorded once and then rerun offline and deterministically, e.g. after a
+change to scoring or evaluation that does not touch the prompts.
+
+Modes (LLM_CACHE_MODE in config/general.py):
+    - "passthrough": always call the api, nothing is stored
+    - "record": always call the api and store every response
+    - "replay": only serve stored responses, a miss raises ReplayMiss (chatbot
+      turns it into llm_retry.LLMCallFailed, so the query is reported as failed)
+"""
+
+import config.general as general_args
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+MODES = ("passthrough", "record", "replay")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key         TEXT PRIMARY KEY,
+    model       TEXT NOT NULL,
+    thinking    TEXT NOT NULL,
+    response    TEXT NOT NULL,
+    created_at  REAL NOT NULL
+);
+"""
+
+
+class ReplayMiss(KeyError):
+    """
+    Raised in replay mode when a call was never recorded
+    """
+
+
+def _jsonable(obj):
+    if hasattr(obj, "model_dump"): # genai types are pydantic models
+        return obj.model_dump(mode="json", exclude_none=True)
+    raise TypeError(f"cannot key {type(obj).__name__}")
+
+
+def call_key(model: str, config, contents) -> str:
+    """
+    Content address of a generate call
+
+    :param model: llm model
+    :param config: gemini config
+    :param contents: prompt/content history
+    :return: sha1 hex digest
+    """
+    payload = json.dumps([model, config, contents], default=_jsonable, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    sqlite backed response store
+    """
+    def __init__(self, path: str):
+        self.path: str = path
+        self._lock = threading.Lock()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    def get(self, key: str) -> tuple[str, str]|None:
+        with self._lock:
+            row = self._conn.execute("SELECT thinking, response FROM responses WHERE key = ?", (key,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put(self, key: str, model: str, thinking: str, response: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, thinking, response, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, model, thinking, response, time.time()),
+            )
+            self._conn.commit()
+
+
+_cache: LLMCache|None = None
+_cache_lock = threading.Lock()
+
+
+def mode() -> str:
+    """
+    Current cache mode (validated LLM_CACHE_MODE)
+    """
+    current = general_args.LLM_CACHE_MODE
+    if current not in MODES:
+        raise ValueError(f"LLM_CACHE_MODE must be one of {MODES}, got {current!r}")
+    return current
+
+
+def get_cache() -> LLMCache|None:
+    """
+    Process-wide cache, opened on first use (None in passthrough mode)
+    """
+    global _cache
+    if mode() == "passthrough":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(general_args.LLM_CACHE_PATH)
+    return _cache
+
+
+def lookup(model: str, config, contents) -> tuple[str, str]|None:
+    """
+    Recorded (thinking, response) for a call in replay mode
+
+    :param model: llm model
+    :param config: gemini config
+    :param contents: prompt/content history
+    :return: (thinking, response), or None when the api should be called
+    """
+    if mode() != "replay":
+        return None
+    key = call_key(model, config, contents)
+    found = get_cache().get(key)
+    if found is None:
+        raise ReplayMiss(f"no recorded response for {model} call {key} (LLM_CACHE_MODE = \"replay\")")
+    return found
+
+
+def store(model: str, config, contents, thinking: str, response: str) -> None:
+    """
+    Save a live response in record mode
+
+    :param model: llm model
+    :param config: gemini config
+    :param contents: prompt/content history
+    :param thinking: streamed thoughts
+    :param response: streamed response
+    """
+    if mode() != "record":
+        return
+    get_cache().put(call_key(model, config, contents), model, thinking, response)
@@ -0,0 +1,174 @@
+"""
+LLM METRICS
+
+Token and latency accounting for the chatbot's gemini calls. Every generate
+call records its model, purpose (answer, structure, search_terms, ...), prompt/
+response/thinking token counts from the usage metadata, wall time, time to
+first token and retry count; every embedding request records its size and time.
+
+Records are tagged with the city/policy set by scope(), so a batch run can be
+aggregated per query, per city and for the whole run. write_report() writes the
+aggregates to llm_metrics.json and appends the raw calls to llm_calls.jsonl.
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+
+
+_tags: contextvars.ContextVar[dict] = contextvars.ContextVar("llm_metrics_tags", default={})
+
+RUN_ID = time.strftime("%Y%m%d-%H%M%S")
+
+
+@dataclass
+class CallRecord:
+    kind: str # "generate" or "embed"
+    model: str
+    purpose: str = ""
+    city: str = ""
+    policy: str = ""
+    prompt_tokens: int = 0
+    response_tokens: int = 0
+    thinking_tokens: int = 0
+    total_tokens: int = 0
+    n_texts: int = 0 # embed: texts sent to the api
+    wall_s: float = 0.0
+    ttft_s: float|None = None
+    retries: int = 0
+    replayed: bool = False
+    failed: bool = False
+    run_id: str = field(default=RUN_ID)
+
+
+_records: list[CallRecord] = []
+_written = 0
+_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def scope(**tags):
+    """
+    Tag every call made inside the block (e.g. city=..., policy=...)
+    """
+    token = _tags.set({**_tags.get(), **tags})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+
+def record(kind: str, model: str, **values) -> CallRecord:
+    """
+    Store one call, tagged with the current scope
+
+    :param kind: "generate" or "embed"
+    :param model: model name
+    :param values: CallRecord fields
+    :return: stored record
+    """
+    tags = _tags.get()
+    rec = CallRecord(kind=kind, model=model, city=tags.get("city", ""), policy=tags.get("policy", ""), **values)
+    with _lock:
+        _records.append(rec)
+    return rec
+
+
+def usage_counts(usage) -> dict[str, int]:
+    """
+    Token counts from a gemini usage_metadata object (zeros if missing)
+    """
+    if usage is None:
+        return {}
+    return {
+        "prompt_tokens": usage.prompt_token_count or 0,
+        "response_tokens": usage.candidates_token_count or 0,
+        "thinking_tokens": usage.thoughts_token_count or 0,
+        "total_tokens": usage.total_token_count or 0,
+    }
+
+
+class CallTimer:
+    """
+    Wall time and time-to-first-token of one streamed call
+    """
+    def __init__(self):
+        self.start: float = time.perf_counter()
+        self.ttft: float|None = None
+
+    def first_token(self) -> None:
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.start
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+
+def _aggregate(records: list[CallRecord]) -> dict:
+    ttfts = [r.ttft_s for r in records if r.ttft_s is not None]
+    result = {
+        "calls": len(records),
+        "generate_calls": sum(r.kind == "generate" for r in records),
+        "embed_calls": sum(r.kind == "embed" for r in records),
+        "embedded_texts": sum(r.n_texts for r in records),
+        "prompt_tokens": sum(r.prompt_tokens for r in records),
+        "response_tokens": sum(r.response_tokens for r in records),
+        "thinking_tokens": sum(r.thinking_tokens for r in records),
+        "total_tokens": sum(r.total_tokens for r in records),
+        "wall_s": round(sum(r.wall_s for r in records), 3),
+        "mean_ttft_s": round(sum(ttfts) / len(ttfts), 3) if ttfts else None,
+        "retries": sum(r.retries for r in records),
+        "replayed": sum(r.replayed for r in records),
+        "failed": sum(r.failed for r in records),
+        "by_purpose": {},
+    }
+    for purpose in sorted({r.purpose for r in records}):
+        subset = [r for r in records if r.purpose == purpose]
+        result["by_purpose"][purpose or subset[0].kind] = {
+            "calls": len(subset),
+            "total_tokens": sum(r.total_tokens for r in subset),
+            "wall_s": round(sum(r.wall_s for r in subset), 3),
+        }
+    return result
+
+
+def summary() -> dict:
+    """
+    Aggregates for this run: total, per city and per (city, policy) query
+    """
+    with _lock:
+        records = list(_records)
+    by_city: dict[str, list[CallRecord]] = {}
+    by_query: dict[str, list[CallRecord]] = {}
+    for r in records:
+        by_city.setdefault(r.city, []).append(r)
+        by_query.setdefault(f"{r.city} | {r.policy}", []).append(r)
+    return {
+        "run_id": RUN_ID,
+        "total": _aggregate(records),
+        "by_city": {city: _aggregate(rs) for city, rs in by_city.items()},
+        "by_query": {query: _aggregate(rs) for query, rs in by_query.items()},
+    }
+
+
+def write_report(folder: str) -> None:
+    """
+    Writes llm_metrics.json (run aggregates) and appends new calls to llm_calls.jsonl
+
+    :param folder: output folder (next to the results csv)
+    """
+    global _written
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, "llm_metrics.json"), "w", encoding="utf-8") as f:
+        json.dump(summary(), f, indent=2)
+    with _lock:
+        new = _records[_written:]
+        _written = len(_records)
+    with open(os.path.join(folder, "llm_calls.jsonl"), "a", encoding="utf-8") as f:
+        for r in new:
+            f.write(json.dumps(asdict(r)) + "\n")
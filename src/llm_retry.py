@@ -0,0 +1,110 @@
+"""
+LLM RETRY
+
+Retry policy for gemini calls. Server errors (5xx) and rate limits (429) are
+retried with exponential backoff and jitter. A client that hits a 429 is
+treated as out of quota for LLM_QUOTA_COOLDOWN seconds, and calls fail over to
+its partner client (free <-> paid, see set_failover) in the meantime. When the
+attempts run out, LLMCallFailed is raised instead of exiting, so the caller can
+record a failed query and keep going.
+"""
+
+import config.general as general_args
+
+import random
+import threading
+import time
+
+from google import genai
+from google.genai.errors import ClientError, ServerError
+
+
+class LLMCallFailed(Exception):
+    """
+    A gemini call that failed after all retries (or with a non retryable error)
+    """
+    def __init__(self, purpose: str, model: str, attempts: int, error: Exception):
+        self.purpose: str = purpose
+        self.model: str = model
+        self.attempts: int = attempts
+        self.error: Exception = error
+        super().__init__(f"{purpose or 'llm'} call to {model} failed after {attempts} attempt(s): {error}")
+
+
+_lock = threading.Lock()
+_partners: dict[int, genai.Client] = {}
+_cooldown_until: dict[int, float] = {}
+
+
+def set_failover(free_client: genai.Client|None, paid_client: genai.Client|None) -> None:
+    """
+    Pair the free and paid clients so a rate limited one fails over to the other
+
+    :param free_client: free tier client
+    :param paid_client: paid client
+    """
+    if not general_args.LLM_FAILOVER or not free_client or not paid_client or free_client is paid_client:
+        return
+    with _lock:
+        _partners[id(free_client)] = paid_client
+        _partners[id(paid_client)] = free_client
+
+
+def _cooling(client: genai.Client, now: float) -> bool:
+    return _cooldown_until.get(id(client), 0.0) > now
+
+
+def pick_client(client: genai.Client) -> genai.Client:
+    """
+    Client to use for the next attempt: the requested one unless it is out of quota and its partner is not
+
+    :param client: requested client
+    :return: client to call
+    """
+    now = time.monotonic()
+    with _lock:
+        partner = _partners.get(id(client))
+        if partner is not None and _cooling(client, now) and not _cooling(partner, now):
+            return partner
+    return client
+
+
+def is_rate_limit(error: Exception) -> bool:
+    return isinstance(error, ClientError) and getattr(error, "code", None) == 429
+
+
+def is_retryable(error: Exception) -> bool:
+    return isinstance(error, ServerError) or is_rate_limit(error)
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Exponential backoff with jitter: half the capped delay plus a random half
+
+    :param attempt: failed attempt number (1 = first attempt)
+    :return: seconds to wait
+    """
+    delay = min(general_args.LLM_BACKOFF_MAX, general_args.LLM_ATTEMPT_DELAY * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def next_delay(client: genai.Client, error: Exception, attempt: int) -> float|None:
+    """
+    Decides what happens after a failed attempt
+
+    :param client: client that failed
+    :param error: raised error
+    :param attempt: failed attempt number
+    :return: seconds to wait before the next attempt, or None to give up
+    """
+    if not is_retryable(error) or attempt >= general_args.LLM_ATTEMPT_LIMIT:
+        return None
+    delay = backoff_delay(attempt)
+    if is_rate_limit(error):
+        now = time.monotonic()
+        with _lock:
+            _cooldown_until[id(client)] = now + max(delay, general_args.LLM_QUOTA_COOLDOWN)
+            partner = _partners.get(id(client))
+            if partner is not None and not _cooling(partner, now):
+                return 0.0 # fail over right away
+    return delay
@@ -0,0 +1,170 @@
+"""
+QUOTE MATCHER
+
+Finds the llm's quotes in the context it was given. The context is normalized
+once (lowercase words, punctuation and whitespace dropped, curly quotes and
+dashes folded) and indexed by word shingles; each quote is then looked up
+exactly and, failing that (only if QUOTE_MAX_EDIT_RATIO > 0), matched with a
+bounded word-level edit distance around the positions its shingles point to.
+Edits may never add, drop or change a negation or a word with a digit in it, so
+a fuzzy match cannot flip "shall not" or change a number. Matches carry the
+character span of the original context, so a fuzzy hit can be logged next to
+the quote.
+"""
+
+import config.general as general_args
+
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+
+
+MAX_CANDIDATES = 5 # alignment positions tried per quote
+
+_WORD_RE = re.compile(r"\w+")
+_DIGIT_RE = re.compile(r"\d")
+NEGATIONS = frozenset({"not", "no", "never", "nor", "neither", "none", "nothing", "without", "cannot", "except", "unless", "prohibited", "t"}) # "t" from "don't", "shan't"
+_FOLD = str.maketrans({"‘": "'", "’": "'", "“": '"', "”": '"', "–": "-", "—": "-", "§": " "})
+
+
+@dataclass
+class QuoteMatch:
+    start: int # character span in the original context
+    end: int
+    distance: int # word edits, 0 = exact
+
+    @property
+    def exact(self) -> bool:
+        return self.distance == 0
+
+
+def words(text: str) -> list[tuple[str, int, int]]:
+    """
+    Normalized words with their character span in the text
+
+    :param text: input text
+    :return: list of (word, start, end)
+    """
+    folded = unicodedata.normalize("NFKC", text).translate(_FOLD).lower()
+    if len(folded) != len(text): # normalization changed the length, spans would drift
+        folded = text.translate(_FOLD).lower()
+    return [(m.group(), m.start(), m.end()) for m in _WORD_RE.finditer(folded)]
+
+
+def protected(word: str) -> bool:
+    """
+    Words a fuzzy match may not add, drop or change (negations and numbers)
+    """
+    return word in NEGATIONS or bool(_DIGIT_RE.search(word))
+
+
+class QuoteIndex:
+    """
+    Word shingle index over one context
+    """
+    def __init__(self, context: str, shingle_size: int|None=None):
+        self.context: str = context
+        self.shingle_size: int = shingle_size or general_args.QUOTE_SHINGLE_SIZE
+        spans = words(context)
+        self._words: list[str] = [w for w, _, _ in spans]
+        self._spans: list[tuple[int, int]] = [(a, b) for _, a, b in spans]
+        self._shingles: dict[tuple[str, ...], list[int]] = {}
+        k = self.shingle_size
+        for i in range(len(self._words) - k + 1):
+            self._shingles.setdefault(tuple(self._words[i:i + k]), []).append(i)
+        self._positions: dict[str, list[int]] = {}
+        for i, w in enumerate(self._words):
+            self._positions.setdefault(w, []).append(i)
+
+    def _span(self, first: int, last: int) -> tuple[int, int]:
+        return self._spans[first][0], self._spans[last][1]
+
+    def _exact(self, quote: list[str]) -> int|None:
+        k = self.shingle_size
+        starts = self._shingles.get(tuple(quote[:k]), []) if len(quote) >= k else self._positions.get(quote[0], [])
+        n = len(quote)
+        for i in starts:
+            if self._words[i:i + n] == quote:
+                return i
+        return None
+
+    def _candidates(self, quote: list[str]) -> list[int]:
+        k = self.shingle_size
+        votes: Counter = Counter()
+        for q in range(len(quote) - k + 1):
+            for p in self._shingles.get(tuple(quote[q:q + k]), []):
+                votes[p - q] += 1
+        return [p for p, _ in votes.most_common(MAX_CANDIDATES)]
+
+    def _align(self, quote: list[str], offset: int, max_edits: int) -> tuple[int, int, int]|None:
+        # semi-global edit distance: the whole quote against any run of words in the window.
+        # Edits touching a negation or a number cost more than the whole budget, and the
+        # first and last quote words must line up with context words, so the span cannot
+        # stop just short of a "not" by dropping quote words at its edges.
+        lo = max(0, offset - max_edits)
+        window = self._words[lo:offset + len(quote) + max_edits]
+        banned = max_edits + 1
+        window_cost = [banned if protected(other) else 1 for other in window]
+        previous = [0] * (len(window) + 1)
+        starts = list(range(len(window) + 1))
+        ends: list[tuple[int, int]] = []
+        for i, word in enumerate(quote, 1):
+            word_cost = banned if protected(word) else 1
+            current = [previous[0] + banned] + [0] * len(window)
+            current_starts = [0] + [0] * len(window)
+            ends = [(banned, 0)]
+            for j, other in enumerate(window, 1):
+                diagonal = (previous[j - 1] + (0 if word == other else max(word_cost, window_cost[j - 1])), starts[j - 1])
+                options = (
+                    diagonal,
+                    (previous[j] + (banned if i == 1 else word_cost), starts[j]),
+                    (current[j - 1] + window_cost[j - 1], current_starts[j - 1]),
+                )
+                current[j], current_starts[j] = min(options)
+                ends.append(diagonal)
+            if min(current) > max_edits:
+                return None
+            previous, starts = current, current_starts
+        best = min(range(1, len(window) + 1), key=lambda j: ends[j][0])
+        distance, start = ends[best]
+        if distance > max_edits or start >= best:
+            return None
+        return distance, lo + start, lo + best - 1
+
+    def find(self, quote: str, max_edit_ratio: float|None=None) -> QuoteMatch|None:
+        """
+        Locate a quote in the context
+
+        :param quote: quoted text
+        :param max_edit_ratio: allowed word edits as a fraction of the quote length (defaults to QUOTE_MAX_EDIT_RATIO)
+        :return: QuoteMatch, or None if the quote is not in the context
+        """
+        quote_words = [w for w, _, _ in words(quote)]
+        if not quote_words or not self._words:
+            return None
+        exact = self._exact(quote_words)
+        if exact is not None:
+            return QuoteMatch(*self._span(exact, exact + len(quote_words) - 1), 0)
+        ratio = general_args.QUOTE_MAX_EDIT_RATIO if max_edit_ratio is None else max_edit_ratio
+        max_edits = int(ratio * len(quote_words))
+        if not max_edits:
+            return None
+        best = None
+        for offset in self._candidates(quote_words):
+            aligned = self._align(quote_words, offset, max_edits)
+            if aligned and (best is None or aligned[0] < best[0]):
+                best = aligned
+        if best is None:
+            return None
+        distance, first, last = best
+        return QuoteMatch(*self._span(first, last), distance)
+
+
+@lru_cache(maxsize=8)
+def index_for(context: str) -> QuoteIndex:
+    """
+    Shared index for a context (the same page is checked for several answers)
+    """
+    return QuoteIndex(context)
@@ -0,0 +1,119 @@
+"""
+[PolicyMap tooling] Startup-time benchmark for the pipeline entry points.
+
+Measures how long each stage script takes to import (everything that runs
+before main() does real work) and which heavy libraries that import pulls in.
+Each measurement runs in a fresh interpreter so module caches from one script
+cannot hide the cost of another.
+
+A skip-only resume of Stage 2, or a search-line run that only reads caches,
+should not load torch/transformers or the fetch stack. If a heavy module shows
+up in the "loaded at import" column for a stage that does not need it at
+startup, an eager top-level import has crept back in.
+
+Usage:
+  python src/scrapers/bench_startup.py
+"""
+
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+
+SCRAPERS_DIR = Path(__file__).resolve().parent
+
+ENTRY_POINTS = [
+    "extract_from_policymap",
+    "enrich_policymap_with_gemma",
+    "merge_policymap_csv",
+    "export_waiting_for_google_search",
+    "google_search",
+    "google_search_stage2",
+    "merge_google_search_results",
+]
+
+# Modules worth reporting when they are loaded at import time.
+HEAVY_MODULES = [
+    "torch",
+    "transformers",
+    "pandas",
+    "pyarrow",
+    "requests",
+    "bs4",
+    "curl_cffi",
+    "cloudscraper",
+    "playwright",
+    "fitz",
+    "pypdf",
+]
+
+REPEATS = 5
+
+_PROBE = """
+import json, sys, time
+sys.path.insert(0, {scrapers_dir!r})
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+heavy = {heavy!r}
+# utils.lazy_import proxies are not in sys.modules; the check below only guards
+# against a lazy stand-in registered there by some other mechanism.
+loaded = [m for m in heavy if m in sys.modules and type(sys.modules[m]).__name__ != "_LazyModule"]
+print(json.dumps({{"seconds": elapsed, "loaded": loaded}}))
+"""
+
+
+def _probe_once(module: str) -> tuple[float | None, list[str], str]:
+    """Return (import_seconds_or_None, heavy_modules_loaded, error)."""
+    code = _PROBE.format(scrapers_dir=str(SCRAPERS_DIR), module=module, heavy=HEAVY_MODULES)
+    proc = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=str(SCRAPERS_DIR),
+    )
+    if proc.returncode != 0:
+        last = (proc.stderr.strip().splitlines() or ["unknown error"])[-1]
+        return None, [], last[:120]
+    try:
+        data = json.loads(proc.stdout.strip().splitlines()[-1])
+    except Exception as e:
+        return None, [], f"bad probe output: {type(e).__name__}"
+    return float(data["seconds"]), list(data["loaded"]), ""
+
+
+def bench_entry_point(module: str, repeats: int = REPEATS) -> dict:
+    timings = []
+    loaded: list[str] = []
+    error = ""
+    for _ in range(repeats):
+        seconds, loaded, error = _probe_once(module)
+        if seconds is None:
+            break
+        timings.append(seconds)
+    return {
+        "module": module,
+        "median_ms": round(statistics.median(timings) * 1000, 1) if timings else None,
+        "min_ms": round(min(timings) * 1000, 1) if timings else None,
+        "loaded_at_import": loaded,
+        "error": error,
+    }
+
+
+def main() -> None:
+    print(f"Python:  {sys.executable}")
+    print(f"Repeats: {REPEATS} (fresh interpreter each)\n")
+    print(f"{'entry point':<36} {'median ms':>10} {'min ms':>8}  loaded at import")
+    for module in ENTRY_POINTS:
+        r = bench_entry_point(module)
+        if r["error"]:
+            print(f"{module:<36} {'-':>10} {'-':>8}  import failed: {r['error']}")
+            continue
+        loaded = ", ".join(r["loaded_at_import"]) or "(none)"
+        print(f"{module:<36} {r['median_ms']:>10} {r['min_ms']:>8}  {loaded}")
+
+
+if __name__ == "__main__":
+    main()
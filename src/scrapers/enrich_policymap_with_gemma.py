@@ -24,6 +24,7 @@ Recommended optional dependency:
   pip install bitsandbytes accelerate transformers
 """
 
+import hashlib
 import json
 import re
 import sys
@@ -31,9 +32,12 @@ from datetime import datetime, timedelta
 from pathlib import Path
 
 import pandas as pd
-import torch
 from tqdm import tqdm
 
+# torch/transformers are imported inside the model helpers below. A resume run
+# where every remaining row is skipped before the LLM should not pay the
+# multi-second torch import or CUDA probe.
+
 
 # ---------------------------------------------------------------------
 # Config
@@ -58,6 +62,14 @@ GOOGLE_SEARCH_TESTING_MODE = False
 GOOGLE_SEARCH_INPUT_FILE = OUT_DIR / f"{Path(CSV_FILENAME).stem}.brave_forstage2.parquet"
 GOOGLE_SEARCH_OUTPUT_FILE = OUT_DIR / f"{Path(CSV_FILENAME).stem}.brave_enriched.parquet"
 
+# Multi-candidate mode. When the input carries a candidate_rank column
+# (google_search_stage2.py with KEEP_ALL_CANDIDATES = True), a row_key may have
+# several candidate pages. All of them go through the deterministic layer
+# first; rows with no reliable deterministic date send every candidate to the
+# LLM, LLM_BATCH_SIZE prompts per generate() call. One winner per row_key is
+# kept, picked by reliability_rank().
+LLM_BATCH_SIZE = 4
+
 MODEL_ID = "google/gemma-4-E4B-it"
 USE_4BIT_QUANT = True
 
@@ -68,17 +80,48 @@ DEFAULT_EFFECTIVE_DELTA_DAYS = 30
 RAW_OUTPUT_KEEP_CHARS = 1200
 LLM_CONTEXT_KEEP_CHARS = 1200
 
+# Heavy per-row diagnostics are kept out of the enriched table. They go to an
+# append-only sidecar dataset keyed by row_key, <output>.diagnostics/part-*.parquet,
+# so checkpoint rewrites and merge_policymap_csv.py only touch narrow rows.
+# The parts are compacted into one at the end of each run.
+# Use join_diagnostics() to bring them back for debugging.
+DIAGNOSTIC_COLS = ["snippets_json", "llm_raw_output", "llm_context_preview"]
+
 # Only day-level dates are allowed to become adopted_date/effective_date.
 # Month/year-only evidence is recorded diagnostically but not converted into
 # a precise date.
 ACCEPT_PARTIAL_DATES_AS_ADOPTED = False
 
+# Incremental re-runs. Every enriched row stores an input_fingerprint of its
+# snippets, the row metadata below, MODEL_ID and RULE_VERSION. On resume, a row
+# is re-enriched when its fingerprint changed (e.g. Stage 1 refetched a page),
+# instead of being kept stale just because its row_key is already present.
+# Bump RULE_VERSION whenever the prompt, snippet selection or deterministic
+# date rules change in a way that should re-score existing rows.
+RULE_VERSION = "v2"
+FINGERPRINT_FIELDS = [
+    "city",
+    "policy_type",
+    "number",
+    "title",
+    "chapter",
+    "section_program",
+    "source_url",
+    "fetch_status",                 # hashed as fetch_status_class(), see there
+    "body_mode",
+]
+# Checkpoints written before fingerprints existed have no input_fingerprint.
+# False keeps those rows as-is (old resume behaviour); True re-enriches them once.
+REENRICH_LEGACY_ROWS = False
+
 
 # ---------------------------------------------------------------------
 # GPU / model loading
 # ---------------------------------------------------------------------
 
 def _require_cuda() -> None:
+    import torch
+
     if not torch.cuda.is_available():
         sys.exit(
             "CUDA is not available. This script requires a GPU.\n"
@@ -98,6 +141,8 @@ def _load_model():
 
     if _tokenizer is None or _model is None:
         _require_cuda()
+        import torch
+
         try:
             from transformers import AutoModelForCausalLM, AutoTokenizer
         except ImportError as e:
@@ -252,6 +297,52 @@ def should_skip_llm(row: pd.Series) -> tuple[bool, str]:
     return False, ""
 
 
+# Payloads that decode to no usable snippets: "", "[]", '[""]', "null", ...
+_EMPTY_SNIPPETS_RE = r'^\s*(?:null|""|\[\s*(?:""\s*,?\s*)*\])?\s*$'
+
+
+def classify_skip_frame(df: pd.DataFrame) -> pd.Series:
+    """Columnar should_skip_llm(): skip reason per row, "" for LLM rows.
+
+    Same rules and precedence as should_skip_llm(), evaluated as string
+    expressions over whole columns. Only payloads the empty-payload regex
+    cannot decide are decoded, with the same load_snippet_list() as the
+    per-row path, so invalid JSON and whitespace-only lists still skip.
+    """
+    def col(name: str) -> pd.Series:
+        if name not in df.columns:
+            return pd.Series("", index=df.index, dtype=object)
+        return df[name].fillna("").astype(str)
+
+    raw = col("snippets_json")
+    body_mode = col("body_mode")
+    fetch_status = col("fetch_status")
+
+    no_snippets = raw.str.match(_EMPTY_SNIPPETS_RE)
+    undecided = ~no_snippets
+    if undecided.any():
+        no_snippets[undecided] = [
+            not load_snippet_list({"snippets_json": v}) for v in raw[undecided]
+        ]
+
+    reason = pd.Series("", index=df.index, dtype=object)
+    rules = [
+        (no_snippets, "no_snippets"),
+        (body_mode.str.startswith("no_body_"), body_mode),
+        (fetch_status.str.startswith("fetch_failed"), fetch_status),
+        (fetch_status.str.contains("text_too_short", regex=False), fetch_status),
+        (
+            fetch_status.str.contains("pdf_no_parser", regex=False)
+            | fetch_status.str.contains("pdf_parse_failed", regex=False),
+            fetch_status,
+        ),
+    ]
+    # Apply in reverse so the first matching rule wins, as in should_skip_llm().
+    for mask, value in reversed(rules):
+        reason = reason.mask(mask, value)
+    return reason
+
+
 def _safe_lower(s: str) -> str:
     return str(s or "").lower()
 
@@ -273,77 +364,92 @@ def _row_section_tokens(row: pd.Series) -> list[str]:
     return out
 
 
-def _snippet_score_for_llm(snippet: str, row: pd.Series) -> int:
-    """Rank snippets so long PDFs don't send only their first 8,000 chars.
+def _snippet_features(snippet: str, row: pd.Series) -> dict:
+    """Per-snippet signals used to rank LLM context.
 
-    The score is deliberately heuristic. It does not create final dates; it only
-    decides which text the LLM sees. Deterministic parsing below is still the
-    gatekeeper for adopted/effective dates.
+    Kept separate from the score so the vector can be persisted (see
+    build_llm_context_table) and Stage 2 re-runs do not re-run a dozen regexes
+    plus the date finders over every snippet.
     """
     text = snippet or ""
     low = text.lower()
-    score = 0
-
-    section_tokens = _row_section_tokens(row)
-    if any(tok in low for tok in section_tokens):
-        score += 140
-
-    # Target section title/name words are a weak signal, after common ADU/code
-    # boilerplate is removed by _extract_soft_tokens later in the file.
-    for tok in _extract_soft_tokens(
+    soft_tokens = _extract_soft_tokens(
         _as_str(row.get("title", "")),
         _as_str(row.get("chapter", "")),
         _as_str(row.get("section_program", "")),
         max_per_field=2,
-    ):
-        if tok in low:
-            score += 6
+    )
+    return {
+        "section_token_hit": any(tok in low for tok in _row_section_tokens(row)),
+        "soft_hits": sum(1 for tok in soft_tokens if tok in low),
+        "ord_mention": bool(ORD_MENTION_RE.search(text)),
+        "prior_history": bool(re.search(r"\bPrior Ordinance History\b", text, re.IGNORECASE)),
+        "adoption_words": bool(re.search(r"\b(adopted|passed|enacted|amended|repealed)\b", text, re.IGNORECASE)),
+        "effective_words": bool(EFFECTIVE_WORDS_RE.search(text)),
+        "n_full_dates": len(find_dates_in_text(text)),
+        "n_partial_dates": len(find_partial_ordinance_dates_in_text(text)),
+        "hcd_guidance": bool(re.search(r"\bCalifornia Department of Housing and Community Development\b", text, re.IGNORECASE)),
+        "state_law": bool(re.search(r"\bGov\. Code|Government Code|Health and Safety Code|Statutes of 20\d{2}\b", text, re.IGNORECASE)),
+    }
+
 
-    if ORD_MENTION_RE.search(text):
+def _score_snippet_features(f: dict) -> int:
+    score = 0
+    if f.get("section_token_hit"):
+        score += 140
+    # Target section title/name words are a weak signal, after common ADU/code
+    # boilerplate is removed by _extract_soft_tokens later in the file.
+    score += 6 * int(f.get("soft_hits", 0))
+    if f.get("ord_mention"):
         score += 90
-    if re.search(r"\bPrior Ordinance History\b", text, re.IGNORECASE):
+    if f.get("prior_history"):
         score += 70
-    if re.search(r"\b(adopted|passed|enacted|amended|repealed)\b", text, re.IGNORECASE):
+    if f.get("adoption_words"):
         score += 45
-    if EFFECTIVE_WORDS_RE.search(text):
+    if f.get("effective_words"):
         score += 35
-    if find_dates_in_text(text):
+    if f.get("n_full_dates"):
         score += 35
-    if find_partial_ordinance_dates_in_text(text):
+    if f.get("n_partial_dates"):
         score += 20
 
     # Penalize obvious non-local/statewide guidance docs. They may still be
     # sent if there is nothing better, but they shouldn't dominate the LLM context.
-    if re.search(r"\bCalifornia Department of Housing and Community Development\b", text, re.IGNORECASE):
+    if f.get("hcd_guidance"):
         score -= 80
-    if re.search(r"\bGov\. Code|Government Code|Health and Safety Code|Statutes of 20\d{2}\b", text, re.IGNORECASE):
+    if f.get("state_law"):
         score -= 20
-
     return score
 
 
-def select_snippets_for_llm(row: pd.Series) -> tuple[list[str], str, int]:
-    """Return (selected_snippets, joined_text, selected_count)."""
-    snippets = load_snippet_list(row)
-    if not snippets:
-        return [], "", 0
+def _snippet_score_for_llm(snippet: str, row: pd.Series) -> int:
+    """Rank snippets so long PDFs don't send only their first 8,000 chars.
+
+    The score is deliberately heuristic. It does not create final dates; it only
+    decides which text the LLM sees. Deterministic parsing below is still the
+    gatekeeper for adopted/effective dates.
+    """
+    return _score_snippet_features(_snippet_features(snippet, row))
 
-    total = sum(len(s) for s in snippets)
-    if total <= SNIPPETS_CHAR_LIMIT:
-        joined = "\n\n---\n\n".join(snippets)
-        return snippets, joined, len(snippets)
 
-    ranked = []
-    for i, snip in enumerate(snippets):
-        ranked.append((_snippet_score_for_llm(snip, row), -i, i, snip))
-    ranked.sort(reverse=True)
+def _rank_snippets(snippets: list[str], row: pd.Series) -> tuple[list[dict], list[int]]:
+    """Return (per-snippet features, snippet indices best-first)."""
+    features = [_snippet_features(snip, row) for snip in snippets]
+    ranked = sorted(
+        range(len(snippets)),
+        key=lambda i: (_score_snippet_features(features[i]), -i),
+        reverse=True,
+    )
+    return features, ranked
+
 
+def _assemble_selection(snippets: list[str], ranked_order: list[int]) -> tuple[list[str], str, int]:
     selected = []
     used = 0
-    for score, _neg_i, _i, snip in ranked:
+    for i in ranked_order:
         # Keep each selected snippet reasonably bounded so one huge PDF window
         # does not consume the entire context.
-        piece = snip.strip()
+        piece = snippets[i].strip()
         if len(piece) > 2400:
             # Preserve front and back of the window; ordinance-history citations
             # often sit at the end of code sections.
@@ -362,6 +468,117 @@ def select_snippets_for_llm(row: pd.Series) -> tuple[list[str], str, int]:
     return selected, joined, len(selected)
 
 
+def select_snippets_for_llm(
+    row: pd.Series,
+    ranked_order: list[int] | None = None,
+) -> tuple[list[str], str, int]:
+    """Return (selected_snippets, joined_text, selected_count).
+
+    ranked_order, when given, is a persisted ranking from the LLM-context
+    sidecar and skips the scoring pass. It is ignored if it does not match the
+    row's snippets.
+    """
+    snippets = load_snippet_list(row)
+    if not snippets:
+        return [], "", 0
+
+    total = sum(len(s) for s in snippets)
+    if total <= SNIPPETS_CHAR_LIMIT:
+        joined = "\n\n---\n\n".join(snippets)
+        return snippets, joined, len(snippets)
+
+    if ranked_order is None or sorted(ranked_order) != list(range(len(snippets))):
+        _features, ranked_order = _rank_snippets(snippets, row)
+    return _assemble_selection(snippets, ranked_order)
+
+
+# ---------------------------------------------------------------------
+# Persisted LLM context selection
+# ---------------------------------------------------------------------
+# Stage 1 writes <input>.llm_context.parquet next to extracted.parquet with the
+# per-snippet feature vectors and the ranked order for every row whose
+# snippets exceed SNIPPETS_CHAR_LIMIT. Stage 2 reuses an entry only when its
+# llm_context_key still matches the row (snippets, ranking metadata, char
+# limit, RULE_VERSION); stale or missing entries are recomputed and written
+# back so the next re-run skips them too.
+
+LLM_CONTEXT_FIELDS = ["number", "title", "chapter", "section_program"]
+
+
+def llm_context_path(input_file: Path) -> Path:
+    return input_file.with_name(input_file.stem + ".llm_context.parquet")
+
+
+def llm_context_key(row: pd.Series) -> str:
+    payload = {f: _as_str(row.get(f, "")) for f in LLM_CONTEXT_FIELDS}
+    payload["snippets_json"] = _as_str(row.get("snippets_json", ""))
+    payload["char_limit"] = SNIPPETS_CHAR_LIMIT
+    payload["rule_version"] = RULE_VERSION
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def build_llm_context_table(df: pd.DataFrame) -> pd.DataFrame:
+    """Rank snippets for every row that needs ranking. Rows whose snippets fit
+    in SNIPPETS_CHAR_LIMIT are sent whole and get no entry."""
+    records = []
+    for _, row in df.iterrows():
+        snippets = load_snippet_list(row)
+        if sum(len(x) for x in snippets) <= SNIPPETS_CHAR_LIMIT:
+            continue
+        features, ranked = _rank_snippets(snippets, row)
+        records.append({
+            "row_key": int(row["row_key"]),
+            "llm_context_key": llm_context_key(row),
+            "snippet_features_json": json.dumps(features),
+            "llm_ranked_order_json": json.dumps(ranked),
+        })
+    return pd.DataFrame(
+        records,
+        columns=["row_key", "llm_context_key", "snippet_features_json", "llm_ranked_order_json"],
+    )
+
+
+def load_llm_context(input_file: Path, df: pd.DataFrame) -> dict[str, list[int]]:
+    """Return {llm_context_key: ranked_order} for df, refreshing the sidecar as
+    needed. Keyed by content rather than row_key, so several candidate pages
+    of one row_key each get their own ranking."""
+    path = llm_context_path(input_file)
+    cached = pd.DataFrame()
+    if path.exists():
+        try:
+            cached = pd.read_parquet(path)
+        except Exception as e:
+            print(f"[warn] ignoring unreadable {path.name} ({e})")
+
+    keys = df.apply(llm_context_key, axis=1) if len(df) else pd.Series(dtype=str)
+    orders: dict[str, list[int]] = {}
+    matched = keys.iloc[:0]
+    if not cached.empty:
+        by_key = dict(zip(cached["llm_context_key"], cached["llm_ranked_order_json"]))
+        matched = keys[keys.isin(by_key)]
+        for key in matched.unique():
+            orders[key] = json.loads(by_key[key])
+
+    todo = df[~keys.isin(orders)] if len(df) else df
+    fresh = build_llm_context_table(todo) if len(todo) else pd.DataFrame()
+    for key, order in zip(fresh.get("llm_context_key", []), fresh.get("llm_ranked_order_json", [])):
+        orders[key] = json.loads(order)
+
+    print(
+        f"LLM context selection: {len(matched)} row(s) reused {matched.nunique()} ranking(s) "
+        f"from {path.name} ({len(cached)} stored), {len(fresh)} ranked now."
+    )
+    if len(fresh):
+        combined = pd.concat([cached, fresh], ignore_index=True) if not cached.empty else fresh
+        combined = combined.drop_duplicates(subset=["llm_context_key"], keep="last")
+        try:
+            combined.to_parquet(path, engine="pyarrow", index=False)
+        except Exception as e:
+            print(f"[warn] could not write {path.name} ({e})")
+    return orders
+
+
 def build_messages(row: pd.Series, joined_snippets: str) -> list[dict]:
     """Build chat messages. Caller passes the already-selected joined snippet
     text so select_snippets_for_llm is computed exactly once per row."""
@@ -434,6 +651,8 @@ def _extract_json(text: str) -> dict:
 
 
 def call_gemma(messages: list[dict]) -> tuple[dict, str | None, str]:
+    import torch
+
     tok, model = _load_model()
 
     inputs = tok.apply_chat_template(
@@ -454,13 +673,58 @@ def call_gemma(messages: list[dict]) -> tuple[dict, str | None, str]:
 
     gen_tokens = out[0][prompt_len:]
     text = tok.decode(gen_tokens, skip_special_tokens=True)
+    return _parse_generation(text)
+
 
+def _parse_generation(text: str) -> tuple[dict, str | None, str]:
     try:
         return _extract_json(text), None, text
     except Exception as e:
         return dict(DEFAULT_RESPONSE), f"{type(e).__name__}: {e}", text
 
 
+def call_gemma_batch(batch: list[list[dict]]) -> list[tuple[dict, str | None, str]]:
+    """call_gemma() for several prompts in one left-padded generate() call.
+
+    Greedy decoding, so each result matches what call_gemma would return for
+    that prompt alone (up to padding numerics).
+    """
+    if len(batch) == 1:
+        return [call_gemma(batch[0])]
+    import torch
+
+    tok, model = _load_model()
+
+    prompts = [
+        tok.apply_chat_template(messages, add_generation_prompt=True, tokenize=False)
+        for messages in batch
+    ]
+    padding_side = tok.padding_side
+    tok.padding_side = "left"
+    try:
+        # The chat template already starts with the BOS token.
+        inputs = tok(
+            prompts, return_tensors="pt", padding=True, add_special_tokens=False,
+        ).to("cuda")
+    finally:
+        tok.padding_side = padding_side
+
+    prompt_len = inputs["input_ids"].shape[1]
+
+    with torch.no_grad():
+        out = model.generate(
+            **inputs,
+            max_new_tokens=MAX_NEW_TOKENS,
+            do_sample=False,
+            pad_token_id=tok.pad_token_id,
+        )
+
+    return [
+        _parse_generation(tok.decode(seq[prompt_len:], skip_special_tokens=True))
+        for seq in out
+    ]
+
+
 # ---------------------------------------------------------------------
 # Deterministic date parsing
 # ---------------------------------------------------------------------
@@ -1206,51 +1470,173 @@ def deterministic_date_override(
 # Checkpoint helpers
 # ---------------------------------------------------------------------
 
-def _load_done_keys(output_file: Path) -> set[int]:
+def fetch_status_class(status: str) -> str:
+    """fetch_status with every successful fetch folded to "ok". Stage 1 reports
+    "ok"/"ok_curl_cffi"/... for a live fetch but "cached" for a cache hit of the
+    same bytes, which must not change the fingerprint."""
+    parts = [p.strip() for p in _as_str(status).split(";")]
+    return "; ".join("ok" if p.startswith(("ok", "cached")) else p for p in parts)
+
+
+def input_fingerprint(row: pd.Series) -> str:
+    """Hash of everything that determines a row's enrichment result."""
+    payload = {f: _as_str(row.get(f, "")) for f in FINGERPRINT_FIELDS}
+    payload["fetch_status"] = fetch_status_class(payload["fetch_status"])
+    payload["snippets_json"] = _as_str(row.get("snippets_json", ""))
+    payload["model_id"] = MODEL_ID
+    payload["rule_version"] = RULE_VERSION
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _fingerprint_frame(df: pd.DataFrame) -> pd.Series:
+    if df.empty:
+        return pd.Series([], index=df.index, dtype=str)
+    return df.apply(input_fingerprint, axis=1).astype(str)
+
+
+def _load_done_fingerprints(output_file: Path) -> dict[int, str]:
+    """Return {row_key: input_fingerprint}. Legacy rows map to ""."""
     if not output_file.exists():
-        return set()
-    done = pd.read_parquet(output_file, columns=["row_key"])
-    return set(int(k) for k in done["row_key"].tolist())
+        return {}
+    try:
+        done = pd.read_parquet(output_file, columns=["row_key", "input_fingerprint"])
+    except Exception:
+        done = pd.read_parquet(output_file, columns=["row_key"])
+        done["input_fingerprint"] = ""
+    fps = done["input_fingerprint"].fillna("").astype(str)
+    return dict(zip(done["row_key"].astype(int).tolist(), fps.tolist()))
 
 
 def _guard_stale_checkpoint(output_file: Path) -> None:
-    if not output_file.exists():
+    """Refuse to mix models in one output for rows that carry no fingerprint.
+
+    Fingerprinted rows include MODEL_ID, so a model switch re-enriches them on
+    its own. Legacy rows cannot be detected that way.
+    """
+    if not output_file.exists() or REENRICH_LEGACY_ROWS:
+        return
+    try:
+        prev = pd.read_parquet(output_file, columns=["llm_mode"])
+    except Exception:
         return
     try:
-        modes = pd.read_parquet(output_file, columns=["llm_mode"])["llm_mode"].unique()
+        prev["input_fingerprint"] = pd.read_parquet(output_file, columns=["input_fingerprint"])["input_fingerprint"]
     except Exception:
-        modes = []
+        prev["input_fingerprint"] = ""
+    legacy = prev[prev["input_fingerprint"].fillna("").astype(str).eq("")]
+    modes = legacy["llm_mode"].unique()
     stale = [m for m in modes if m != MODEL_ID and str(m).strip()]
     if stale:
         sys.exit(
             f"Existing {output_file.name} was produced by {list(modes)}, not {MODEL_ID}.\n"
-            f"Delete it before re-running:\n  {output_file}"
+            f"Delete it (or set REENRICH_LEGACY_ROWS = True) before re-running:\n  {output_file}"
         )
 
 
-def _save_checkpoint(output_file: Path, enriched_rows: list[dict]) -> None:
-    if not enriched_rows:
+def diagnostics_dir(output_file: Path) -> Path:
+    return output_file.with_name(output_file.stem + ".diagnostics")
+
+
+def _split_diagnostics(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Return (narrow_rows, diagnostics_rows) for an enriched frame."""
+    diag_cols = [c for c in DIAGNOSTIC_COLS if c in df.columns]
+    if not diag_cols:
+        return df, pd.DataFrame()
+    diag = df[["row_key"] + diag_cols].copy()
+    for col in diag_cols:
+        diag[col] = diag[col].fillna("").astype(str)
+    return df.drop(columns=diag_cols), diag
+
+
+def _append_diagnostics(output_file: Path, diag: pd.DataFrame) -> None:
+    if diag.empty:
+        return
+    out_dir = diagnostics_dir(output_file)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    parts = sorted(out_dir.glob("part-*.parquet"))
+    n = int(parts[-1].stem.split("-")[1]) + 1 if parts else 0
+    diag.to_parquet(out_dir / f"part-{n:05d}.parquet", engine="pyarrow", index=False)
+
+
+def load_diagnostics(output_file: Path) -> pd.DataFrame:
+    """Latest diagnostics row per row_key (later segments win)."""
+    out_dir = diagnostics_dir(output_file)
+    parts = sorted(out_dir.glob("part-*.parquet")) if out_dir.exists() else []
+    if not parts:
+        return pd.DataFrame(columns=["row_key"] + DIAGNOSTIC_COLS)
+    diag = pd.concat([pd.read_parquet(p) for p in parts], ignore_index=True)
+    return diag.drop_duplicates(subset=["row_key"], keep="last")
+
+
+def compact_diagnostics(output_file: Path) -> None:
+    """Rewrite the sidecar as a single part holding the latest row per row_key.
+
+    Checkpoints append one part each, so a long run leaves many small files.
+    The compacted part is written after the existing ones before they are
+    removed, so an interrupted compaction still reads back correctly."""
+    out_dir = diagnostics_dir(output_file)
+    parts = sorted(out_dir.glob("part-*.parquet")) if out_dir.exists() else []
+    if len(parts) <= 1:
         return
-    new_df = pd.DataFrame(enriched_rows)
+    latest = load_diagnostics(output_file)
+    last = int(parts[-1].stem.split("-")[1])
+    compacted = out_dir / f"part-{last + 1:05d}.parquet"
+    latest.to_parquet(compacted, engine="pyarrow", index=False)
+    for p in parts:
+        p.unlink()
+    compacted.rename(out_dir / "part-00000.parquet")
+    print(f"Diagnostics compacted: {len(parts)} parts -> 1 ({len(latest)} rows)")
+
+
+def join_diagnostics(enriched: pd.DataFrame, output_file: Path) -> pd.DataFrame:
+    """Debugging helper: enriched rows with their raw LLM output, context
+    preview and snippets attached.
+
+      df = pd.read_parquet(OUTPUT_FILE)
+      wide = join_diagnostics(df, OUTPUT_FILE)
+    """
+    diag = load_diagnostics(output_file)
+    keep = [c for c in diag.columns if c == "row_key" or c not in enriched.columns]
+    out = enriched.copy()
+    out["row_key"] = out["row_key"].astype(int)
+    diag = diag[keep].copy()
+    diag["row_key"] = diag["row_key"].astype(int)
+    return out.merge(diag, on="row_key", how="left")
+
+
+def _save_checkpoint(output_file: Path, enriched_rows: list[dict] | pd.DataFrame) -> None:
+    if len(enriched_rows) == 0:
+        return
+    new_df, new_diag = _split_diagnostics(pd.DataFrame(enriched_rows))
     try:
         if output_file.exists():
             existing = pd.read_parquet(output_file)
+            # Migrate checkpoints written before the diagnostics split: move
+            # their wide columns into the sidecar before the new rows so the
+            # new rows still win on row_key.
+            existing, old_diag = _split_diagnostics(existing)
+            _append_diagnostics(output_file, old_diag)
             combined = pd.concat([existing, new_df], ignore_index=True)
             combined = combined.drop_duplicates(subset=["row_key"], keep="last")
         else:
             combined = new_df
+        _append_diagnostics(output_file, new_diag)
         combined.to_parquet(output_file, engine="pyarrow", index=False)
     except Exception as e:
         side = output_file.with_suffix(".rescue.jsonl")
+        if isinstance(enriched_rows, pd.DataFrame):
+            enriched_rows = enriched_rows.to_dict("records")
         with open(side, "a", encoding="utf-8") as f:
             for r in enriched_rows:
                 f.write(json.dumps(r, default=str, ensure_ascii=False) + "\n")
         print(f"\n[warn] checkpoint write failed ({e}); appended {len(enriched_rows)} rows to {side}")
 
 
-def _blank_result(row: pd.Series, skip_reason: str) -> dict:
-    return {
-        **row.to_dict(),
+def _blank_results(rows: pd.DataFrame, skip_reasons: pd.Series) -> pd.DataFrame:
+    """Enriched-table rows for every row skipped before the LLM, as one frame."""
+    out = rows.copy()
+    for col, value in {
         "adopted_date": "",
         "effective_date": "",
         "effective_date_source": "unknown",
@@ -1259,14 +1645,209 @@ def _blank_result(row: pd.Series, skip_reason: str) -> dict:
         "partial_adopted_date": "",
         "evidence_quote": "",
         "confidence": "low",
-        "parse_error": skip_reason,
         "llm_mode": "",
         "llm_adopted_raw": "",
         "llm_effective_raw": "",
         "llm_raw_output": "",
         "date_parse_status": "skipped_before_llm",
-        "date_parse_reason": skip_reason,
+    }.items():
+        out[col] = value
+    out["parse_error"] = skip_reasons
+    out["date_parse_reason"] = skip_reasons
+    return out
+
+
+def _enriched_record(
+    row: pd.Series,
+    resp: dict,
+    err: str | None,
+    raw_text: str,
+    joined: str,
+    n_selected: int,
+    llm_mode: str = MODEL_ID,
+) -> dict:
+    """Enriched-table row for one input row and its (possibly empty) LLM response."""
+    (
+        adopted_iso,
+        effective_iso,
+        eff_source,
+        evidence_quote,
+        confidence,
+        date_parse_status,
+        date_parse_reason,
+        adopted_date_precision,
+        effective_date_precision,
+        partial_adopted_date,
+    ) = deterministic_date_override(row, resp)
+
+    return {
+        **row.to_dict(),
+        "adopted_date": adopted_iso,
+        "effective_date": effective_iso,
+        "effective_date_source": eff_source,
+        "adopted_date_precision": adopted_date_precision,
+        "effective_date_precision": effective_date_precision,
+        "partial_adopted_date": partial_adopted_date,
+        "evidence_quote": evidence_quote,
+        "confidence": confidence,
+        "parse_error": err,
+        "llm_mode": llm_mode,
+        "llm_adopted_raw": _as_str(resp.get("adopted_date", "")),
+        "llm_effective_raw": _as_str(resp.get("effective_date", "")),
+        "llm_raw_output": (raw_text or "")[:RAW_OUTPUT_KEEP_CHARS],
+        "llm_input_chars": len(joined),
+        "llm_selected_snippets": n_selected,
+        "llm_context_preview": joined[:LLM_CONTEXT_KEEP_CHARS],
+        "date_parse_status": date_parse_status,
+        "date_parse_reason": date_parse_reason,
+    }
+
+
+# ---------------------------------------------------------------------
+# Multi-candidate enrichment
+# ---------------------------------------------------------------------
+
+_STATUS_RANK = {
+    "adopted_reliable": 0,
+    "explicit_effective_only": 1,
+    "partial_adopted_date:month": 2,
+    "partial_adopted_date:year": 3,
+}
+_CONFIDENCE_RANK = {"high": 0, "medium": 1, "low": 2}
+
+
+def reliability_rank(rec: dict) -> tuple:
+    """Sort key for candidate results of one row_key; the smallest wins.
+
+    Deterministic status first (a reliable adopted date beats an explicit
+    effective date beats a partial date beats nothing), then the confidence
+    the deterministic layer assigned, then a clean parse, then the search
+    rank of the candidate.
+    """
+    status = _as_str(rec.get("date_parse_status", ""))
+    rank = _STATUS_RANK.get(status, 5 if status == "skipped_before_llm" else 4)
+    try:
+        cand_rank = int(rec.get("candidate_rank", 0))
+    except (TypeError, ValueError):
+        cand_rank = 0
+    return (
+        rank,
+        _CONFIDENCE_RANK.get(_as_str(rec.get("confidence", "")), 3),
+        bool(_as_str(rec.get("parse_error", ""))),
+        cand_rank,
+    )
+
+
+def group_fingerprints(df: pd.DataFrame) -> pd.Series:
+    """One fingerprint per row_key over all of its candidates' fingerprints,
+    so adding, dropping or changing any candidate re-enriches the row."""
+    fps = df["input_fingerprint"].astype(str)
+    by_key = fps.groupby(df["row_key"].astype(int)).agg(
+        lambda s: hashlib.sha1("|".join(sorted(s)).encode("utf-8")).hexdigest()
+    )
+    return df["row_key"].astype(int).map(by_key)
+
+
+def _pick_winner(candidates: list[dict]) -> dict:
+    """Best candidate result plus a compact audit trail of all of them."""
+    winner = dict(min(candidates, key=reliability_rank))
+    winner["n_candidates"] = len(candidates)
+    winner["candidate_results_json"] = json.dumps(
+        [
+            {
+                "candidate_rank": c.get("candidate_rank", ""),
+                "source_url": _as_str(c.get("source_url", "")),
+                "date_parse_status": _as_str(c.get("date_parse_status", "")),
+                "adopted_date": _as_str(c.get("adopted_date", "")),
+                "llm_mode": _as_str(c.get("llm_mode", "")),
+            }
+            for c in sorted(candidates, key=reliability_rank)
+        ],
+        ensure_ascii=False,
+        default=str,
+    )
+    return winner
+
+
+def enrich_candidate_groups(remaining: pd.DataFrame, input_file: Path, output_file: Path) -> None:
+    """Enrich every candidate of each row_key and keep one winner per row_key.
+
+    1. Candidates with no usable body are skipped as in the single-row path.
+    2. The deterministic layer runs on every usable candidate (no LLM). A
+       row_key with a reliable adopted date there is finished.
+    3. The other row_keys send all usable candidates to the LLM, batched
+       LLM_BATCH_SIZE prompts at a time.
+    """
+    skip_reasons = classify_skip_frame(remaining)
+    is_skip = skip_reasons.ne("")
+    blanks = _blank_results(remaining[is_skip], skip_reasons[is_skip])
+    results: dict[int, list[dict]] = {}
+    for rec in blanks.to_dict("records"):
+        results.setdefault(int(rec["row_key"]), []).append(rec)
+
+    usable = remaining[~is_skip]
+    deterministic: dict[int, list[dict]] = {}
+    for _, row in usable.iterrows():
+        rec = _enriched_record(row, dict(DEFAULT_RESPONSE), None, "", "", 0, llm_mode="")
+        deterministic.setdefault(int(row["row_key"]), []).append(rec)
+
+    solved = {
+        rk for rk, recs in deterministic.items()
+        if any(r["date_parse_status"] == "adopted_reliable" for r in recs)
     }
+    for rk in solved:
+        results.setdefault(rk, []).extend(deterministic[rk])
+    llm_rows = usable[~usable["row_key"].astype(int).isin(solved)]
+    print(
+        f"Candidates: {len(remaining)} for {remaining['row_key'].nunique()} rows; "
+        f"{int(is_skip.sum())} skipped before LLM; {len(solved)} rows dated deterministically; "
+        f"{len(llm_rows)} candidates for {llm_rows['row_key'].nunique()} rows go to the LLM"
+    )
+
+    # Rows that need no LLM are written first.
+    llm_keys = set(llm_rows["row_key"].astype(int))
+    done_first = [rk for rk in results if rk not in llm_keys]
+    _save_checkpoint(output_file, [_pick_winner(results[rk]) for rk in done_first])
+
+    if llm_rows.empty:
+        return
+    _load_model()
+    llm_orders = load_llm_context(input_file, llm_rows)
+
+    pending_keys = list(dict.fromkeys(llm_rows["row_key"].astype(int)))
+    n_left = llm_rows["row_key"].astype(int).value_counts().to_dict()
+    winners: list[dict] = []
+    batch: list[tuple[pd.Series, str, int]] = []
+
+    def flush() -> None:
+        outputs = call_gemma_batch([build_messages(row, joined) for row, joined, _ in batch])
+        for (row, joined, n_selected), (resp, err, raw_text) in zip(batch, outputs):
+            rk = int(row["row_key"])
+            results.setdefault(rk, []).append(
+                _enriched_record(row, resp, err, raw_text, joined, n_selected)
+            )
+            n_left[rk] -= 1
+            if n_left[rk] == 0:
+                winners.append(_pick_winner(results.pop(rk)))
+        batch.clear()
+
+    with tqdm(total=len(llm_rows), desc=f"Enriching candidates ({MODEL_ID})", unit="cand") as bar:
+        for rk in pending_keys:
+            for _, row in llm_rows[llm_rows["row_key"].astype(int) == rk].iterrows():
+                _selected, joined, n_selected = select_snippets_for_llm(
+                    row, ranked_order=llm_orders.get(llm_context_key(row))
+                )
+                batch.append((row, joined, n_selected))
+                if len(batch) >= LLM_BATCH_SIZE:
+                    bar.update(len(batch))
+                    flush()
+            if len(winners) >= CHECKPOINT_EVERY:
+                _save_checkpoint(output_file, winners)
+                winners = []
+        if batch:
+            bar.update(len(batch))
+            flush()
+    _save_checkpoint(output_file, winners)
 
 
 # ---------------------------------------------------------------------
@@ -1292,39 +1873,62 @@ def main() -> None:
     _guard_stale_checkpoint(output_file)
 
     df = pd.read_parquet(input_file)
-    done_keys = _load_done_keys(output_file)
-    remaining = df[~df["row_key"].astype(int).isin(done_keys)]
-
-    if done_keys:
-        print(f"Resuming: {len(done_keys)} already done, {len(remaining)} remaining.")
+    df["input_fingerprint"] = _fingerprint_frame(df)
+    multi_candidate = "candidate_rank" in df.columns
+    if multi_candidate:
+        df["input_fingerprint"] = group_fingerprints(df)
+        print(f"Multi-candidate input: {len(df)} candidates for {df['row_key'].nunique()} rows")
+
+    done = _load_done_fingerprints(output_file)
+    prev_fp = df["row_key"].astype(int).map(done)
+    is_new = prev_fp.isna()
+    is_legacy = prev_fp.eq("")
+    is_changed = ~is_new & ~is_legacy & prev_fp.ne(df["input_fingerprint"])
+    todo_mask = is_new | is_changed
+    if REENRICH_LEGACY_ROWS:
+        todo_mask |= is_legacy
+    remaining = df[todo_mask]
+
+    if done:
+        n_unchanged = int((~is_new & ~is_legacy & ~is_changed).sum())
+        print(
+            f"Resuming: {len(done)} already done "
+            f"({n_unchanged} unchanged, {int(is_changed.sum())} changed inputs, "
+            f"{int(is_legacy.sum())} without fingerprint"
+            f"{' -> re-enriched' if REENRICH_LEGACY_ROWS else ' -> kept'}); "
+            f"{int(is_new.sum())} new; {len(remaining)} to enrich."
+        )
     if remaining.empty:
-        print("All rows already enriched.")
+        print("All rows already enriched and up to date.")
+        compact_diagnostics(output_file)
         return
 
-    # Load the model only if at least one row has usable snippets.
-    rows_needing_llm = []
-    rows_skipped = []
-    for _, row in remaining.iterrows():
-        skip, reason = should_skip_llm(row)
-        if skip:
-            rows_skipped.append(_blank_result(row, reason))
-        else:
-            rows_needing_llm.append(row)
+    if multi_candidate:
+        enrich_candidate_groups(remaining, input_file, output_file)
+        compact_diagnostics(output_file)
+        _print_summary(output_file)
+        return
+
+    skip_reasons = classify_skip_frame(remaining)
+    is_skip = skip_reasons.ne("")
+    rows_needing_llm = remaining[~is_skip]
 
-    if rows_needing_llm:
+    # Save skipped rows too, so the merged CSV explains why they failed.
+    if is_skip.any():
+        _save_checkpoint(output_file, _blank_results(remaining[is_skip], skip_reasons[is_skip]))
+        print(f"Skipped before LLM: {int(is_skip.sum())} rows")
+
+    # Load the model only if at least one row has usable snippets.
+    if rows_needing_llm.empty:
+        llm_orders = {}
+    else:
         _load_model()
+        llm_orders = load_llm_context(input_file, rows_needing_llm)
 
     enriched_rows: list[dict] = []
 
-    # Save skipped rows too, so the merged CSV explains why they failed.
-    for r in rows_skipped:
-        enriched_rows.append(r)
-        if len(enriched_rows) % CHECKPOINT_EVERY == 0:
-            _save_checkpoint(output_file, enriched_rows)
-            enriched_rows = []
-
-    for row in tqdm(
-        rows_needing_llm,
+    for _, row in tqdm(
+        rows_needing_llm.iterrows(),
         total=len(rows_needing_llm),
         desc=f"Enriching ({MODEL_ID})",
         unit="row",
@@ -1332,50 +1936,14 @@ def main() -> None:
         # Compute snippet selection exactly once. Previously this was called
         # 4x per row (1 inside build_messages + 3 for the diagnostic columns
         # below), which made _snippet_score_for_llm dominate non-LLM CPU time
-        # on long PDFs.
-        _selected, joined, n_selected = select_snippets_for_llm(row)
+        # on long PDFs. The ranking itself usually comes from the persisted
+        # LLM-context sidecar.
+        _selected, joined, n_selected = select_snippets_for_llm(
+            row, ranked_order=llm_orders.get(llm_context_key(row))
+        )
 
         resp, err, raw_text = call_gemma(build_messages(row, joined))
-
-        llm_adopted_raw = _as_str(resp.get("adopted_date", ""))
-        llm_effective_raw = _as_str(resp.get("effective_date", ""))
-
-        (
-            adopted_iso,
-            effective_iso,
-            eff_source,
-            evidence_quote,
-            confidence,
-            date_parse_status,
-            date_parse_reason,
-            adopted_date_precision,
-            effective_date_precision,
-            partial_adopted_date,
-        ) = deterministic_date_override(row, resp)
-
-        enriched_rows.append(
-            {
-                **row.to_dict(),
-                "adopted_date": adopted_iso,
-                "effective_date": effective_iso,
-                "effective_date_source": eff_source,
-                "adopted_date_precision": adopted_date_precision,
-                "effective_date_precision": effective_date_precision,
-                "partial_adopted_date": partial_adopted_date,
-                "evidence_quote": evidence_quote,
-                "confidence": confidence,
-                "parse_error": err,
-                "llm_mode": MODEL_ID,
-                "llm_adopted_raw": llm_adopted_raw,
-                "llm_effective_raw": llm_effective_raw,
-                "llm_raw_output": (raw_text or "")[:RAW_OUTPUT_KEEP_CHARS],
-                "llm_input_chars": len(joined),
-                "llm_selected_snippets": n_selected,
-                "llm_context_preview": joined[:LLM_CONTEXT_KEEP_CHARS],
-                "date_parse_status": date_parse_status,
-                "date_parse_reason": date_parse_reason,
-            }
-        )
+        enriched_rows.append(_enriched_record(row, resp, err, raw_text, joined, n_selected))
 
         if len(enriched_rows) % CHECKPOINT_EVERY == 0:
             _save_checkpoint(output_file, enriched_rows)
@@ -1384,6 +1952,11 @@ def main() -> None:
     if enriched_rows:
         _save_checkpoint(output_file, enriched_rows)
 
+    compact_diagnostics(output_file)
+    _print_summary(output_file)
+
+
+def _print_summary(output_file: Path) -> None:
     final = pd.read_parquet(output_file)
     n_err = final["parse_error"].fillna("").astype(str).str.strip().ne("").sum() if "parse_error" in final.columns else 0
     n_adopted = final["adopted_date"].astype(str).str.strip().ne("").sum()
@@ -1397,6 +1970,7 @@ def main() -> None:
     print(f"  parse errors/skips: {n_err}")
     print(f"Model:            {MODEL_ID}")
     print(f"Saved to:         {output_file}")
+    print(f"Diagnostics:      {diagnostics_dir(output_file)}")
 
     if "date_parse_status" in final.columns:
         print("date_parse_status breakdown:")
@@ -29,10 +29,19 @@ from pathlib import Path
 from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup
 from tqdm import tqdm
 
+from utils import lazy_import
+
+# requests/bs4 are only needed once a page is actually fetched or parsed.
+# google_search.py imports this module for its helpers, and a run that only
+# reads caches or plans queries should not pay for them at startup.
+requests = lazy_import("requests")
+bs4 = lazy_import("bs4")
+# Stage 2 owns the LLM-context ranking rules; only its pure-Python helpers are
+# used here (torch is imported there on model load only).
+stage2 = lazy_import("enrich_policymap_with_gemma")
+
 
 # --- config -------------------------------------------------------------
 CSV_FILENAME = "Policy-Map-Ordinance-Table-May-2026.csv"
@@ -53,6 +62,11 @@ WINDOW_WORDS = 200
 FULLTEXT_CHAR_LIMIT = 8000
 MIN_TEXT_CHARS = 200
 
+# Precompute Stage 2's LLM snippet ranking (feature vectors + ranked order)
+# into <output>.llm_context.parquet so Stage 2 starts and resumes without
+# re-scoring every snippet.
+WRITE_LLM_CONTEXT_SIDECAR = True
+
 # --- sample mode --------------------------------------------------------
 SAMPLE_MODE = False
 SAMPLE_SIZE = 20
@@ -202,7 +216,7 @@ def _is_probably_bad_legacy_cache(data: bytes, content_type: str) -> bool:
     # cached_legacy_html; text_too_short forever.
     try:
         html = data.decode("utf-8", errors="replace")
-        soup = BeautifulSoup(html, "html.parser")
+        soup = bs4.BeautifulSoup(html, "html.parser")
         for tag in soup(["script", "style", "noscript", "nav", "footer", "header"]):
             tag.decompose()
         visible_text = "\n".join(x.strip() for x in soup.get_text("\n").splitlines() if x.strip())
@@ -247,7 +261,7 @@ def _is_probably_challenge_or_empty(data: bytes, content_type: str) -> bool:
     # it text_too_short.
     try:
         html = data.decode("utf-8", errors="replace")
-        soup = BeautifulSoup(html, "html.parser")
+        soup = bs4.BeautifulSoup(html, "html.parser")
         for tag in soup(["script", "style", "noscript", "nav", "footer", "header"]):
             tag.decompose()
         visible_text = "\n".join(x.strip() for x in soup.get_text("\n").splitlines() if x.strip())
@@ -803,7 +817,7 @@ def extract_pdf_text(body: bytes) -> tuple[str, str]:
 
 
 def html_to_text(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = bs4.BeautifulSoup(html, "html.parser")
     for tag in soup(["script", "style", "noscript", "nav", "footer", "header"]):
         tag.decompose()
     text = soup.get_text(separator="\n")
@@ -1027,6 +1041,12 @@ def main() -> None:
     out_df = pd.DataFrame(rows)
     out_df.to_parquet(output_path, engine="pyarrow", index=False)
 
+    if WRITE_LLM_CONTEXT_SIDECAR and len(out_df):
+        ctx_path = stage2.llm_context_path(output_path)
+        ctx_df = stage2.build_llm_context_table(out_df)
+        ctx_df.to_parquet(ctx_path, engine="pyarrow", index=False)
+        print(f"LLM context ranked:    {len(ctx_df)} rows -> {ctx_path.name}")
+
     print(f"\nRows written:          {len(out_df)}")
     if len(out_df):
         print("body_mode breakdown:")
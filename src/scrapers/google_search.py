@@ -33,10 +33,17 @@ v3.5 strict changes:
 
 Key properties:
   - Disk cache for every Brave query (sha1 of the query), so re-runs never
-    re-bill or re-hit quota.
+    re-bill or re-hit quota. Stored in one sqlite DB (SEARCH_CACHE_DB) with an
+    optional TTL and a ledger of every request sent (run, failure mode,
+    policy type).
   - MAX_QUERIES cost ceiling. Brave is metered; keep this small until the query
     design is verified, then raise it.
   - Throttle >= 1.1s/request + exponential backoff on HTTP 429.
+  - Rows are searched concurrently (SEARCH_WORKERS) under one global request
+    spacing (THROTTLE_SEC). MAX_QUERIES credits are reserved in row order up
+    front and enforced atomically, and output rows keep input order.
+  - Each unique query is sent once per run, and each candidate URL is fetched
+    and strict-validated once, even when many rows share City + Number.
   - Results are re-ranked toward code-publisher domains in post-processing.
   - Every output row carries date_source_stage="stage4_brave_search".
 
@@ -56,19 +63,26 @@ import hashlib
 import http.client
 import json
 import re
+import sqlite3
 import sys
+import threading
 import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from urllib.parse import urlparse
 
 import pandas as pd
-import requests
 from tqdm import tqdm
 
+from utils import lazy_import
+
 # Reuse Stage 1 fetch + extract logic verbatim (do not duplicate it here).
 # This file must be run from the same project environment where
-# extract_from_policymap.py is importable.
-import extract_from_policymap as stage1
+# extract_from_policymap.py is importable. The import is lazy: Stage 1 only
+# executes the first time one of its helpers is used, so startup stays cheap.
+stage1 = lazy_import("extract_from_policymap")
+requests = lazy_import("requests")
 
 
 # --- config -------------------------------------------------------------
@@ -79,17 +93,64 @@ OUT_DIR = PROJECT_ROOT / "result" / "policy_map"
 
 INPUT_WAITING_CSV = OUT_DIR / "waiting_for_google_search.csv"
 OUTPUT_PARQUET = OUT_DIR / f"{Path(CSV_FILENAME).stem}.brave_searched.parquet"
+# Completed rows are appended here as parquet segments while the run is going,
+# then consolidated into OUTPUT_PARQUET. A crash or quota stop loses at most
+# the last SEGMENT_ROWS searched rows.
+SEARCH_SEGMENTS_DIR = OUT_DIR / f"{Path(CSV_FILENAME).stem}.brave_searched.segments"
+SEGMENT_ROWS = 20
+# True: skip rows whose search already completed in SEARCH_SEGMENTS_DIR, so a
+# run stopped by quota_exceeded picks up where it stopped. False: start over.
+# Segments are tagged with a fingerprint of the waiting CSV; segments from a
+# different input (e.g. a refreshed waiting list) are discarded, not resumed.
+RESUME_SEARCH = True
 
 BRAVE_CACHE_DIR = OUT_DIR / "_brave_cache"
+# Indexed store for Serper responses plus a ledger of every request sent. Loose
+# <sha1>.json files from older runs are imported on first open.
+SEARCH_CACHE_DB = BRAVE_CACHE_DIR / "search_cache.sqlite"
+# None = cached responses never expire (the old behavior). Otherwise responses
+# older than this many days count as misses and are re-fetched (and billed).
+SEARCH_CACHE_TTL_DAYS = None
+# True: print the credit ledger (all runs, by failure mode and policy type)
+# and exit. Reads only the cache DB; needs no API key or network.
+LEDGER_REPORT_ONLY = False
+
+# Dry-run cost planner. True: select rows and build queries exactly like a
+# real run, price every query against the cache, write PLAN_CSV and exit.
+# Makes no network calls and needs no API key.
+PLAN_ONLY = False
+PLAN_BUDGET = None                         # credits to plan for; None = MAX_QUERIES
+PLAN_CSV = OUT_DIR / "search_plan.csv"
+
+# Yield-aware scheduling. Learns from the previous run (OUTPUT_PARQUET plus
+# Stage 2's output on it) which failure modes, policy types, result hosts and
+# query variants yield dated rows, then searches rows in order of expected
+# dated rows per credit and tries each row's best variants first.
+# False = search_priority_score / file order as before.
+SCHEDULE_BY_YIELD = True
+YIELD_ENRICHED_PARQUET = OUT_DIR / f"{Path(CSV_FILENAME).stem}.brave_enriched.parquet"
+YIELD_PRIOR_WEIGHT = 5.0        # pseudo-observations pulling sparse groups toward their parent
+YIELD_REPORT_CSV = OUT_DIR / "search_yield.csv"
 ENV_PATH = PROJECT_ROOT / ".env"
 
 # --- Serper (google.serper.dev) API -------------------------------------
 # Backend is Serper, which returns Google results (organic + answerBox). It has
 # broader coverage of municipal-code sites than Brave, and unlike Google CSE it
 # is not capped at 100 queries/day.
-SERPER_HOST = "google.serper.dev"
+SERPER_PROD_HOST = "google.serper.dev"
+SERPER_HOST = SERPER_PROD_HOST
 SERPER_PATH = "/search"
 SERPER_KEY_NAME = "SERPER_API_KEY"
+# Point at serper_standin.py for offline runs and benchmarks:
+#   SERPER_HOST = "127.0.0.1"; SERPER_PORT = 8765; SERPER_USE_TLS = False
+# Any other host than SERPER_PROD_HOST gets its own cache DB and ledger next to
+# SEARCH_CACHE_DB (see search_cache_db()) and is never charged credits, so
+# stand-in results cannot leak into paid runs.
+SERPER_PORT = None              # None = default port for the scheme
+SERPER_USE_TLS = True
+# Test mode: with a stand-in host, trust pages served by that host in the
+# strict gate so the accept path runs offline. Never applies to real runs.
+STANDIN_TRUST_PAGES = True
 
 # Policy types Madeleine flagged as NOT living in municipal code ("not in code" /
 # "won't be in code" / program/city-website only). Their adoption dates are not
@@ -127,13 +188,38 @@ QUERY_COLUMNS = ["future_search_query_sitebias", "future_search_query_1"]
 SERPER_NUM = 10                 # results per query
 SERPER_GL = "us"                # geolocation bias
 
-THROTTLE_SEC = 0.2              # small politeness delay
-MAX_429_RETRIES = 4
+THROTTLE_SEC = 0.2              # min spacing between Serper requests, shared by all workers
+MAX_429_RETRIES = 4             # HTTP 429 (rate limit) is retried this many times before the quota counts as dead
+RETRY_429_BASE_SEC = 2.0        # backoff after the n-th 429 is RETRY_429_BASE_SEC * 2**n, for all workers
 REQUEST_TIMEOUT = 25
 
+# Concurrency. Each worker runs one row's queries and then fetches that row's
+# candidates, so Serper round-trips and page fetches of different rows overlap.
+# Credits are reserved up front in row order (see _reserve_query_budget), so
+# the set of billed queries does not depend on worker timing.
+SEARCH_WORKERS = 8
+# Rows submitted ahead of the oldest unfinished row. Bounds memory and how much
+# work is discarded when a quota error stops the run.
+MAX_ROWS_IN_FLIGHT = 32
+
 # Top-N organic links per row to actually fetch bodies for.
 TOP_LINKS_TO_FETCH = 3
 
+# Pre-fetch screen (see _screen_candidate). Rejects candidates from URL and
+# domain alone, then reads only the first PREFETCH_BYTES of HTML pages on
+# non-code-publisher hosts before committing to a full download and parse.
+PRESCREEN_CANDIDATES = True
+PREFETCH_BYTES = 64 * 1024
+PREFETCH_TIMEOUT = 10
+
+# Sibling-page reuse. Before searching, waiting rows are matched against pages
+# Stage 1 (or an earlier search run) already fetched for the same city; a row
+# whose Number is confirmed on such a page gets that page as its candidate and
+# is not searched. Only pages already in Stage 1's fetch cache are used.
+SIBLING_REUSE = True
+STAGE1_EXTRACTED_PARQUET = OUT_DIR / f"{Path(CSV_FILENAME).stem}.extracted.parquet"
+SIBLING_MAX_CANDIDATES = TOP_LINKS_TO_FETCH
+
 # Code-publisher hosts: used to (a) re-rank Brave results toward ordinance
 # pages and (b) report whether query bias worked.
 CODE_PUBLISHER_HOSTS = [
@@ -262,13 +348,18 @@ def _build_fallback_queries(r: pd.Series) -> list[tuple[str, str]]:
     return [(label, query) for label, query in queries if query]
 
 
-def _build_query_items(r: pd.Series) -> list[tuple[str, str]]:
+def _build_query_items(
+    r: pd.Series, variant_yield: dict[str, float] | None = None,
+) -> list[tuple[str, str]]:
     """Combine existing CSV queries with v2 fallback queries.
 
     Order matters. We prefer a code-publisher-biased query before a plain query.
     If future_search_query_sitebias is empty, fallback_codepub_bias fills that
     role. The final list is de-duplicated and truncated by
     MAX_QUERY_VARIANTS_PER_ROW for cost control.
+
+    variant_yield (label -> learned yield, see learn_search_yield) reorders the
+    candidates before truncation, best first; ties keep the default order.
     """
     existing = {col: _q(r.get(col, "")) for col in QUERY_COLUMNS}
     fallback = _build_fallback_queries(r)
@@ -292,6 +383,9 @@ def _build_query_items(r: pd.Series) -> list[tuple[str, str]]:
     for item in fallback:
         ordered.append(item)
 
+    if variant_yield:
+        ordered.sort(key=lambda item: -variant_yield.get(item[0], 0.0))
+
     # De-duplicate exact query strings while preserving order.
     seen_query: set[str] = set()
     deduped: list[tuple[str, str]] = []
@@ -409,6 +503,8 @@ def _domain_trusted(url: str, city: str, county: str) -> bool:
     host = _host(url)
     if not host:
         return False
+    if STANDIN_TRUST_PAGES and _using_standin() and host.split(":")[0] == SERPER_HOST.lower():
+        return True
     if host.endswith((".gov", ".us")):
         return True
     city_key = re.sub(r"\s+", "", str(city or "").lower())
@@ -420,6 +516,20 @@ def _domain_trusted(url: str, city: str, county: str) -> bool:
     return False
 
 
+def _number_confirmed(text: str, number: str, title: str = "", desc: str = "") -> bool:
+    """Number token in the (lowercased) body text or the result title/desc."""
+    haystack = " ".join([text, str(title or "").lower(), str(desc or "").lower()])
+    toks = _number_tokens(number)
+    return bool(toks) and any(t.lower() in haystack for t in toks)
+
+
+def _jurisdiction_confirmed(text: str, city: str, county: str) -> bool:
+    """City or county name in the (lowercased) body text."""
+    city_l = str(city or "").strip().lower()
+    county_l = re.sub(r"\s*county$", "", str(county or "").strip().lower()).strip()
+    return (bool(city_l) and city_l in text) or (bool(county_l) and county_l in text)
+
+
 def _candidate_passes_strict(
     snippets_json: str, number: str, city: str, county: str, url: str,
     title: str = "", desc: str = "",
@@ -440,15 +550,10 @@ def _candidate_passes_strict(
     # publisher pages whose section number sits outside the captured window).
     # Widen ONLY the Number check to title/desc; jurisdiction and citation stay
     # anchored to the body so a wrong page cannot pass on title text alone.
-    number_haystack = " ".join([text, str(title or "").lower(), str(desc or "").lower()])
-    toks = _number_tokens(number)
-    if not toks or not any(t.lower() in number_haystack for t in toks):
+    if not _number_confirmed(text, number, title, desc):
         return False, "number_not_confirmed"
 
-    city_l = str(city or "").strip().lower()
-    county_l = re.sub(r"\s*county$", "", str(county or "").strip().lower()).strip()
-    juris_ok = (bool(city_l) and city_l in text) or (bool(county_l) and county_l in text)
-    if not juris_ok:
+    if not _jurisdiction_confirmed(text, city, county):
         return False, "jurisdiction_not_confirmed"
 
     if not _ORD_CITATION_RE.search(text):
@@ -457,33 +562,308 @@ def _candidate_passes_strict(
     return True, "pass"
 
 
-def _brave_cache_paths(query: str) -> tuple[Path, Path]:
+def _query_hash(query: str) -> str:
     # Prefix the cache key with the backend so switching search providers does
     # not silently reuse a prior backend's cached (often empty) results.
-    h = hashlib.sha1(("serper:" + query).encode("utf-8")).hexdigest()
+    return hashlib.sha1(("serper:" + query).encode("utf-8")).hexdigest()
+
+
+def _brave_cache_paths(query: str) -> tuple[Path, Path]:
+    """Legacy per-query cache files; only read when importing into the DB."""
+    h = _query_hash(query)
     return BRAVE_CACHE_DIR / f"{h}.json", BRAVE_CACHE_DIR / f"{h}.meta.json"
 
 
+# --- search cache + ledger (sqlite) --------------------------------------
+# responses: one row per query hash (latest successful response).
+# ledger:    one row per Serper request actually sent, attributed to the row
+#            that triggered it, so spend can be grouped by run, failure mode
+#            and policy type.
+# page_sections: section numbers found on each cached page, keyed by the
+#            page's cache-file mtime/size, so the sibling index only parses
+#            pages that are new or were re-fetched since the last run.
+_cache_conn: sqlite3.Connection | None = None
+_cache_lock = threading.Lock()
+_run_id = ""
+
+_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    query_hash   TEXT PRIMARY KEY,
+    query        TEXT NOT NULL,
+    response     TEXT NOT NULL,
+    fetched_at   REAL NOT NULL,
+    credits      INTEGER
+);
+CREATE TABLE IF NOT EXISTS ledger (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id       TEXT NOT NULL,
+    ts           REAL NOT NULL,
+    query_hash   TEXT NOT NULL,
+    query        TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    credits      INTEGER NOT NULL,
+    row_key      TEXT,
+    failure_mode TEXT,
+    policy_type  TEXT
+);
+CREATE INDEX IF NOT EXISTS ledger_run ON ledger(run_id);
+CREATE INDEX IF NOT EXISTS ledger_failure_mode ON ledger(failure_mode);
+CREATE INDEX IF NOT EXISTS ledger_policy_type ON ledger(policy_type);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS page_sections (
+    url          TEXT PRIMARY KEY,
+    body_mtime   REAL NOT NULL,
+    body_size    INTEGER NOT NULL,
+    tokens       TEXT NOT NULL
+);
+"""
+
+LEDGER_GROUPS = ("run_id", "failure_mode", "policy_type")
+
+
+def _using_standin() -> bool:
+    return SERPER_HOST.lower() != SERPER_PROD_HOST
+
+
+def search_cache_db() -> Path:
+    """SEARCH_CACHE_DB for the real Serper host; a separate DB per stand-in
+    host/port otherwise."""
+    if not _using_standin():
+        return SEARCH_CACHE_DB
+    tag = re.sub(r"[^A-Za-z0-9.-]+", "_", f"{SERPER_HOST}-{SERPER_PORT or 'default'}")
+    return SEARCH_CACHE_DB.with_name(f"{SEARCH_CACHE_DB.stem}.standin-{tag}{SEARCH_CACHE_DB.suffix}")
+
+
+def open_search_cache(run_id: str = "") -> sqlite3.Connection:
+    """Open (or create) search_cache_db(), importing legacy JSON files once
+    (real Serper host only).
+
+    run_id tags ledger rows written by this process.
+    """
+    global _cache_conn, _run_id
+    with _cache_lock:
+        if _cache_conn is None:
+            db = search_cache_db()
+            db.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(db, check_same_thread=False)
+            conn.executescript(_CACHE_SCHEMA)
+            if not _using_standin():
+                _import_legacy_cache(conn)
+            _cache_conn = conn
+        if run_id:
+            _run_id = run_id
+        return _cache_conn
+
+
+def _import_legacy_cache(conn: sqlite3.Connection) -> None:
+    done = conn.execute("SELECT value FROM meta WHERE key = 'legacy_imported'").fetchone()
+    if done:
+        return
+    n = 0
+    for body_path in BRAVE_CACHE_DIR.glob("*.json"):
+        if body_path.name.endswith(".meta.json"):
+            continue
+        meta_path = body_path.with_name(body_path.stem + ".meta.json")
+        try:
+            response = json.loads(body_path.read_text(encoding="utf-8"))
+        except Exception:
+            continue
+        meta = {}
+        if meta_path.exists():
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            except Exception:
+                meta = {}
+        credits = meta.get("credits", "")
+        conn.execute(
+            "INSERT OR IGNORE INTO responses VALUES (?, ?, ?, ?, ?)",
+            (
+                body_path.stem,
+                str(meta.get("query", "")),
+                json.dumps(response, ensure_ascii=False),
+                float(meta.get("ts") or body_path.stat().st_mtime),
+                int(credits) if str(credits).isdigit() else None,
+            ),
+        )
+        n += 1
+    conn.execute(
+        "INSERT OR REPLACE INTO meta VALUES ('legacy_imported', ?)", (str(time.time()),)
+    )
+    conn.commit()
+    if n:
+        print(f"Imported {n} legacy cached Serper responses into {search_cache_db().name}")
+
+
+def _cache_fresh_after() -> float:
+    if SEARCH_CACHE_TTL_DAYS is None:
+        return 0.0
+    return time.time() - float(SEARCH_CACHE_TTL_DAYS) * 86400
+
+
+def _cache_get(query: str) -> dict | None:
+    conn = open_search_cache()
+    with _cache_lock:
+        row = conn.execute(
+            "SELECT response FROM responses WHERE query_hash = ? AND fetched_at >= ?",
+            (_query_hash(query), _cache_fresh_after()),
+        ).fetchone()
+    if row is None:
+        return None
+    try:
+        return json.loads(row[0])
+    except Exception:
+        return None
+
+
+def _cache_put(query: str, data: dict) -> None:
+    conn = open_search_cache()
+    credits = data.get("credits")
+    with _cache_lock:
+        conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+            (
+                _query_hash(query),
+                query,
+                json.dumps(data, ensure_ascii=False),
+                time.time(),
+                int(credits) if isinstance(credits, (int, float)) else None,
+            ),
+        )
+        conn.commit()
+
+
+def _ledger_record(query: str, status: str, credits: int, ctx: dict | None) -> None:
+    ctx = ctx or {}
+    conn = open_search_cache()
+    with _cache_lock:
+        conn.execute(
+            "INSERT INTO ledger (run_id, ts, query_hash, query, status, credits, "
+            "row_key, failure_mode, policy_type) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                _run_id,
+                time.time(),
+                _query_hash(query),
+                query,
+                status,
+                int(credits),
+                str(ctx.get("row_key", "")),
+                str(ctx.get("failure_mode", "")),
+                str(ctx.get("policy_type", "")),
+            ),
+        )
+        conn.commit()
+
+
+def cached_query_hashes() -> set[str]:
+    """Hashes of every query with a fresh cached response (one DB read)."""
+    conn = open_search_cache()
+    with _cache_lock:
+        rows = conn.execute(
+            "SELECT query_hash FROM responses WHERE fetched_at >= ?", (_cache_fresh_after(),)
+        ).fetchall()
+    return {h for (h,) in rows}
+
+
+def _is_query_cached(query: str, cached: set[str] | None = None) -> bool:
+    if cached is not None:
+        return _query_hash(query) in cached
+    return _cache_get(query) is not None
+
+
+def ledger_summary(by: str, run_id: str | None = None) -> pd.DataFrame:
+    """Requests sent and credits spent, grouped by run_id, failure_mode or
+    policy_type. Pass run_id to restrict to one run."""
+    if by not in LEDGER_GROUPS:
+        raise ValueError(f"by must be one of {LEDGER_GROUPS}, got {by!r}")
+    conn = open_search_cache()
+    sql = (
+        f"SELECT {by} AS {by}, COUNT(*) AS requests, SUM(credits) AS credits, "
+        f"SUM(status = 'ok') AS ok, COUNT(DISTINCT row_key) AS rows "
+        f"FROM ledger {'WHERE run_id = ?' if run_id else ''} "
+        f"GROUP BY {by} ORDER BY credits DESC"
+    )
+    with _cache_lock:
+        return pd.read_sql_query(sql, conn, params=(run_id,) if run_id else ())
+
+
+def print_ledger(run_id: str | None = None) -> None:
+    for by in LEDGER_GROUPS:
+        if run_id and by == "run_id":
+            continue
+        summary = ledger_summary(by, run_id)
+        if summary.empty:
+            continue
+        print(f"Serper spend by {by}{' (this run)' if run_id else ''}:")
+        for rec in summary.itertuples(index=False):
+            label = getattr(rec, by) or "(blank)"
+            print(
+                f"  {label:<40}: {rec.credits or 0} credits, "
+                f"{rec.requests} requests ({rec.ok} ok), {rec.rows} rows"
+            )
+
+
 # --- Serper -------------------------------------------------------------
-def brave_search(query: str, api_key: str, budget: dict) -> tuple[dict | None, str]:
+_rate_lock = threading.Lock()
+_next_request_at = 0.0
+
+
+def _push_back_requests(delay: float) -> None:
+    """Delay every worker's next request by `delay` seconds (429 backoff)."""
+    global _next_request_at
+    with _rate_lock:
+        _next_request_at = max(_next_request_at, time.monotonic() + delay)
+
+
+def _wait_for_request_slot() -> None:
+    """Global rate limit: space Serper requests THROTTLE_SEC apart across all
+    worker threads."""
+    global _next_request_at
+    with _rate_lock:
+        now = time.monotonic()
+        slot = max(now, _next_request_at)
+        _next_request_at = slot + THROTTLE_SEC
+    if slot > now:
+        time.sleep(slot - now)
+
+
+def _serper_connection() -> http.client.HTTPConnection:
+    if SERPER_USE_TLS:
+        return http.client.HTTPSConnection(SERPER_HOST, SERPER_PORT, timeout=REQUEST_TIMEOUT)
+    return http.client.HTTPConnection(SERPER_HOST, SERPER_PORT, timeout=REQUEST_TIMEOUT)
+
+
+def new_budget() -> dict:
+    """Run-wide Serper budget shared by all workers.
+
+    used        requests actually sent (guarded by lock)
+    lock        makes the MAX_QUERIES check-and-increment atomic
+    quota_dead  set on the first auth/credit/rate error; later uncached
+                queries return quota_exceeded without sending anything
+    """
+    return {"used": 0, "lock": threading.Lock(), "quota_dead": threading.Event()}
+
+
+def brave_search(
+    query: str, api_key: str, budget: dict, ledger_ctx: dict | None = None,
+) -> tuple[dict | None, str]:
     """Run one Serper query. Return (json_or_None, status). Cached queries do NOT
     consume budget. Name kept as brave_search for call-site compatibility.
 
-    budget is a mutable dict {"used": int} enforcing the MAX_QUERIES ceiling
-    across the whole run.
+    budget is the shared dict from new_budget() enforcing the MAX_QUERIES
+    ceiling across the whole run; safe to call from several threads. Within a
+    run, call it through _memoized(memo, "query", ...) so a query string shared
+    by several rows is sent once. ledger_ctx ({row_key, failure_mode,
+    policy_type}) attributes a sent request in the ledger.
     """
     if not query.strip():
         return None, "empty_query"
 
-    body_path, meta_path = _brave_cache_paths(query)
-    if body_path.exists():
-        try:
-            return json.loads(body_path.read_text(encoding="utf-8")), "cached"
-        except Exception:
-            pass
-
-    if budget["used"] >= MAX_QUERIES:
-        return None, "budget_exhausted"
+    cached = _cache_get(query)
+    if cached is not None:
+        return cached, "cached"
 
     payload = json.dumps({"q": query, "gl": SERPER_GL, "num": SERPER_NUM})
     headers = {"X-API-KEY": api_key, "Content-Type": "application/json"}
@@ -493,45 +873,57 @@ def brave_search(query: str, api_key: str, budget: dict) -> tuple[dict | None, s
         # caps total requests. Otherwise a run where every call fails (e.g. quota
         # exhausted) never increments budget and the ceiling never triggers,
         # letting the loop hammer every row with thousands of failing calls.
-        budget["used"] += 1
+        # Check-and-increment is atomic so concurrent workers cannot overspend.
+        with budget["lock"]:
+            if budget["quota_dead"].is_set():
+                return None, "quota_exceeded"
+            if budget["used"] >= MAX_QUERIES:
+                return None, "budget_exhausted"
+            budget["used"] += 1
+        _wait_for_request_slot()
         try:
-            conn = http.client.HTTPSConnection(SERPER_HOST, timeout=REQUEST_TIMEOUT)
+            conn = _serper_connection()
             conn.request("POST", SERPER_PATH, payload, headers)
             resp = conn.getresponse()
             status_code = resp.status
             raw = resp.read().decode("utf-8", errors="replace")
             conn.close()
         except Exception as e:
-            return None, f"request_error:{type(e).__name__}"
+            status = f"request_error:{type(e).__name__}"
+            _ledger_record(query, status, 0, ledger_ctx)
+            return None, status
 
         if status_code == 200:
             try:
                 data = json.loads(raw)
             except Exception:
+                _ledger_record(query, "bad_json", 0 if _using_standin() else 1, ledger_ctx)
                 return None, "bad_json"
-            BRAVE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
-            body_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
-            meta_path.write_text(
-                json.dumps(
-                    {
-                        "query": query,
-                        "status_code": 200,
-                        "ts": time.time(),
-                        "credits": data.get("credits", ""),
-                    },
-                    ensure_ascii=False,
-                ),
-                encoding="utf-8",
+            _cache_put(query, data)
+            credits = data.get("credits")
+            if _using_standin():
+                credits = 0  # the stand-in is free, whatever it reports
+            _ledger_record(
+                query, "ok", int(credits) if isinstance(credits, (int, float)) else 1, ledger_ctx
             )
-            time.sleep(THROTTLE_SEC)
             return data, "ok"
 
+        # Rate limit: back off (all workers, via the shared request spacing) and
+        # retry. Only a 429 that outlasts MAX_429_RETRIES counts as a dead quota.
+        if status_code == 429 and attempt < MAX_429_RETRIES:
+            _ledger_record(query, "http_429_retry", 0, ledger_ctx)
+            _push_back_requests(RETRY_429_BASE_SEC * 2 ** attempt)
+            continue
+
         # Credit/quota exhaustion or auth failure. Serper returns 401/403 for bad
-        # or out-of-credit keys and 429 for rate limits. Retrying cannot help, so
-        # signal a terminal status the caller can fail-fast on.
+        # or out-of-credit keys. Retrying cannot help, so signal a terminal status
+        # the caller can fail-fast on.
         if status_code in (401, 402, 403, 429):
+            budget["quota_dead"].set()
+            _ledger_record(query, "quota_exceeded", 0, ledger_ctx)
             return None, "quota_exceeded"
 
+        _ledger_record(query, f"http_{status_code}", 0, ledger_ctx)
         return None, f"http_{status_code}"
 
     return None, "http_error_exhausted"
@@ -563,21 +955,32 @@ def _extract_summary(data: dict) -> str:
     return ""
 
 
-def _rank_candidates(results: list[dict]) -> list[dict]:
-    """Stable re-rank: code-publisher domains first, then everything else."""
+def _rank_candidates(results: list[dict], host_rate=None) -> list[dict]:
+    """Stable re-rank: code-publisher domains first, then everything else.
+
+    host_rate (url -> learned strict-pass rate) orders candidates within each
+    group when yield scheduling is on.
+    """
     cp = [r for r in results if _is_code_publisher(r["url"])]
     other = [r for r in results if not _is_code_publisher(r["url"])]
+    if host_rate is not None:
+        cp.sort(key=lambda r: -host_rate(r["url"]))
+        other.sort(key=lambda r: -host_rate(r["url"]))
     return cp + other
 
 
 # --- fetch + snippet ----------------------------------------------------
-def _fetch_and_snippet(url: str, base: dict) -> dict:
+def _fetch_and_snippet(url: str, base: dict, prefetched: tuple | None = None) -> dict:
     """Fetch + snippet a URL using Stage 1 logic.
 
     Returns a row with the same schema Stage 1 produces, so Stage 2 can consume
-    it unchanged.
+    it unchanged. `prefetched` is (body, fetch_status, content_type) when the
+    pre-fetch probe already holds the whole document.
     """
-    body, fetch_status, content_type = stage1.fetch_body(url)
+    if prefetched is not None:
+        body, fetch_status, content_type = prefetched
+    else:
+        body, fetch_status, content_type = stage1.fetch_body(url)
     if body is None:
         return stage1._empty_row(base, fetch_status, "no_body_fetch_failed")
 
@@ -680,199 +1083,864 @@ def _debug_payload(
     }
 
 
-# --- main ---------------------------------------------------------------
-def main() -> None:
-    if not INPUT_WAITING_CSV.exists():
-        sys.exit(f"Input not found: {INPUT_WAITING_CSV}. Run export_waiting_for_google_search.py first.")
+# --- whole-run dedup ----------------------------------------------------
+# Rows often share City + Number (several policy types citing one section), so
+# they build identical queries and get identical candidate URLs. The run memo
+# makes each unique query, each candidate fetch, and each strict validation
+# happen once per run; other rows wait for and reuse that result.
+def new_run_memo() -> dict:
+    return {
+        "lock": threading.Lock(),
+        "query": {},       # query string -> (data, status)
+        "fetch": {},       # url -> row-independent fetch/snippet fields
+        "probe": {},       # url -> _probe_url() result (first PREFETCH_BYTES)
+        "screen": {},      # (url, number, city, county, title, desc) -> (fields, strict_status)
+        "stats": Counter(),
+        "schedule": None,  # learn_search_yield() output when SCHEDULE_BY_YIELD
+    }
 
-    api_key = _load_env_credentials()
-    BRAVE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
-    OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-    df = pd.read_csv(INPUT_WAITING_CSV, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+def _memoized(memo: dict, kind: str, key, compute):
+    """Return compute() for (kind, key), computing it once per run.
 
-    # Select rows to search:
-    #   - only Exists?==Y rows are searched;
-    #   - Number must be non-empty;
-    #   - optionally require Number to include a digit to avoid wasting budget;
-    #   - never re-search rows Stage 2 already solved;
-    #   - optional failure-mode filter.
-    sel = df.get("Exists? (Y/N)", "").astype(str).str.strip().str.upper().eq("Y")
-    sel &= df.get("Number", "").astype(str).str.strip().ne("")
-    if REQUIRE_DIGIT_IN_NUMBER:
-        sel &= df.get("Number", "").astype(str).str.contains(r"\d", regex=True, na=False)
-    if SKIP_NOT_IN_CODE_POLICIES:
-        # Madeleine: these policy types do not live in municipal code, so their
-        # adoption dates are not in an ordinance and searching wastes credits.
-        sel &= ~df.get("Policy Type", "").astype(str).str.strip().isin(NOT_IN_CODE_POLICIES)
-    sel &= ~df.get("date_parse_status", "").astype(str).str.strip().isin(SKIP_STATUSES)
-    if PROCESS_ONLY_FAILURE_MODES:
-        sel &= df.get("failure_mode", "").astype(str).str.strip().isin(PROCESS_ONLY_FAILURE_MODES)
+    Single-flight: concurrent callers with the same key block on the first
+    caller's Future instead of repeating the work.
+    """
+    with memo["lock"]:
+        fut = memo[kind].get(key)
+        owner = fut is None
+        if owner:
+            fut = Future()
+            memo[kind][key] = fut
+        memo["stats"][f"{kind}_{'computed' if owner else 'reused'}"] += 1
+    if owner:
+        try:
+            fut.set_result(compute())
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+    return fut.result()
+
+
+# --- pre-fetch screen ---------------------------------------------------
+# The strict gate only runs on a fully fetched and parsed body, yet many
+# candidates fail it on domain trust or a missing Number. Before that:
+#   1. metadata: an untrusted domain or a Number with no usable token fails
+#      the strict gate whatever the body says, so nothing is downloaded;
+#   2. probe: HTML on non-code-publisher hosts is read up to PREFETCH_BYTES
+#      (Range request, stream closed at the limit). If the probe holds the
+#      whole page, a missing Number or jurisdiction is the strict verdict and
+#      the probe bytes stand in for the full fetch. If the page is longer,
+#      the candidate is dropped only when neither appears in the first bytes.
+# Code-publisher pages are not probed (JS-rendered or rewritten by Stage 1, so
+# their raw first bytes say little), nor are PDFs (a truncated PDF does not
+# parse) or URLs Stage 1 already has cached.
+def _probe_url(url: str) -> dict | None:
+    """Read at most PREFETCH_BYTES of an HTML page.
+
+    Returns {"text", "complete", "body", "content_type", "n_bytes"} or None when
+    the probe says nothing useful (PDF, HTTP error, bot challenge, JS shell).
+    "body" is kept only when "complete" (the probe read the whole document).
+    """
+    if stage1.is_pdf_payload(url, "", b""):
+        return None
+    headers = {**stage1.BROWSER_HEADERS, "Range": f"bytes=0-{PREFETCH_BYTES - 1}"}
+    try:
+        with requests.get(
+            stage1.rewrite_url(url),
+            headers=headers,
+            timeout=PREFETCH_TIMEOUT,
+            allow_redirects=True,
+            stream=True,
+        ) as resp:
+            if resp.status_code not in (200, 206):
+                return None
+            content_type = resp.headers.get("Content-Type", "")
+            if "html" not in content_type.lower():
+                return None
+            chunks, n_bytes, truncated = [], 0, False
+            for chunk in resp.iter_content(16 * 1024):
+                chunks.append(chunk)
+                n_bytes += len(chunk)
+                if n_bytes >= PREFETCH_BYTES:
+                    truncated = True
+                    break
+            if resp.status_code == 206:
+                # "bytes 0-65535/123456": complete only if the total fits.
+                m = re.search(r"/(\d+)\s*$", resp.headers.get("Content-Range", ""))
+                truncated = m is None or int(m.group(1)) > n_bytes
+    except Exception:
+        return None
 
-    todo = df[sel].copy()
-    if "search_priority_score" in todo.columns:
-        todo["_score"] = pd.to_numeric(todo["search_priority_score"], errors="coerce").fillna(0.0)
-        todo = todo.sort_values("_score", ascending=False)
+    body = b"".join(chunks)[:PREFETCH_BYTES]
+    if stage1._is_probably_challenge_or_empty(body, content_type):
+        return None
+    text = stage1.html_to_text(stage1.bytes_to_html_text(body))
+    if len(text) < stage1.MIN_TEXT_CHARS:
+        return None
+    return {
+        "text": text.lower(),
+        "complete": not truncated,
+        "body": None if truncated else body,
+        "content_type": content_type,
+        "n_bytes": len(body),
+    }
 
-    print(f"Waiting rows:            {len(df)}")
-    print(f"Eligible to search:      {len(todo)}")
+
+def _should_probe(url: str, memo: dict) -> bool:
+    if _is_code_publisher(url) or stage1.is_pdf_payload(url, "", b""):
+        return False
+    with memo["lock"]:
+        if url in memo["fetch"]:  # another row already paid for the full fetch
+            return False
+    body_path, meta_path = stage1._cache_paths(url)
+    return not (body_path.exists() and meta_path.exists())
+
+
+def _probe_verdict(probe: dict, number: str, city: str, county: str, title: str, desc: str) -> str:
+    """Rejection status from a probe, or "" to go on to the full fetch."""
+    text = probe["text"]
+    number_ok = _number_confirmed(text, number, title, desc)
+    juris_ok = _jurisdiction_confirmed(text, city, county)
+    if probe["complete"]:
+        # Same checks, same text as the strict gate would see: exact.
+        if not number_ok:
+            return "number_not_confirmed"
+        if not juris_ok:
+            return "jurisdiction_not_confirmed"
+        return ""
+    if not number_ok and not juris_ok:
+        return "prefetch_no_number_or_jurisdiction"
+    return ""
+
+
+def _prescreen_reject(memo: dict, reason: str, fetch_status: str) -> tuple[dict, str]:
+    with memo["lock"]:
+        memo["stats"][f"prescreen_{reason}"] += 1
+    return stage1._empty_row({}, fetch_status, f"no_body_{reason}"), reason
+
+
+def _screen_candidate(cand: dict, r: pd.Series, memo: dict) -> tuple[dict, str]:
+    """Pre-screen, fetch, snippet and strict-validate one candidate for one row.
+
+    Returns (fetch_fields, strict_status) without the row's base columns. The
+    fetch is shared by every row that got this URL; the strict verdict is
+    shared by rows with the same Number/City/County and result text.
+    """
+    url = cand["url"]
+    number = _q(r.get("Number", ""))
+    city = _q(r.get("City", ""))
+    county = _q(r.get("County", ""))
+    title = cand.get("title", "")
+    desc = cand.get("description", "")
+
+    def screen() -> tuple[dict, str]:
+        # v3.5 strict gate. A candidate only flows to Stage 2 if it passes.
+        if _is_low_value_url(url):
+            return (
+                stage1._empty_row({}, "skipped_low_value_url", "no_body_low_value_url"),
+                "skipped_low_value_url",
+            )
+        prefetched = None
+        if PRESCREEN_CANDIDATES:
+            if not _domain_trusted(url, city, county):
+                return _prescreen_reject(memo, "untrusted_domain", "skipped_prescreen")
+            if not _number_tokens(number):
+                return _prescreen_reject(memo, "number_not_confirmed", "skipped_prescreen")
+            if _should_probe(url, memo):
+                probe = _memoized(memo, "probe", url, lambda: _probe_url(url))
+                if probe is not None:
+                    kind = "complete" if probe["complete"] else "partial"
+                    reason = _probe_verdict(probe, number, city, county, title, desc)
+                    if reason:
+                        return _prescreen_reject(
+                            memo, reason, f"prefetch_{kind} ({probe['n_bytes']} bytes)"
+                        )
+                    if probe["complete"]:
+                        prefetched = (probe["body"], "ok_prefetch", probe["content_type"])
+        fetched = dict(_memoized(
+            memo, "fetch", url, lambda: _fetch_and_snippet(url, {}, prefetched)
+        ))
+        if not str(fetched.get("body_mode", "")).startswith(("html_", "pdf_")):
+            return fetched, "not_fetched"
+        ok, strict_status = _candidate_passes_strict(
+            fetched.get("snippets_json", "[]"), number, city, county, url, title, desc,
+        )
+        if not ok:
+            # Downgrade: never let an unconfirmed page reach Stage 2.
+            fetched["snippets_json"] = "[]"
+            fetched["n_ord_hits"] = 0
+            fetched["body_mode"] = f"no_body_{strict_status}"
+        return fetched, strict_status
+
+    fields, strict_status = _memoized(
+        memo, "screen", (url, number, city, county, title, desc), screen
+    )
+    return dict(fields), strict_status
+
+
+def _price_queries(
+    todo: pd.DataFrame, schedule: dict | None = None,
+) -> list[tuple[pd.Series, list[tuple[str, str]], list[str]]]:
+    """Build every row's queries and price each one, in row order.
+
+    Returns [(row, query_items, costs), ...] where costs[i] is "cached" (free),
+    "shared" (an earlier row already pays for the same query string) or
+    "billable" (costs one credit). Reads the cache DB only; no network.
+    """
+    cached = cached_query_hashes()
+    charged: set[str] = set()
+    priced = []
+    for _, r in todo.iterrows():
+        query_items = _build_query_items(r, _variant_yield(schedule, r))
+        costs = []
+        for _label, query in query_items:
+            if query in charged:
+                costs.append("shared")
+            elif _is_query_cached(query, cached):
+                costs.append("cached")
+            else:
+                charged.add(query)
+                costs.append("billable")
+        priced.append((r, query_items, costs))
+    return priced
+
+
+def _reserve_query_budget(
+    todo: pd.DataFrame, schedule: dict | None = None,
+) -> tuple[list[tuple[pd.Series, list[tuple[str, str]], int]], dict]:
+    """Plan the whole run: decide, in row order and before any request is
+    sent, which queries may spend credits.
+
+    Returns ([(row, query_items, n_allowed), ...], plan_stats). Mirrors the
+    serial rules: a row whose turn comes after MAX_QUERIES is spent is not
+    searched, and a row that reaches the ceiling part-way runs only its first
+    n_allowed queries. Cached queries are free, and an uncached query string
+    shared by several rows is charged once (the run memo sends it once).
+    """
+    plans = []
+    used = 0
+    stats = Counter()
+    for r, query_items, costs in _price_queries(todo, schedule):
+        if used >= MAX_QUERIES:
+            break
+        n_allowed = 0
+        for cost in costs:
+            if used >= MAX_QUERIES:
+                break
+            n_allowed += 1
+            stats["query_slots"] += 1
+            if cost == "shared":
+                stats["credits_saved"] += 1
+            elif cost == "cached":
+                stats["cached"] += 1
+            else:
+                used += 1
+        plans.append((r, query_items, n_allowed))
+    stats["billable"] = used
+    return plans, dict(stats)
+
+
+def plan_search_run(
+    todo: pd.DataFrame, credit_budget: int, schedule: dict | None = None,
+) -> pd.DataFrame:
+    """Dry-run plan: one record per eligible waiting row, in search order.
+
+    Uses the same rules as _reserve_query_budget: a row is `reached` if the
+    budget is not yet spent when its turn comes (it may still be cut part-way),
+    and `fully_covered` if all of its queries fit in the budget.
+    """
+    records = []
+    spent = 0
+    for rank, (r, query_items, costs) in enumerate(_price_queries(todo, schedule), start=1):
+        n_billable = costs.count("billable")
+        records.append({
+            "rank": rank,
+            "row_key": _row_key(r),
+            "city": _q(r.get("City", "")),
+            "county": _q(r.get("County", "")),
+            "policy_type": _q(r.get("Policy Type", "")),
+            "number": _q(r.get("Number", "")),
+            "failure_mode": _failure_mode(r),
+            "search_priority_score": _q(r.get("search_priority_score", "")),
+            "expected_yield": round(_expected_row_yield(schedule, r), 4) if schedule else "",
+            "n_queries": len(query_items),
+            "n_cached": costs.count("cached"),
+            "n_shared": costs.count("shared"),
+            "n_billable": n_billable,
+            "credits_before": spent,
+            "credits_after": spent + n_billable,
+            "reached": spent < credit_budget,
+            "fully_covered": spent < credit_budget and spent + n_billable <= credit_budget,
+            "queries_json": json.dumps(
+                [
+                    {"label": label, "query": query, "cost": cost}
+                    for (label, query), cost in zip(query_items, costs)
+                ],
+                ensure_ascii=False,
+            ),
+        })
+        spent += n_billable
+    return pd.DataFrame(records)
+
+
+def _print_plan(plan: pd.DataFrame, credit_budget: int) -> None:
+    if plan.empty:
+        print("Nothing to plan: no eligible rows.")
+        return
+    total = int(plan["n_billable"].sum())
+    print(f"Query slots:             {int(plan['n_queries'].sum())}")
+    print(f"  cached (free):         {int(plan['n_cached'].sum())}")
+    print(f"  shared across rows:    {int(plan['n_shared'].sum())}")
+    print(f"  billable:              {total}")
     print(
-        f"MAX_QUERIES (cost cap):  {MAX_QUERIES}  "
-        f"(<= {MAX_QUERY_VARIANTS_PER_ROW} queries/row -> ~{MAX_QUERIES // max(1, MAX_QUERY_VARIANTS_PER_ROW)} rows this run)"
+        f"Budget {credit_budget}: reaches {int(plan['reached'].sum())} of {len(plan)} rows "
+        f"({int(plan['fully_covered'].sum())} fully covered)"
     )
-    print(f"Require digit in Number: {REQUIRE_DIGIT_IN_NUMBER}")
+    print("Rows fully covered at other budgets:")
+    for b in sorted({100, 500, 1000, credit_budget, total} - {0}):
+        n = int(((plan["credits_before"] < b) & (plan["credits_after"] <= b)).sum())
+        print(f"  {b:>6} credits -> {n} rows")
 
-    budget = {"used": 0}
+
+def _search_row(
+    r: pd.Series,
+    query_items: list[tuple[str, str]],
+    n_allowed: int,
+    api_key: str,
+    budget: dict,
+    memo: dict,
+) -> tuple[list[dict], bool]:
+    """Search, fetch and strict-validate one waiting row.
+
+    Returns (output_rows, quota_hit). Runs in a worker thread.
+    """
     rows: list[dict] = []
-    quota_dead = False
+    base = _base_row(r)
+    ledger_ctx = {
+        "row_key": base["row_key"],
+        "failure_mode": _failure_mode(r),
+        "policy_type": _q(r.get("Policy Type", "")),
+    }
 
-    for _, r in tqdm(todo.iterrows(), total=len(todo), desc="Serper search", unit="row"):
-        if quota_dead or budget["used"] >= MAX_QUERIES:
+    if not query_items:
+        rows.append({
+            **base,
+            "source_url": "",
+            "date_source_stage": "stage4_brave_search",
+            "brave_summary": "",
+            **_debug_payload([], {"no_query": "empty"}, {}, []),
+            "fetch_status": "no_query_built",
+            "n_ord_hits": 0,
+            "body_mode": "no_body_no_query",
+            "snippets_json": "[]",
+            "extract_parse_error": "",
+            "strict_validation": "no_query",
+            "search_complete": True,
+        })
+        return rows, False
+
+    # Gather results from query variants, dedup by URL, and record returned
+    # domains/statuses for query tuning.
+    quota_hit = False
+    seen_urls: set[str] = set()
+    merged: list[dict] = []
+    per_query_domains: dict[str, list[str]] = {}
+    query_statuses: dict[str, str] = {}
+    summary_text = ""
+
+    for qi, (qlabel, query) in enumerate(query_items):
+        if qi >= n_allowed:
+            query_statuses[qlabel] = "budget_exhausted"
+            per_query_domains[qlabel] = ["(budget_exhausted)"]
             break
 
-        query_items = _build_query_items(r)
-        base = _base_row(r)
+        data, status = _memoized(
+            memo, "query", query,
+            lambda: brave_search(query, api_key, budget, ledger_ctx),
+        )
+        query_statuses[qlabel] = status
+        if status == "quota_exceeded":
+            # Serper auth/credit/rate error; stop making requests entirely.
+            per_query_domains[qlabel] = ["(quota_exceeded)"]
+            quota_hit = True
+            break
+        if data is None:
+            per_query_domains[qlabel] = [f"({status})"]
+            continue
 
-        if not query_items:
-            rows.append({
-                **base,
-                "source_url": "",
-                "date_source_stage": "stage4_brave_search",
-                "brave_summary": "",
-                **_debug_payload([], {"no_query": "empty"}, {}, []),
-                "fetch_status": "no_query_built",
-                "n_ord_hits": 0,
-                "body_mode": "no_body_no_query",
-                "snippets_json": "[]",
-                "extract_parse_error": "",
-                "strict_validation": "no_query",
-            })
+        res = _extract_results(data)
+        per_query_domains[qlabel] = [_host(x["url"]) for x in res[:5]]
+
+        if not summary_text:
+            summary_text = _extract_summary(data)
+
+        for x in res:
+            if x["url"] not in seen_urls:
+                seen_urls.add(x["url"])
+                x["from_query"] = qlabel
+                merged.append(x)
+
+    schedule = memo["schedule"]
+    ranked = _rank_candidates(
+        merged,
+        (lambda url: _host_pass_rate(schedule, r, url)) if schedule else None,
+    )
+    top = ranked[:TOP_LINKS_TO_FETCH]
+    debug = _debug_payload(query_items, query_statuses, per_query_domains, merged)
+    # Rows cut short by the quota or the budget are searched again on resume.
+    complete = not quota_hit and "budget_exhausted" not in query_statuses.values()
+
+    if not top:
+        rows.append({
+            **base,
+            "source_url": "",
+            "date_source_stage": "stage4_brave_search",
+            "brave_summary": summary_text,
+            **debug,
+            "fetch_status": "no_brave_results",
+            "n_ord_hits": 0,
+            "body_mode": "no_body_no_results",
+            "snippets_json": "[]",
+            "extract_parse_error": "",
+            "strict_validation": "no_results",
+            "search_complete": complete,
+        })
+        return rows, quota_hit
+
+    # Fetch + snippet each of the top candidates, emitting one row per
+    # fetched candidate so Stage 2 can score them.
+    for rank_i, cand in enumerate(top):
+        fields, strict_status = _screen_candidate(cand, r, memo)
+        rows.append(_candidate_row(
+            base, cand, fields, strict_status, rank_i, complete, summary_text, debug,
+        ))
+
+    return rows, quota_hit
+
+
+def _candidate_row(
+    base: dict,
+    cand: dict,
+    fields: dict,
+    strict_status: str,
+    rank_i: int,
+    complete: bool,
+    summary_text: str,
+    debug: dict,
+    stage: str = "stage4_brave_search",
+) -> dict:
+    """One output row per screened candidate, so Stage 2 can score them."""
+    fetched = {**base, "source_url": cand["url"], **fields}
+    fetched["strict_validation"] = strict_status
+    fetched["search_complete"] = complete
+    fetched.update({
+        "date_source_stage": stage,
+        "brave_rank": rank_i,
+        "brave_from_query": cand.get("from_query", ""),
+        "brave_result_title": cand.get("title", ""),
+        "brave_result_desc": cand.get("description", ""),
+        "brave_is_codepublisher": _is_code_publisher(cand["url"]),
+        "brave_summary": summary_text if rank_i == 0 else "",
+    })
+
+    # Store full debug payload only on rank 0 to keep parquet smaller,
+    # but keep compatibility/debug fields present on all rows.
+    if rank_i == 0:
+        fetched.update(debug)
+    else:
+        fetched.update({
+            "brave_queries_json": "",
+            "brave_query_statuses_json": "",
+            "brave_query_domains_json": "",
+            "brave_candidate_urls": "",
+            "brave_sitebias_domains": "",
+            "brave_plain_domains": "",
+            "brave_sitebias_hit_codepub": None,
+        })
+    return fetched
+
+
+# --- yield-aware scheduling ---------------------------------------------
+# Learns from the previous search run (OUTPUT_PARQUET) and the Stage 2 result
+# on it (YIELD_ENRICHED_PARQUET) which failure modes, policy types, result
+# hosts and query variants actually produced strict-pass candidates and dated
+# rows. Rates are smoothed toward their parent group, so a sparse group
+# (say one failure mode x policy type seen twice) does not swing the order:
+#   (failure_mode, policy_type) -> failure_mode -> all rows
+# With no history the order stays search_priority_score / file order.
+def _failure_mode(r: pd.Series) -> str:
+    """Why Stage 2 left the row undated: the failure_mode column when present,
+    otherwise Stage 2's date_parse_status."""
+    return _q(r.get("failure_mode", "")) or _q(r.get("date_parse_status", "")) or "(unknown)"
+
+
+def _host_class(url: str) -> str:
+    """Coarse host pattern for yield stats: the code-publisher host, 'gov' for
+    .gov/.us hosts, else 'other'."""
+    h = _host(url)
+    for c in CODE_PUBLISHER_HOSTS:
+        if h == c or h.endswith("." + c):
+            return c
+    if h.endswith((".gov", ".us")):
+        return "gov"
+    return "other"
+
+
+def _smoothed(hits: float, n: float, prior: float) -> float:
+    return (hits + YIELD_PRIOR_WEIGHT * prior) / (n + YIELD_PRIOR_WEIGHT)
+
+
+def learn_search_yield(waiting: pd.DataFrame) -> dict:
+    """Yield tables from the last search run. Returns a schedule dict:
+
+    row_rate(fm, pt)          P(row gets dated | searched)
+    query_rate(fm, label)     dated rows per issued query of that variant
+    host_pass(fm, pt, host)   P(candidate passes strict gate | host class)
+    table                     candidate-level counts for YIELD_REPORT_CSV
+    """
+    fm_by_key = {_row_key(r): _failure_mode(r) for _, r in waiting.iterrows()}
+
+    searched = pd.DataFrame()
+    if OUTPUT_PARQUET.exists():
+        try:
+            searched = pd.read_parquet(OUTPUT_PARQUET)
+        except Exception:
+            searched = pd.DataFrame()
+    dated_urls: dict = {}
+    if YIELD_ENRICHED_PARQUET.exists():
+        try:
+            enr = pd.read_parquet(YIELD_ENRICHED_PARQUET, columns=["row_key", "source_url", "adopted_date"])
+            enr = enr[enr["adopted_date"].fillna("").astype(str).str.strip().ne("")]
+            dated_urls = dict(zip(enr["row_key"], enr["source_url"].fillna("").astype(str)))
+        except Exception:
+            dated_urls = {}
+
+    if "date_source_stage" in searched.columns:
+        # Sibling-page rows cost no query; they say nothing about search yield.
+        searched = searched[searched["date_source_stage"].astype(str).ne(SIBLING_STAGE)]
+    if searched.empty or "row_key" not in searched.columns:
+        return {"rows": {}, "fm": {}, "queries": {}, "labels": {}, "hosts": {},
+                "global_row": 0.5, "global_query": 0.5, "table": pd.DataFrame()}
+
+    c = pd.DataFrame({
+        "row_key": searched["row_key"],
+        "failure_mode": searched["row_key"].map(fm_by_key).fillna("(unknown)"),
+        "policy_type": searched.get("policy_type", "").fillna("").astype(str),
+        "host_class": searched.get("source_url", "").fillna("").astype(str).map(_host_class),
+        "passed": searched.get("strict_validation", "").astype(str).eq("pass"),
+        "label": searched.get("brave_from_query", "").fillna("").astype(str),
+    })
+    c["dated"] = [
+        bool(u) and dated_urls.get(k) == u
+        for k, u in zip(c["row_key"], searched.get("source_url", "").fillna("").astype(str))
+    ]
+
+    # Row level: a row counts as dated if any of its candidates produced the date.
+    rows = c.groupby("row_key").agg(
+        failure_mode=("failure_mode", "first"), policy_type=("policy_type", "first"),
+        dated=("dated", "any"),
+    )
+    global_row = (rows["dated"].sum() + 1) / (len(rows) + 2)
+    fm_stats = rows.groupby("failure_mode")["dated"].agg(["sum", "count"])
+    fm_rate = {fm: _smoothed(s, n, global_row) for fm, (s, n) in fm_stats.iterrows()}
+    pair_stats = rows.groupby(["failure_mode", "policy_type"])["dated"].agg(["sum", "count"])
+    row_rate = {
+        key: _smoothed(s, n, fm_rate.get(key[0], global_row))
+        for key, (s, n) in pair_stats.iterrows()
+    }
+
+    # Query variants: every issued (ok/cached) query of a row is one trial;
+    # the variant whose candidate got dated gets the hit.
+    q_hits: Counter = Counter()
+    q_trials: Counter = Counter()
+    for _, rec in searched.iterrows():
+        raw = str(rec.get("brave_query_statuses_json", "") or "")
+        if not raw:
+            continue
+        try:
+            statuses = json.loads(raw)
+        except Exception:
             continue
+        fm = fm_by_key.get(rec["row_key"], "(unknown)")
+        for label, status in statuses.items():
+            if status in ("ok", "cached"):
+                q_trials[(fm, label)] += 1
+    for (fm, label), n in c[c["dated"]].groupby(["failure_mode", "label"]).size().items():
+        q_hits[(fm, label)] += n
+    total_trials = sum(q_trials.values())
+    global_query = (sum(q_hits.values()) + 1) / (total_trials + 2)
+    label_trials: Counter = Counter()
+    label_hits: Counter = Counter()
+    for (fm, label), n in q_trials.items():
+        label_trials[label] += n
+        label_hits[label] += q_hits[(fm, label)]
+    label_rate = {
+        label: _smoothed(label_hits[label], n, global_query) for label, n in label_trials.items()
+    }
+    query_rate = {
+        key: _smoothed(q_hits[key], n, label_rate.get(key[1], global_query))
+        for key, n in q_trials.items()
+    }
+
+    # Host pattern: strict-pass rate per (failure_mode, policy_type, host class).
+    table = c.groupby(["failure_mode", "policy_type", "host_class"]).agg(
+        candidates=("passed", "size"), passed=("passed", "sum"), dated=("dated", "sum"),
+    ).reset_index()
+    global_pass = (c["passed"].sum() + 1) / (len(c) + 2)
+    host_rate = {
+        h: _smoothed(s, n, global_pass)
+        for h, (s, n) in c.groupby("host_class")["passed"].agg(["sum", "count"]).iterrows()
+    }
+    host_pass = {
+        (rec.failure_mode, rec.policy_type, rec.host_class):
+            _smoothed(rec.passed, rec.candidates, host_rate.get(rec.host_class, global_pass))
+        for rec in table.itertuples(index=False)
+    }
+    table["pass_rate"] = [
+        host_pass[(r.failure_mode, r.policy_type, r.host_class)] for r in table.itertuples(index=False)
+    ]
 
-        # Gather results from query variants, dedup by URL, and record returned
-        # domains/statuses for query tuning.
-        seen_urls: set[str] = set()
-        merged: list[dict] = []
-        per_query_domains: dict[str, list[str]] = {}
-        query_statuses: dict[str, str] = {}
-        summary_text = ""
+    return {
+        "rows": row_rate, "fm": fm_rate, "queries": query_rate, "labels": label_rate,
+        "hosts": host_pass, "host_rate": host_rate, "global_pass": global_pass,
+        "global_row": global_row, "global_query": global_query, "table": table,
+    }
 
-        for qlabel, query in query_items:
-            if budget["used"] >= MAX_QUERIES:
-                query_statuses[qlabel] = "budget_exhausted"
-                per_query_domains[qlabel] = ["(budget_exhausted)"]
-                break
 
-            data, status = brave_search(query, api_key, budget)
-            query_statuses[qlabel] = status
-            if status == "quota_exceeded":
-                # Serper auth/credit/rate error; stop making requests entirely.
-                per_query_domains[qlabel] = ["(quota_exceeded)"]
-                quota_dead = True
-                break
-            if data is None:
-                per_query_domains[qlabel] = [f"({status})"]
-                continue
+def _expected_row_yield(schedule: dict, r: pd.Series) -> float:
+    fm = _failure_mode(r)
+    pt = _q(r.get("Policy Type", ""))
+    return schedule["rows"].get((fm, pt), schedule["fm"].get(fm, schedule["global_row"]))
+
+
+def _variant_yield(schedule: dict | None, r: pd.Series) -> dict[str, float] | None:
+    if not schedule or not schedule["queries"]:
+        return None
+    fm = _failure_mode(r)
+    labels = set(schedule["labels"]) | {label for _fm, label in schedule["queries"]}
+    return {
+        label: schedule["queries"].get(
+            (fm, label), schedule["labels"].get(label, schedule["global_query"])
+        )
+        for label in labels
+    }
+
+
+def _host_pass_rate(schedule: dict | None, r: pd.Series, url: str) -> float:
+    if not schedule or not schedule["hosts"]:
+        return 0.0
+    hc = _host_class(url)
+    key = (_failure_mode(r), _q(r.get("Policy Type", "")), hc)
+    return schedule["hosts"].get(key, schedule["host_rate"].get(hc, schedule["global_pass"]))
+
+
+def schedule_rows(todo: pd.DataFrame, schedule: dict) -> pd.DataFrame:
+    """Reorder rows by expected dated rows per credit.
+
+    Credits are the row's uncached queries (after variant reordering); rows
+    whose queries are all cached cost nothing and go first. Ties keep the
+    incoming (search_priority_score) order.
+    """
+    if todo.empty or schedule["table"].empty:
+        return todo
+    cached = cached_query_hashes()
+    free, scores = [], []
+    for _, r in todo.iterrows():
+        items = _build_query_items(r, _variant_yield(schedule, r))
+        cost = sum(1 for _label, q in items if not _is_query_cached(q, cached))
+        p = _expected_row_yield(schedule, r)
+        free.append(cost == 0)
+        scores.append(p if cost == 0 else p / cost)
+    out = todo.copy()
+    out["_free"] = free
+    out["_expected_yield_per_credit"] = scores
+    out["_order"] = range(len(out))
+    out = out.sort_values(
+        ["_free", "_expected_yield_per_credit", "_order"], ascending=[False, False, True]
+    )
+    return out.drop(columns=["_free", "_order"])
+
 
-            res = _extract_results(data)
-            per_query_domains[qlabel] = [_host(x["url"]) for x in res[:5]]
-
-            if not summary_text:
-                summary_text = _extract_summary(data)
-
-            for x in res:
-                if x["url"] not in seen_urls:
-                    seen_urls.add(x["url"])
-                    x["from_query"] = qlabel
-                    merged.append(x)
-
-        ranked = _rank_candidates(merged)
-        top = ranked[:TOP_LINKS_TO_FETCH]
-        debug = _debug_payload(query_items, query_statuses, per_query_domains, merged)
-
-        if not top:
-            rows.append({
-                **base,
-                "source_url": "",
-                "date_source_stage": "stage4_brave_search",
-                "brave_summary": summary_text,
-                **debug,
-                "fetch_status": "no_brave_results",
-                "n_ord_hits": 0,
-                "body_mode": "no_body_no_results",
-                "snippets_json": "[]",
-                "extract_parse_error": "",
-                "strict_validation": "no_results",
-            })
+# --- sibling pages ------------------------------------------------------
+# Chapter pages and ordinance PDFs fetched for one row often cover the
+# neighbouring sections cited by other rows of the same city. The index maps
+# (city, county) -> section number -> cached page URLs, built from the same
+# snippet text the strict gate checks, so an index hit is a real candidate.
+# Only dotted/dashed section numbers are indexed ("8.80.020", "24-172"); a bare
+# integer would match almost any page.
+SIBLING_STAGE = "stage4_sibling_page"
+
+_SECTION_TOKEN_RE = re.compile(r"\d+(?:[.\-]\d+)+")
+
+
+def _jurisdiction_key(city, county) -> tuple[str, str]:
+    return _q(city).lower(), _q(county).lower()
+
+
+def _is_cached_page(url: str) -> bool:
+    """True when Stage 1's fetch cache holds `url`, so fetch_body is local."""
+    body_path, meta_path = stage1._cache_paths(url)
+    return body_path.exists() and meta_path.exists()
+
+
+def _known_pages(waiting: pd.DataFrame) -> pd.DataFrame:
+    """(city, county, url) of every page fetched so far: the Stage 1 sources,
+    the waiting rows' own sources and earlier search candidates."""
+    frames = []
+    for path in (STAGE1_EXTRACTED_PARQUET, OUTPUT_PARQUET):
+        if not path.exists():
+            continue
+        try:
+            frames.append(pd.read_parquet(path, columns=["city", "county", "source_url"]))
+        except Exception:
             continue
+    if "Source" in waiting.columns:
+        frames.append(pd.DataFrame({
+            "city": waiting.get("City", ""),
+            "county": waiting.get("County", ""),
+            "source_url": waiting["Source"],
+        }))
+    if not frames:
+        return pd.DataFrame(columns=["city", "county", "source_url"])
+    pages = pd.concat(frames, ignore_index=True).fillna("").astype(str)
+    pages = pages.apply(lambda col: col.str.strip())
+    pages = pages[pages["source_url"].map(stage1.is_valid_url)]
+    return pages.drop_duplicates(ignore_index=True)
+
+
+def build_sibling_index(todo: pd.DataFrame, waiting: pd.DataFrame, memo: dict) -> dict:
+    """{(city, county): {section_number: [url, ...]}} for the jurisdictions in
+    `todo`, over pages already in the fetch cache. Section numbers are kept in
+    the page_sections table, so only pages new to the cache (or re-fetched)
+    are parsed, through the run memo so a later search candidate with the same
+    URL is not parsed again.
+    """
+    wanted = {_jurisdiction_key(r.get("City", ""), r.get("County", "")) for _, r in todo.iterrows()}
+    pages = _known_pages(waiting)
+    keys = [_jurisdiction_key(c, k) for c, k in zip(pages["city"], pages["county"])]
+    pages = pages[pd.Series([k in wanted for k in keys], index=pages.index, dtype=bool)]
+    pages = pages[pages["source_url"].map(_is_cached_page)]
+
+    index: dict[tuple[str, str], dict[str, list[str]]] = {}
+    parsed = 0
+    for city, county, url in tqdm(
+        pages.itertuples(index=False), total=len(pages), desc="Sibling index", unit="page",
+    ):
+        tokens = _stored_page_sections(url)
+        if tokens is None:
+            tokens = _page_sections(url, memo)
+            _store_page_sections(url, tokens)
+            parsed += 1
+        per_city = index.setdefault(_jurisdiction_key(city, county), {})
+        for token in tokens:
+            urls = per_city.setdefault(token, [])
+            if url not in urls:
+                urls.append(url)
+    if parsed:
+        print(f"Sibling index:           parsed {parsed} new or re-fetched pages of {len(pages)}")
+    return index
+
+
+def _page_sections(url: str, memo: dict) -> list[str]:
+    fields = _memoized(memo, "fetch", url, lambda: _fetch_and_snippet(url, {}))
+    if not str(fields.get("body_mode", "")).startswith(("html_", "pdf_")):
+        return []
+    try:
+        text = " ".join(str(x) for x in json.loads(fields.get("snippets_json", "[]")))
+    except Exception:
+        return []
+    return sorted(set(_SECTION_TOKEN_RE.findall(text)))
+
+
+def _body_stamp(url: str) -> tuple[float, int] | None:
+    try:
+        st = stage1._cache_paths(url)[0].stat()
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size
+
+
+def _stored_page_sections(url: str) -> list[str] | None:
+    """Section tokens indexed for `url` on an earlier run, or None when the
+    page was never indexed or its cached body changed since."""
+    stamp = _body_stamp(url)
+    if stamp is None:
+        return None
+    conn = open_search_cache()
+    with _cache_lock:
+        row = conn.execute(
+            "SELECT body_mtime, body_size, tokens FROM page_sections WHERE url = ?", (url,)
+        ).fetchone()
+    if row is None or (row[0], row[1]) != stamp:
+        return None
+    try:
+        return list(json.loads(row[2]))
+    except Exception:
+        return None
+
+
+def _store_page_sections(url: str, tokens: list[str]) -> None:
+    stamp = _body_stamp(url)
+    if stamp is None:
+        return
+    conn = open_search_cache()
+    with _cache_lock:
+        conn.execute(
+            "INSERT OR REPLACE INTO page_sections VALUES (?, ?, ?, ?)",
+            (url, stamp[0], stamp[1], json.dumps(tokens)),
+        )
+        conn.commit()
 
-        # Fetch + snippet each of the top candidates, emitting one row per
-        # fetched candidate so Stage 2 can score them.
-        for rank_i, cand in enumerate(top):
-            cand_base = {**base, "source_url": cand["url"]}
-
-            # v3.5 strict gate. A candidate only flows to Stage 2 if it passes.
-            if _is_low_value_url(cand["url"]):
-                fetched = stage1._empty_row(
-                    cand_base, "skipped_low_value_url", "no_body_low_value_url"
-                )
-                strict_status = "skipped_low_value_url"
-            else:
-                fetched = _fetch_and_snippet(cand["url"], cand_base)
-                if str(fetched.get("body_mode", "")).startswith(("html_", "pdf_")):
-                    ok, strict_status = _candidate_passes_strict(
-                        fetched.get("snippets_json", "[]"),
-                        _q(r.get("Number", "")),
-                        _q(r.get("City", "")),
-                        _q(r.get("County", "")),
-                        cand["url"],
-                        cand.get("title", ""),
-                        cand.get("description", ""),
-                    )
-                    if not ok:
-                        # Downgrade: never let an unconfirmed page reach Stage 2.
-                        fetched["snippets_json"] = "[]"
-                        fetched["n_ord_hits"] = 0
-                        fetched["body_mode"] = f"no_body_{strict_status}"
-                else:
-                    strict_status = "not_fetched"
-
-            fetched["strict_validation"] = strict_status
-            fetched.update({
-                "date_source_stage": "stage4_brave_search",
-                "brave_rank": rank_i,
-                "brave_from_query": cand.get("from_query", ""),
-                "brave_result_title": cand.get("title", ""),
-                "brave_result_desc": cand.get("description", ""),
-                "brave_is_codepublisher": _is_code_publisher(cand["url"]),
-                "brave_summary": summary_text if rank_i == 0 else "",
-            })
-
-            # Store full debug payload only on rank 0 to keep parquet smaller,
-            # but keep compatibility/debug fields present on all rows.
-            if rank_i == 0:
-                fetched.update(debug)
-            else:
-                fetched.update({
-                    "brave_queries_json": "",
-                    "brave_query_statuses_json": "",
-                    "brave_query_domains_json": "",
-                    "brave_candidate_urls": "",
-                    "brave_sitebias_domains": "",
-                    "brave_plain_domains": "",
-                    "brave_sitebias_hit_codepub": None,
-                })
 
-            rows.append(fetched)
+def resolve_from_siblings(
+    todo: pd.DataFrame, index: dict, memo: dict,
+) -> tuple[list[dict], set]:
+    """Candidate rows for waiting rows a cached sibling page resolves.
+
+    A sibling must pass the same screen and strict gate as a search candidate,
+    and a row's own Source page (already tried by Stage 2) is never reused.
+    Returns (output_rows, resolved_row_keys); output rows use the search
+    schema with date_source_stage = SIBLING_STAGE.
+    """
+    rows: list[dict] = []
+    resolved: set = set()
+    for _, r in todo.iterrows():
+        per_city = index.get(_jurisdiction_key(r.get("City", ""), r.get("County", "")))
+        if not per_city:
+            continue
+        tokens = [t for t in _number_tokens(_q(r.get("Number", ""))) if _SECTION_TOKEN_RE.fullmatch(t)]
+        own = _q(r.get("Source", ""))
+        urls = dict.fromkeys(u for t in tokens for u in per_city.get(t, []) if u != own)
+        passing = []
+        for url in urls:
+            cand = {"url": url, "from_query": "sibling_page", "title": "", "description": ""}
+            fields, strict_status = _screen_candidate(cand, r, memo)
+            if strict_status == "pass":
+                passing.append((cand, fields))
+        if not passing:
+            continue
+        passing.sort(key=lambda x: -int(x[1].get("n_ord_hits") or 0))
+        passing = passing[:SIBLING_MAX_CANDIDATES]
+        base = _base_row(r)
+        debug = _debug_payload([], {}, {}, [cand for cand, _ in passing])
+        for rank_i, (cand, fields) in enumerate(passing):
+            rows.append(_candidate_row(
+                base, cand, fields, "pass", rank_i, True, "", debug, stage=SIBLING_STAGE,
+            ))
+        resolved.add(base["row_key"])
+    return rows, resolved
 
-    out_df = pd.DataFrame(rows)
 
+# --- streaming output ---------------------------------------------------
+def _normalize_output(out_df: pd.DataFrame) -> pd.DataFrame:
     # PyArrow requires each parquet column to have a consistent type.
     # Some debug fields are intentionally blank on non-rank-0 candidate rows;
     # normalize nullable booleans and JSON/debug text fields before writing.
     bool_cols = [
         "brave_is_codepublisher",
         "brave_sitebias_hit_codepub",
+        "search_complete",
     ]
     for col in bool_cols:
         if col in out_df.columns:
@@ -893,14 +1961,278 @@ def main() -> None:
     for col in text_cols:
         if col in out_df.columns:
             out_df[col] = out_df[col].fillna("").astype(str)
+    return out_df
+
 
+SEGMENTS_MANIFEST = "input.json"
+
+
+def _segment_paths() -> list[Path]:
+    if not SEARCH_SEGMENTS_DIR.exists():
+        return []
+    return sorted(SEARCH_SEGMENTS_DIR.glob("part-*.parquet"))
+
+
+def _write_segment(rows: list[dict]) -> None:
+    if not rows:
+        return
+    SEARCH_SEGMENTS_DIR.mkdir(parents=True, exist_ok=True)
+    n = len(_segment_paths())
+    seg = _normalize_output(pd.DataFrame(rows))
+    tmp = SEARCH_SEGMENTS_DIR / f"part-{n:05d}.parquet.tmp"
+    seg.to_parquet(tmp, engine="pyarrow", index=False)
+    tmp.replace(SEARCH_SEGMENTS_DIR / f"part-{n:05d}.parquet")
+
+
+def _clear_segments() -> None:
+    for path in _segment_paths():
+        path.unlink()
+
+
+def _input_fingerprint(df: pd.DataFrame) -> str:
+    """Content hash of the waiting rows the segments were searched from."""
+    hashed = pd.util.hash_pandas_object(df, index=False).values.tobytes()
+    return hashlib.sha1(hashed + ",".join(df.columns).encode("utf-8")).hexdigest()
+
+
+def _segments_fingerprint() -> str:
+    """Input fingerprint the current segments belong to ("" if untagged)."""
+    path = SEARCH_SEGMENTS_DIR / SEGMENTS_MANIFEST
+    try:
+        return str(json.loads(path.read_text(encoding="utf-8")).get("input_fingerprint", ""))
+    except Exception:
+        return ""
+
+
+def _start_segments(fingerprint: str) -> None:
+    """Drop existing segments and tag the directory for a new input."""
+    _clear_segments()
+    SEARCH_SEGMENTS_DIR.mkdir(parents=True, exist_ok=True)
+    (SEARCH_SEGMENTS_DIR / SEGMENTS_MANIFEST).write_text(
+        json.dumps({"input_fingerprint": fingerprint, "started_at": time.time()}), encoding="utf-8"
+    )
+
+
+def _completed_row_keys() -> set:
+    """row_keys whose latest segment rows are marked search_complete."""
+    latest: dict = {}
+    for path in _segment_paths():
+        seg = pd.read_parquet(path, columns=["row_key", "search_complete"])
+        done = seg.groupby("row_key")["search_complete"].all()
+        latest.update(done.fillna(False).astype(bool).to_dict())
+    return {k for k, v in latest.items() if v}
+
+
+def consolidate_segments() -> pd.DataFrame:
+    """Merge all segments into OUTPUT_PARQUET. A row_key searched again later
+    (after a quota stop) keeps only the rows from its latest segment."""
+    parts = []
+    for i, path in enumerate(_segment_paths()):
+        seg = pd.read_parquet(path)
+        seg["_segment"] = i
+        parts.append(seg)
+    if not parts:
+        return pd.DataFrame()
+    out_df = pd.concat(parts, ignore_index=True)
+    latest = out_df.groupby("row_key")["_segment"].transform("max")
+    out_df = out_df[out_df["_segment"].eq(latest)].drop(columns="_segment")
+    out_df = _normalize_output(out_df.reset_index(drop=True))
     out_df.to_parquet(OUTPUT_PARQUET, engine="pyarrow", index=False)
+    return out_df
+
+
+def select_search_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Waiting rows to search, in search order. Shared by the real run and
+    the PLAN_ONLY dry run so both price the same rows."""
+
+    # Select rows to search:
+    #   - only Exists?==Y rows are searched;
+    #   - Number must be non-empty;
+    #   - optionally require Number to include a digit to avoid wasting budget;
+    #   - never re-search rows Stage 2 already solved;
+    #   - optional failure-mode filter.
+    sel = df.get("Exists? (Y/N)", "").astype(str).str.strip().str.upper().eq("Y")
+    sel &= df.get("Number", "").astype(str).str.strip().ne("")
+    if REQUIRE_DIGIT_IN_NUMBER:
+        sel &= df.get("Number", "").astype(str).str.contains(r"\d", regex=True, na=False)
+    if SKIP_NOT_IN_CODE_POLICIES:
+        # Madeleine: these policy types do not live in municipal code, so their
+        # adoption dates are not in an ordinance and searching wastes credits.
+        sel &= ~df.get("Policy Type", "").astype(str).str.strip().isin(NOT_IN_CODE_POLICIES)
+    sel &= ~df.get("date_parse_status", "").astype(str).str.strip().isin(SKIP_STATUSES)
+    if PROCESS_ONLY_FAILURE_MODES:
+        sel &= df.get("failure_mode", "").astype(str).str.strip().isin(PROCESS_ONLY_FAILURE_MODES)
+
+    todo = df[sel].copy()
+    if "search_priority_score" in todo.columns:
+        todo["_score"] = pd.to_numeric(todo["search_priority_score"], errors="coerce").fillna(0.0)
+        todo = todo.sort_values("_score", ascending=False)
+    return todo
+
+
+# --- main ---------------------------------------------------------------
+def main() -> None:
+    if LEDGER_REPORT_ONLY:
+        print(f"*** LEDGER_REPORT_ONLY = True ({search_cache_db()}) ***")
+        open_search_cache()
+        print_ledger()
+        return
+
+    if not INPUT_WAITING_CSV.exists():
+        sys.exit(f"Input not found: {INPUT_WAITING_CSV}. Run export_waiting_for_google_search.py first.")
+
+    BRAVE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    df = pd.read_csv(INPUT_WAITING_CSV, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    todo = select_search_rows(df)
+
+    print(f"Waiting rows:            {len(df)}")
+    print(f"Eligible to search:      {len(todo)}")
+
+    fingerprint = _input_fingerprint(df)
+    resumable = RESUME_SEARCH and _segments_fingerprint() == fingerprint
+    if resumable:
+        done = _completed_row_keys()
+        if done:
+            keys = pd.Series([_row_key(r) for _, r in todo.iterrows()], index=todo.index)
+            todo = todo[~keys.isin(done)]
+            print(f"Resuming: {len(done)} rows already searched; {len(todo)} remaining.")
+    elif not PLAN_ONLY:
+        stale = _segment_paths()
+        if RESUME_SEARCH and stale:
+            print(f"Discarding {len(stale)} segment(s) searched from a different input.")
+        _start_segments(fingerprint)
+
+    open_search_cache()
+    schedule = None
+    if SCHEDULE_BY_YIELD:
+        schedule = learn_search_yield(df)
+        todo = schedule_rows(todo, schedule)
+        if not schedule["table"].empty:
+            schedule["table"].to_csv(YIELD_REPORT_CSV, index=False, encoding="utf-8-sig")
+        print(
+            f"Yield scheduling:        on  (history: {int(schedule['table']['candidates'].sum()) if not schedule['table'].empty else 0} candidates; "
+            f"prior row yield={schedule['global_row']:.3f})"
+        )
+
+    if PLAN_ONLY:
+        credit_budget = MAX_QUERIES if PLAN_BUDGET is None else int(PLAN_BUDGET)
+        print(f"*** PLAN_ONLY = True (no network; budget={credit_budget}) ***")
+        plan = plan_search_run(todo, credit_budget, schedule)
+        _print_plan(plan, credit_budget)
+        plan.to_csv(PLAN_CSV, index=False, encoding="utf-8-sig")
+        print(f"Plan saved to:           {PLAN_CSV}")
+        if SIBLING_REUSE:
+            print("Sibling reuse is not applied in the plan; rows it resolves are priced as searches.")
+        return
+
+    api_key = _load_env_credentials()
+    run_id = time.strftime("%Y%m%d-%H%M%S")
+    open_search_cache(run_id)
+
+    # Built after the PLAN_ONLY return: indexing parses pages not yet in page_sections.
+    memo = new_run_memo()
+    sibling_rows: list[dict] = []
+    if SIBLING_REUSE and len(todo):
+        index = build_sibling_index(todo, df, memo)
+        sibling_rows, resolved = resolve_from_siblings(todo, index, memo)
+        if resolved:
+            keys = pd.Series([_row_key(r) for _, r in todo.iterrows()], index=todo.index)
+            todo = todo[~keys.isin(resolved)]
+        print(
+            f"Sibling pages:           {len(resolved)} rows resolved from "
+            f"{sum(len(v) for v in index.values())} indexed section numbers; {len(todo)} left to search"
+        )
+        _write_segment(sibling_rows)
+
+    print(
+        f"MAX_QUERIES (cost cap):  {MAX_QUERIES}  "
+        f"(<= {MAX_QUERY_VARIANTS_PER_ROW} queries/row -> ~{MAX_QUERIES // max(1, MAX_QUERY_VARIANTS_PER_ROW)} rows this run)"
+    )
+    print(f"Require digit in Number: {REQUIRE_DIGIT_IN_NUMBER}")
+
+    budget = new_budget()
+    memo["schedule"] = schedule
+    plans, plan_stats = _reserve_query_budget(todo, schedule)
+    print(f"Rows planned this run:   {len(plans)}  (workers={SEARCH_WORKERS})")
+    print(
+        f"Query slots planned:     {plan_stats.get('query_slots', 0)}  "
+        f"(cached={plan_stats.get('cached', 0)}, billable={plan_stats.get('billable', 0)}, "
+        f"shared across rows={plan_stats.get('credits_saved', 0)})"
+    )
+
+    # Results are consumed strictly in submission order, so output rows come
+    # out in the same order as a serial run regardless of which worker
+    # finishes first. Completed rows are flushed to segments as they arrive.
+    pending: list[dict] = []
+    n_pending = 0
+    n_searched = 0
+    quota_dead = False
+    try:
+        with ThreadPoolExecutor(max_workers=SEARCH_WORKERS) as pool:
+            plan_iter = iter(plans)
+            in_flight: deque = deque()
+
+            def submit_next() -> None:
+                plan = next(plan_iter, None)
+                if plan is not None:
+                    in_flight.append(pool.submit(_search_row, *plan, api_key, budget, memo))
+
+            for _ in range(MAX_ROWS_IN_FLIGHT):
+                submit_next()
+
+            with tqdm(total=len(plans), desc="Serper search", unit="row") as bar:
+                while in_flight:
+                    row_out, quota_hit = in_flight.popleft().result()
+                    pending.extend(row_out)
+                    n_pending += 1
+                    n_searched += 1
+                    bar.update(1)
+                    if quota_hit:
+                        # Keep everything up to and including the first row (in
+                        # order) that saw the quota error; later rows are dropped
+                        # exactly as the serial loop would never have reached them.
+                        # That row is marked incomplete and searched again on resume.
+                        quota_dead = True
+                        for fut in in_flight:
+                            fut.cancel()
+                        break
+                    if n_pending >= SEGMENT_ROWS:
+                        _write_segment(pending)
+                        pending, n_pending = [], 0
+                    submit_next()
+    finally:
+        # Also runs on Ctrl+C or a crash, so finished rows are not lost.
+        _write_segment(pending)
+
+    out_df = consolidate_segments()
 
     if quota_dead:
         print("\n*** STOPPED EARLY: Serper returned an auth/credit/rate error (HTTP 401/402/403/429).")
         print("    Check the SERPER_API_KEY and remaining credits, then re-run.")
     print(f"\nSerper requests attempted:  {budget['used']} / {MAX_QUERIES}")
-    print(f"Candidate rows written:  {len(out_df)}")
+    st = memo["stats"]
+    print(
+        f"Credits saved by query dedup: {plan_stats.get('credits_saved', 0)}  "
+        f"(unique queries run={st['query_computed']}, reused={st['query_reused']})"
+    )
+    print(
+        f"Candidate fetches:       {st['fetch_computed']} unique URLs "
+        f"(reused {st['fetch_reused']}); strict checks reused {st['screen_reused']}"
+    )
+    if PRESCREEN_CANDIDATES:
+        rejected = {k[len("prescreen_"):]: v for k, v in st.items() if k.startswith("prescreen_")}
+        print(
+            f"Pre-fetch screen:        {sum(rejected.values())} rejected before a full fetch "
+            f"{rejected or ''}; {st['probe_computed']} pages probed"
+        )
+    print(f"Run id:                  {run_id}  (ledger: {search_cache_db()})")
+    print_ledger(run_id)
+    print(f"Rows searched this run:  {n_searched}")
+    if sibling_rows:
+        print(f"Rows from sibling pages: {len({rec['row_key'] for rec in sibling_rows})}  (no query spent)")
+    print(f"Candidate rows written:  {len(out_df)}  (all segments)")
     print(f"Saved to:                {OUTPUT_PARQUET}")
 
     # Verification signals.
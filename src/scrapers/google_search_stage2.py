@@ -4,9 +4,13 @@
 Prepares the Stage-4 (google_search.py) output for the Stage-2 LLM enricher:
   - keeps only candidates that passed the strict acceptance gate
     (strict_validation == "pass"), so unconfirmed pages never reach the LLM;
-  - collapses to ONE best candidate per row_key (highest n_ord_hits), because
-    the enricher processes one row per row_key and would otherwise see a policy
-    row multiple times.
+  - with KEEP_ALL_CANDIDATES = True (default), keeps every passing candidate,
+    ranked per row_key by n_ord_hits in a candidate_rank column. The enricher
+    then scores all of them and keeps the most reliable date, so a row whose
+    top page has no usable date is not lost (and re-searched) when another
+    candidate has one;
+  - with KEEP_ALL_CANDIDATES = False, collapses to ONE best candidate per
+    row_key (highest n_ord_hits), the older behaviour.
 
 Retrieval/date logic is not duplicated here. The resulting parquet is consumed
 by enrich_policymap_with_gemma.py with GOOGLE_SEARCH_TESTING_MODE = True.
@@ -24,6 +28,8 @@ OUT_DIR = PROJECT_ROOT / "result" / "policy_map"
 INPUT_PARQUET = OUT_DIR / f"{Path(CSV_FILENAME).stem}.brave_searched.parquet"
 OUTPUT_PARQUET = OUT_DIR / f"{Path(CSV_FILENAME).stem}.brave_forstage2.parquet"
 
+KEEP_ALL_CANDIDATES = True
+
 
 def main() -> None:
     if not INPUT_PARQUET.exists():
@@ -36,15 +42,25 @@ def main() -> None:
         sys.exit("No candidates with strict_validation == 'pass'. Nothing to enrich.")
 
     passed["_hits"] = pd.to_numeric(passed.get("n_ord_hits", 0), errors="coerce").fillna(0)
-    passed = passed.sort_values("_hits", ascending=False)
-    best = passed.drop_duplicates(subset="row_key", keep="first").drop(columns="_hits")
+    passed = passed.sort_values("_hits", ascending=False, kind="stable")
+    if KEEP_ALL_CANDIDATES:
+        # The same page can pass for a row via two queries; score it once.
+        out = passed.drop_duplicates(subset=["row_key", "source_url"], keep="first")
+        out = out.sort_values(["row_key", "_hits"], ascending=[True, False], kind="stable")
+        out["candidate_rank"] = out.groupby("row_key").cumcount()
+        out = out.drop(columns="_hits")
+    else:
+        out = passed.drop_duplicates(subset="row_key", keep="first").drop(columns="_hits")
 
     OUT_DIR.mkdir(parents=True, exist_ok=True)
-    best.to_parquet(OUTPUT_PARQUET, engine="pyarrow", index=False)
+    out.to_parquet(OUTPUT_PARQUET, engine="pyarrow", index=False)
 
     print(f"Stage-4 rows read:        {len(df)}")
     print(f"Pass candidates:          {len(passed)}")
-    print(f"Best-per-row_key written: {len(best)}")
+    if KEEP_ALL_CANDIDATES:
+        print(f"Candidates written:       {len(out)}  (for {out['row_key'].nunique()} rows)")
+    else:
+        print(f"Best-per-row_key written: {len(out)}")
     print(f"Saved to:                 {OUTPUT_PARQUET}")
 
 
@@ -13,8 +13,13 @@ from pathlib import Path
 from urllib.parse import urlparse
 
 import pandas as pd
+import pyarrow.parquet as pq
 from tqdm import tqdm
 
+from utils import lazy_import
+
+stage2 = lazy_import("enrich_policymap_with_gemma")
+
 
 CSV_FILENAME = "Policy-Map-Ordinance-Table-May-2026.csv"
 
@@ -49,9 +54,15 @@ ENRICH_COLS = [
     "date_parse_reason",
     "llm_adopted_raw",
     "llm_effective_raw",
-    "llm_raw_output",
     "llm_input_chars",
     "llm_selected_snippets",
+]
+
+# Raw LLM text and context previews live in Stage 2's diagnostics sidecar, not
+# in enriched.parquet. Set True to join them back into the CSV for review.
+INCLUDE_LLM_DIAGNOSTICS = False
+DIAGNOSTIC_COLS = [
+    "llm_raw_output",
     "llm_context_preview",
 ]
 
@@ -99,22 +110,31 @@ def main() -> None:
     OUT_DIR.mkdir(parents=True, exist_ok=True)
 
     orig = pd.read_csv(INPUT_CSV, encoding="utf-8-sig", dtype=str, keep_default_na=False)
-    enriched = pd.read_parquet(enriched_parquet)
 
-    if "row_key" not in enriched.columns:
+    # Read only the columns written to the CSV; the enriched table may still
+    # carry other Stage-1 columns.
+    available = set(pq.read_schema(enriched_parquet).names)
+    if "row_key" not in available:
         sys.exit(f"`row_key` missing from {enriched_parquet}")
+    merge_cols = ENRICH_COLS + (DIAGNOSTIC_COLS if INCLUDE_LLM_DIAGNOSTICS else [])
+    enriched = pd.read_parquet(
+        enriched_parquet,
+        columns=["row_key"] + [c for c in merge_cols if c in available],
+    )
+    if INCLUDE_LLM_DIAGNOSTICS:
+        enriched = stage2.join_diagnostics(enriched, enriched_parquet)
 
     enriched["row_key"] = enriched["row_key"].astype(int)
     lookup = enriched.set_index("row_key")
 
-    for col in ENRICH_COLS:
+    for col in merge_cols:
         orig[col] = ""
 
     n_filled = 0
     for ridx in tqdm(range(len(orig)), desc="Merging", unit="row"):
         if ridx in lookup.index:
             src = lookup.loc[ridx]
-            for col in ENRICH_COLS:
+            for col in merge_cols:
                 if col in lookup.columns:
                     v = src[col]
                     orig.at[ridx, col] = "" if pd.isna(v) else str(v)
@@ -0,0 +1,285 @@
+"""
+[PolicyMap tooling] Local Serper-compatible stand-in server.
+
+Speaks the same contract google_search.py uses against google.serper.dev:
+
+  POST /search   headers: X-API-KEY, Content-Type: application/json
+                 body:    {"q": ..., "gl": ..., "num": ...}
+                 200 ->   {"searchParameters": {...}, "organic": [...], "credits": 1}
+
+so the search line can be run end-to-end, load-tested and benchmarked without
+a paid key or network. Responses come from:
+
+  - recorded:  the search cache DB google_search.py writes for the real
+               Serper host (_brave_cache/search_cache.sqlite, read-only),
+               looked up by the same sha1("serper:" + query) key. Pointed at
+               this server, google_search.py keeps its own cache DB and ledger
+               (search_cache.standin-<host>-<port>.sqlite), so queries it has
+               not seen yet reach this server and nothing is written back to
+               the real cache;
+  - synthetic: deterministic fixtures built from the query text. Their links
+               point back at this server (GET /page/<id>), which serves a small
+               ordinance-like HTML page, so fetching and snippeting also run
+               offline. google_search.py trusts this host in the strict gate
+               while STANDIN_TRUST_PAGES is on, so synthetic candidates can
+               pass it.
+
+Fault injection: fixed + random latency, random HTTP 429, an HTTP 429 when
+requests exceed MAX_QPS, and HTTP 403 after QUOTA_CREDITS successful requests
+(credit exhaustion). GET /stats returns request counters as JSON.
+
+Usage:
+  python src/scrapers/serper_standin.py
+  # then in google_search.py:
+  #   SERPER_HOST = "127.0.0.1"; SERPER_PORT = 8765; SERPER_USE_TLS = False
+"""
+
+import hashlib
+import json
+import random
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+# --- config -------------------------------------------------------------
+CSV_FILENAME = "Policy-Map-Ordinance-Table-May-2026.csv"
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+OUT_DIR = PROJECT_ROOT / "result" / "policy_map"
+
+STANDIN_HOST = "127.0.0.1"
+STANDIN_PORT = 8765
+
+# "recorded": only recorded responses (unknown queries get an empty result).
+# "synthetic": always synthetic fixtures.
+# "auto": recorded when available, else synthetic.
+RESPONSE_MODE = "auto"
+RECORDED_DB = OUT_DIR / "_brave_cache" / "search_cache.sqlite"
+
+# Empty = accept any key. Otherwise requests with another key get HTTP 403.
+REQUIRE_API_KEY = ""
+
+LATENCY_MS = 150                # fixed latency added to every /search request
+LATENCY_JITTER_MS = 100         # plus uniform random 0..jitter
+RATE_429 = 0.0                  # probability of a random HTTP 429
+MAX_QPS = None                  # HTTP 429 when more requests arrive in 1s; None = off
+QUOTA_CREDITS = None            # HTTP 403 after this many 200 responses; None = unlimited
+SYNTHETIC_RESULTS = 5           # organic results per synthetic response
+RANDOM_SEED = 0
+
+
+# --- state --------------------------------------------------------------
+_lock = threading.Lock()
+_stats: Counter = Counter()
+_recent: deque = deque()
+_rng = random.Random(RANDOM_SEED)
+_pages: dict[str, dict] = {}
+
+
+def _query_hash(query: str) -> str:
+    # Same key as google_search._query_hash.
+    return hashlib.sha1(("serper:" + query).encode("utf-8")).hexdigest()
+
+
+def _recorded_response(query: str) -> dict | None:
+    if not RECORDED_DB.exists():
+        return None
+    conn = sqlite3.connect(f"file:{RECORDED_DB}?mode=ro", uri=True)
+    try:
+        row = conn.execute(
+            "SELECT response FROM responses WHERE query_hash = ?", (_query_hash(query),)
+        ).fetchone()
+    except sqlite3.Error:
+        row = None
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    try:
+        return json.loads(row[0])
+    except Exception:
+        return None
+
+
+def _quoted_terms(query: str) -> list[str]:
+    parts = query.split('"')
+    return [p.strip() for p in parts[1::2] if p.strip()]
+
+
+def _synthetic_response(query: str, num: int, base_url: str) -> dict:
+    """Deterministic fixture for `query`: same query, same results."""
+    terms = _quoted_terms(query)
+    place = terms[0] if terms else "Example City"
+    number = terms[1] if len(terms) > 1 else "1.01.010"
+    h = _query_hash(query)
+    organic = []
+    for i in range(min(num, SYNTHETIC_RESULTS)):
+        page_id = f"{h[:12]}-{i}"
+        with _lock:
+            _pages[page_id] = {"place": place, "number": number, "rank": i}
+        organic.append({
+            "title": f"{place} Municipal Code {number} (result {i + 1})",
+            "link": f"{base_url}/page/{page_id}",
+            "snippet": f"Chapter {number}. Ordinance history for {place}.",
+            "position": i + 1,
+        })
+    return {"organic": organic}
+
+
+def _synthetic_page(page_id: str) -> str:
+    with _lock:
+        info = _pages.get(page_id)
+    if info is None:
+        return ""
+    place, number = info["place"], info["number"]
+    year = 1990 + (int(hashlib.sha1(page_id.encode()).hexdigest(), 16) % 30)
+    body = (
+        f"<h1>{place} Municipal Code</h1>"
+        f"<h2>Section {number}</h2>"
+        f"<p>This section applies within the City of {place}. "
+        f"(Ord. No. {year}-{info['rank'] + 10}, adopted March 3, {year}; "
+        f"effective April 2, {year}.)</p>"
+    ) * 6
+    return f"<html><head><title>{place} {number}</title></head><body>{body}</body></html>"
+
+
+def _over_qps(now: float) -> bool:
+    if MAX_QPS is None:
+        return False
+    with _lock:
+        while _recent and now - _recent[0] > 1.0:
+            _recent.popleft()
+        if len(_recent) >= MAX_QPS:
+            return True
+        _recent.append(now)
+    return False
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args) -> None:  # keep the console quiet
+        pass
+
+    def _send(self, status: int, payload: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_json(self, status: int, obj: dict) -> None:
+        with _lock:
+            _stats[f"http_{status}"] += 1
+        self._send(status, json.dumps(obj).encode("utf-8"), "application/json")
+
+    def do_GET(self) -> None:
+        if self.path == "/stats":
+            with _lock:
+                snapshot = dict(_stats)
+            self._send(200, json.dumps(snapshot).encode("utf-8"), "application/json")
+            return
+        if self.path.startswith("/page/"):
+            html = _synthetic_page(self.path[len("/page/"):])
+            if html:
+                self._send(200, html.encode("utf-8"), "text/html; charset=utf-8")
+            else:
+                self._send(404, b"not found", "text/plain")
+            return
+        self._send(404, b"not found", "text/plain")
+
+    def do_POST(self) -> None:
+        if self.path.split("?")[0] != "/search":
+            self._send(404, b"not found", "text/plain")
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        with _lock:
+            _stats["requests"] += 1
+            delay = (LATENCY_MS + _rng.uniform(0, LATENCY_JITTER_MS)) / 1000.0
+            inject_429 = _rng.random() < RATE_429
+
+        if REQUIRE_API_KEY and self.headers.get("X-API-KEY", "") != REQUIRE_API_KEY:
+            self._send_json(403, {"message": "Unauthorized.", "statusCode": 403})
+            return
+        try:
+            body = json.loads(raw or b"{}")
+            query = str(body.get("q", ""))
+            num = int(body.get("num", 10))
+        except Exception:
+            self._send_json(400, {"message": "Bad request.", "statusCode": 400})
+            return
+
+        time.sleep(delay)
+        if inject_429 or _over_qps(time.monotonic()):
+            self._send_json(429, {"message": "Too many requests.", "statusCode": 429})
+            return
+        with _lock:
+            if QUOTA_CREDITS is not None and _stats["http_200"] >= QUOTA_CREDITS:
+                exhausted = True
+            else:
+                exhausted = False
+        if exhausted:
+            self._send_json(403, {"message": "Not enough credits.", "statusCode": 403})
+            return
+
+        data = None
+        if RESPONSE_MODE in ("recorded", "auto"):
+            data = _recorded_response(query)
+            if data is not None:
+                with _lock:
+                    _stats["recorded"] += 1
+        if data is None and RESPONSE_MODE in ("synthetic", "auto"):
+            host = self.headers.get("Host") or f"{STANDIN_HOST}:{STANDIN_PORT}"
+            data = _synthetic_response(query, num, f"http://{host}")
+            with _lock:
+                _stats["synthetic"] += 1
+        if data is None:
+            data = {"organic": []}
+
+        data = {
+            **data,
+            "searchParameters": {"q": query, "gl": body.get("gl", ""), "num": num, "type": "search"},
+            "credits": 1,
+        }
+        self._send_json(200, data)
+
+
+def serve(host: str = STANDIN_HOST, port: int = STANDIN_PORT) -> ThreadingHTTPServer:
+    """Start the stand-in on a background thread and return the server.
+
+    Port 0 picks a free port (see server.server_address). Call
+    server.shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    server = ThreadingHTTPServer((STANDIN_HOST, STANDIN_PORT), _Handler)
+    server.daemon_threads = True
+    print(f"Serper stand-in on http://{STANDIN_HOST}:{STANDIN_PORT}/search")
+    print(f"  mode={RESPONSE_MODE}  recorded_db={RECORDED_DB if RECORDED_DB.exists() else '(none)'}")
+    print(
+        f"  latency={LATENCY_MS}+{LATENCY_JITTER_MS}ms  rate_429={RATE_429}  "
+        f"max_qps={MAX_QPS}  quota_credits={QUOTA_CREDITS}"
+    )
+    print("  GET /stats for counters; Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        with _lock:
+            print(f"\nServed: {dict(_stats)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Shared helpers for the PolicyMap pipeline scripts under src/scrapers/.
+
+The pipeline scripts are run directly (python src/scrapers/<stage>.py), so this
+module is imported as a sibling: `from utils import lazy_import`.
+"""
+
+import importlib
+import importlib.util
+import sys
+import threading
+import types
+
+
+class _LazyModule(types.ModuleType):
+    """Stand-in for a module that is imported on first attribute access.
+
+    The real import goes through importlib.import_module, whose per-module
+    import lock makes first use safe from several threads at once (the search
+    line touches Stage 1 and bs4 from worker threads). importlib's LazyLoader
+    is not thread-safe before Python 3.12.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        object.__setattr__(self, "_lazy_lock", threading.Lock())
+        object.__setattr__(self, "_lazy_module", None)
+
+    def _load(self) -> types.ModuleType:
+        module = object.__getattribute__(self, "_lazy_module")
+        if module is None:
+            with object.__getattribute__(self, "_lazy_lock"):
+                module = object.__getattribute__(self, "_lazy_module")
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    object.__setattr__(self, "_lazy_module", module)
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr: str, value) -> None:
+        setattr(self._load(), attr, value)
+
+
+def lazy_import(name: str):
+    """Return module `name`, deferring its execution until first attribute access.
+
+    Used for heavy or optional imports (requests, bs4, the Stage 1 module) that
+    a run may never touch, e.g. a resume where every row is already cached or
+    skipped. Call sites keep the normal `module.attr` form; the import cost is
+    paid the first time an attribute is read. Already-imported modules are
+    returned as-is.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    if importlib.util.find_spec(name) is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    return _LazyModule(name)
@@ -0,0 +1,366 @@
+"""
+SECTION INDEX
+
+Offline per-municipality index of municode sections. The table of contents is
+crawled once with scrape_codes() (python -m src.section_index, never while
+answering), and every leaf page's title, url and text is stored in sqlite.
+Search terms are then served locally (BM25 over title + text, with an
+embedding match on section names when no word matches) instead of driving the
+municode search box through selenium for every term, so the chatbot only opens
+pages that are actually needed.
+
+Authors: Chenghao Li
+Org: Urban Displacement Project: UC Berkeley / University of Toronto
+"""
+
+import scrapers.scraper as scraper
+import config.general as general_args
+import embedding_cache
+import chat_log
+
+import math
+import os
+import re
+import sqlite3
+import time
+import numpy as np
+from collections import Counter
+from dataclasses import dataclass
+
+from google import genai
+
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+TITLE_WEIGHT = 3 # title tokens count this many times in a section's document
+SNIPPET_WORDS = 40 # words in the related_text window returned with a result
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sections (
+    muni_url    TEXT NOT NULL,
+    url         TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    chapter     TEXT NOT NULL,
+    depth       INTEGER NOT NULL,
+    title       TEXT,
+    text        TEXT,
+    PRIMARY KEY (muni_url, url)
+);
+CREATE TABLE IF NOT EXISTS munis (
+    muni_url    TEXT PRIMARY KEY,
+    complete    INTEGER NOT NULL,
+    crawled_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS failures (
+    muni_url    TEXT NOT NULL,
+    url         TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    chapter     TEXT NOT NULL,
+    depth       INTEGER NOT NULL,
+    attempts    INTEGER NOT NULL,
+    error       TEXT NOT NULL,
+    PRIMARY KEY (muni_url, url)
+);
+"""
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercase word tokens used for BM25
+
+    :param text: input text
+    :return: list of tokens
+    """
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25:
+    """
+    Okapi BM25 scorer over tokenized documents
+    """
+    def __init__(self, documents: list[list[str]]):
+        self._term_freqs: list[Counter] = [Counter(tokens) for tokens in documents]
+        self._lengths: list[int] = [len(tokens) for tokens in documents]
+        doc_freq: Counter = Counter()
+        for freqs in self._term_freqs:
+            doc_freq.update(freqs.keys())
+        n = len(documents)
+        self._avg_length: float = sum(self._lengths) / n if n else 0.0
+        self._idf: dict[str, float] = {
+            token: math.log(1 + (n - df + 0.5) / (df + 0.5)) for token, df in doc_freq.items()
+        }
+
+    def scores(self, query: list[str]) -> list[float]:
+        """
+        Score every document against query tokens
+
+        :param query: query tokens (repeats are ignored)
+        :return: one score per document, in document order
+        """
+        query_tokens = set(query)
+        result = []
+        for freqs, length in zip(self._term_freqs, self._lengths):
+            score = 0.0
+            for token in query_tokens:
+                tf = freqs.get(token, 0)
+                if not tf:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / self._avg_length)
+                score += self._idf[token] * tf * (BM25_K1 + 1) / (tf + norm)
+            result.append(score)
+        return result
+
+
+@dataclass
+class Section:
+    url: str
+    name: str
+    chapter: str
+    title: str
+    text: str
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _muni_state(conn: sqlite3.Connection, muni_url: str) -> tuple[bool, float]|None:
+    row = conn.execute("SELECT complete, crawled_at FROM munis WHERE muni_url = ?", (muni_url,)).fetchone()
+    if row is None:
+        return None
+    return bool(row[0]), float(row[1])
+
+
+def _is_stale(crawled_at: float) -> bool:
+    max_age = general_args.SECTION_INDEX_MAX_AGE_DAYS
+    return max_age is not None and time.time() - crawled_at > max_age * 86400
+
+
+def crawl(muni_scraper: scraper.Scraper, muni_url: str, path: str|None=None) -> bool:
+    """
+    Crawl a municipality's table of contents and store every leaf section
+
+    Leaf pages already stored are skipped, so an interrupted crawl resumes where
+    it stopped. Pages that fail to load are recorded; once the table of contents
+    has been walked, later crawls only retry those pages, each at most
+    SECTION_INDEX_MAX_RETRIES times. A stale index is crawled again from scratch.
+
+    :param muni_scraper: webscraper crawler
+    :param muni_url: municipality code of ordinances url
+    :param path: sqlite path (defaults to SECTION_INDEX_PATH)
+    :return: True if every page was crawled
+    """
+    conn = _connect(path or general_args.SECTION_INDEX_PATH)
+    state = _muni_state(conn, muni_url)
+    if state and _is_stale(state[1]):
+        for table in ("sections", "munis", "failures"):
+            conn.execute(f"DELETE FROM {table} WHERE muni_url = ?", (muni_url,))
+        conn.commit()
+        state = None
+    started = state[1] if state else time.time()
+    stored = {row[0] for row in conn.execute("SELECT url FROM sections WHERE muni_url = ? AND text IS NOT NULL", (muni_url,))}
+
+    def visit(name: str, url: str, chapter: str, depth: int) -> None:
+        if url in stored:
+            return
+        try:
+            muni_scraper.go(url)
+            if depth < general_args.SECTION_INDEX_MAX_DEPTH and muni_scraper.contains_child():
+                children = muni_scraper.scrape_codes(depth=depth + 1)
+                conn.execute(
+                    "INSERT OR REPLACE INTO sections (muni_url, url, name, chapter, depth, title, text) VALUES (?, ?, ?, ?, ?, NULL, NULL)",
+                    (muni_url, url, name, chapter, depth),
+                )
+                conn.execute("DELETE FROM failures WHERE muni_url = ? AND url = ?", (muni_url, url))
+                conn.commit()
+                for child_name, child_url in children.items():
+                    visit(child_name, child_url, name, depth + 1)
+                return
+            title = muni_scraper.scrape_title()
+            text = muni_scraper.scrape_text()
+        except Exception as e:
+            conn.execute(
+                "INSERT INTO failures (muni_url, url, name, chapter, depth, attempts, error) VALUES (?, ?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT (muni_url, url) DO UPDATE SET attempts = attempts + 1, error = excluded.error",
+                (muni_url, url, name, chapter, depth, str(e)),
+            )
+            conn.commit()
+            chat_log.write(f"SECTION INDEX: failed to crawl [{name}]({url}) ({e})\n\n")
+            return
+        conn.execute(
+            "INSERT OR REPLACE INTO sections (muni_url, url, name, chapter, depth, title, text) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (muni_url, url, name, chapter, depth, title, text),
+        )
+        conn.execute("DELETE FROM failures WHERE muni_url = ? AND url = ?", (muni_url, url))
+        conn.commit()
+        stored.add(url)
+        chat_log.write(f"SECTION INDEX: stored [{name}]({url})\n\n")
+
+    if state is None: # first (or interrupted) walk of the table of contents
+        muni_scraper.go(muni_url)
+        for title_name, title_url in muni_scraper.scrape_codes(depth=0).items():
+            visit(title_name, title_url, "", 0)
+    else:
+        retry = conn.execute(
+            "SELECT name, url, chapter, depth FROM failures WHERE muni_url = ? AND attempts < ?",
+            (muni_url, general_args.SECTION_INDEX_MAX_RETRIES),
+        ).fetchall()
+        for name, url, chapter, depth in retry:
+            visit(name, url, chapter, depth)
+
+    failed = conn.execute("SELECT COUNT(*) FROM failures WHERE muni_url = ?", (muni_url,)).fetchone()[0]
+    complete = failed == 0
+    conn.execute(
+        "INSERT OR REPLACE INTO munis (muni_url, complete, crawled_at) VALUES (?, ?, ?)",
+        (muni_url, int(complete), started),
+    )
+    conn.commit()
+    conn.close()
+    chat_log.flush()
+    return complete
+
+
+class SectionIndex:
+    """
+    In-memory BM25 index over the stored sections of one municipality
+    """
+    def __init__(self, muni_url: str, sections: list[Section]):
+        self.muni_url: str = muni_url
+        self.sections: list[Section] = sections
+        self._by_url: dict[str, Section] = {section.url: section for section in sections}
+        self._bm25: BM25 = BM25([tokenize(section.name) * TITLE_WEIGHT + tokenize(section.text) for section in sections])
+
+    @classmethod
+    def load(cls, muni_url: str, path: str|None=None):
+        """
+        Load a municipality's sections from the sqlite store
+
+        :param muni_url: municipality code of ordinances url
+        :param path: sqlite path (defaults to SECTION_INDEX_PATH)
+        :return: SectionIndex
+        """
+        conn = _connect(path or general_args.SECTION_INDEX_PATH)
+        rows = conn.execute(
+            "SELECT url, name, chapter, title, text FROM sections WHERE muni_url = ? AND text IS NOT NULL",
+            (muni_url,),
+        ).fetchall()
+        conn.close()
+        return cls(muni_url, [Section(*row) for row in rows])
+
+    def page(self, url: str) -> Section|None:
+        """
+        Stored section for a url (None if the url is not indexed)
+        """
+        return self._by_url.get(url)
+
+    def bm25(self, term: str) -> list[tuple[float, Section]]:
+        """
+        Score every section against a search term
+
+        :param term: search term
+        :return: (score, section) pairs with a positive score, best first
+        """
+        scored = [
+            (score, section) for score, section in zip(self._bm25.scores(tokenize(term)), self.sections)
+            if score > 0
+        ]
+        scored.sort(key=lambda x: x[0], reverse=True)
+        return scored
+
+    def _embedding_match(self, client: genai.Client, term: str) -> list[tuple[float, Section]]:
+        names = [f"{section.chapter}: {section.name}" if section.chapter else section.name for section in self.sections]
+        vectors = np.array(embedding_cache.embed(client, [term] + names, task_type="SEMANTIC_SIMILARITY"))
+        norms = np.linalg.norm(vectors, axis=1)
+        norms[norms == 0] = 1.0
+        similarity = vectors[1:] @ vectors[0] / (norms[1:] * norms[0])
+        scored = [
+            (float(s), section) for s, section in zip(similarity, self.sections)
+            if s >= general_args.RELEVANCE_THRESHOLD
+        ]
+        scored.sort(key=lambda x: x[0], reverse=True)
+        return scored
+
+    def search(self, term: str, client: genai.Client|None=None, limit: int|None=None) -> dict[str: scraper.SearchResult]:
+        """
+        Local replacement for scraper.search() + scraper.scrape_search()
+
+        :param term: search term
+        :param client: optional genai client, used to match section names by embedding when no words match
+        :param limit: max results (defaults to SECTION_INDEX_RESULTS)
+        :return: dictionary in the same format as scrape_search(): {[related_text]: SearchResult}
+        """
+        limit = limit or general_args.SECTION_INDEX_RESULTS
+        scored = self.bm25(term)
+        if not scored and client and self.sections:
+            scored = self._embedding_match(client, term)
+        result: dict[str: scraper.SearchResult] = {}
+        for _, section in scored[:limit]:
+            related_text = f"{section.name}: {snippet(section.text, term)}"
+            if related_text in result:
+                related_text += f" ({section.url})"
+            result[related_text] = scraper.SearchResult(href=section.url, name=section.name, chapter_name=section.chapter, related_text=related_text)
+        return result
+
+
+def snippet(text: str, term: str, width: int=SNIPPET_WORDS) -> str:
+    """
+    Window of the text with the most search term words in it
+
+    :param text: section text
+    :param term: search term
+    :param width: window size in words
+    :return: snippet text
+    """
+    words = text.split()
+    if len(words) <= width:
+        return " ".join(words)
+    query = set(tokenize(term))
+    hits = [1 if query.intersection(tokenize(word)) else 0 for word in words]
+    best = count = sum(hits[:width])
+    best_start = 0
+    for start in range(1, len(words) - width + 1):
+        count += hits[start + width - 1] - hits[start - 1]
+        if count > best:
+            best, best_start = count, start
+    return " ".join(words[best_start:best_start + width])
+
+
+def open_index(muni_url: str) -> SectionIndex|None:
+    """
+    Stored section index for a municipality (built beforehand with crawl(), see main)
+
+    :param muni_url: municipality code of ordinances url
+    :return: SectionIndex, or None if the index is turned off or has no sections
+    """
+    if not general_args.SECTION_INDEX:
+        return None
+    index = SectionIndex.load(muni_url, general_args.SECTION_INDEX_PATH)
+    return index if index.sections else None
+
+
+def main():
+    import sys
+    import json
+    import scrapers.municode_scraper as municode
+
+    state = "california"
+    muni_names = sys.argv[1:] or ["campbell"]
+    with open(general_args.MUNICODE_MUNIS, 'r') as file:
+        munis = json.load(file)
+    muni_scraper = municode.MuniCodeScraper()
+    for muni in muni_names:
+        muni_url = munis[state]["municipalities"][muni]
+        complete = crawl(muni_scraper, muni_url)
+        index = SectionIndex.load(muni_url)
+        print(f"{muni}: {len(index.sections)} sections indexed{'' if complete else ' (incomplete, rerun to retry failed pages)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import json
+
+import pandas as pd
+import pytest
+
+import enrich_policymap_with_gemma as enrich
+
+
+def _row(row_key: int, **overrides) -> dict:
+    row = {
+        "row_key": row_key,
+        "city": "Springfield",
+        "county": "",
+        "policy_type": "Rent Control",
+        "number": "8.80.020",
+        "title": "Rent stabilization",
+        "chapter": "",
+        "section_program": "",
+        "description": "",
+        "source_url": "https://library.municode.com/x",
+        "fetch_status": "ok",
+        "n_ord_hits": 1,
+        "body_mode": "html_windows",
+        "snippets_json": json.dumps(["8.80.020 Rent stabilization. (Ord. No. 2001-5, adopted May 1, 2001.)"]),
+        "extract_parse_error": "",
+    }
+    row.update(overrides)
+    return row
+
+
+@pytest.fixture
+def run_stage2(tmp_path, monkeypatch):
+    """Run main() on `rows`, counting Gemma calls instead of loading the model."""
+    calls = []
+    monkeypatch.setattr(enrich, "GOOGLE_SEARCH_TESTING_MODE", False)
+    monkeypatch.setattr(enrich, "SAMPLE_MODE", False)
+    monkeypatch.setattr(enrich, "INPUT_FILE", tmp_path / "x.extracted.parquet")
+    monkeypatch.setattr(enrich, "OUTPUT_FILE", tmp_path / "x.enriched.parquet")
+    monkeypatch.setattr(enrich, "_load_model", lambda: (None, None))
+
+    def fake_gemma(messages):
+        calls.append(messages)
+        return dict(enrich.DEFAULT_RESPONSE), None, "{}"
+
+    monkeypatch.setattr(enrich, "call_gemma", fake_gemma)
+
+    def run(rows: list[dict]) -> int:
+        pd.DataFrame(rows).to_parquet(enrich.INPUT_FILE)
+        before = len(calls)
+        enrich.main()
+        return len(calls) - before
+
+    return run
+
+
+def test_cached_refetch_does_not_reenrich(run_stage2):
+    assert run_stage2([_row(1, fetch_status="ok_curl_cffi"), _row(2)]) == 2
+    # Stage 1 rerun over the same bytes: the pages now come from its cache
+    assert run_stage2([_row(1, fetch_status="cached"), _row(2, fetch_status="cached")]) == 0
+
+
+def test_changed_snippets_reenrich(run_stage2):
+    assert run_stage2([_row(1)]) == 1
+    changed = json.dumps(["8.80.020 Rent stabilization. (Ord. No. 2010-2, adopted June 3, 2010.)"])
+    assert run_stage2([_row(1, fetch_status="cached", snippets_json=changed)]) == 1
+
+
+def test_fetch_status_class():
+    assert enrich.fetch_status_class("cached") == "ok"
+    assert enrich.fetch_status_class("ok_cloudscraper; pdf_ok") == enrich.fetch_status_class("cached; pdf_ok")
+    assert enrich.fetch_status_class("fetch_failed (403)") == "fetch_failed (403)"
+
+
+SNIPPET_PAYLOADS = [
+    "", None, "[]", "[ ]", '[""]', '["", " "]', "null", '"x"', '"  "', "bad", '["a"]',
+    "[1]", "{}", '"\\n"', '["\\t"]',
+    json.dumps(["long text " * 50]),
+    json.dumps([" " * 400]),                # long but whitespace only
+    '["' + "x" * 400,                        # long but invalid JSON
+    json.dumps(["", "  \n" * 200]),
+]
+BODY_MODES = ["", "no_body_fetch_failed", "html_windows", None]
+FETCH_STATUSES = ["ok", "fetch_failed_403", "ok; text_too_short (12 chars)", "pdf_no_parser", "cached; pdf_parse_failed (x)", None]
+
+
+def test_classify_skip_frame_matches_should_skip_llm():
+    rows = [
+        {"row_key": i, "snippets_json": payload, "body_mode": body_mode, "fetch_status": fetch_status}
+        for i, (payload, body_mode, fetch_status) in enumerate(
+            (p, b, f) for p in SNIPPET_PAYLOADS for b in BODY_MODES for f in FETCH_STATUSES
+        )
+    ]
+    df = pd.DataFrame(rows)
+    expected = [why if skip else "" for skip, why in (enrich.should_skip_llm(row) for _, row in df.iterrows())]
+    assert enrich.classify_skip_frame(df).tolist() == expected